@@ -1,5 +1,20 @@
-# flake8: noqa: F401 # pylint: disable=E0401
-from dh5 import DH5
-
-from .__config__ import __version__
-from .acquisition import AcquisitionLoop, AcquisitionManager, AnalysisData
+# flake8: noqa: F401 # pylint: disable=E0401
+from typing import TYPE_CHECKING
+
+from .__config__ import __version__
+from .utils.lazy_module import lazy_attributes
+
+__getattr__ = lazy_attributes(
+    __name__,
+    {
+        "DH5": "dh5",
+        "AcquisitionLoop": ".acquisition",
+        "AcquisitionManager": ".acquisition",
+        "AnalysisData": ".acquisition",
+    },
+)
+
+if TYPE_CHECKING:
+    from dh5 import DH5
+
+    from .acquisition import AcquisitionLoop, AcquisitionManager, AnalysisData
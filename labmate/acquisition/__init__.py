@@ -1,6 +1,33 @@
 # flake8: noqa: F401
-from .acquisition_manager import AcquisitionManager
-from .acquisition_loop import AcquisitionLoop
-from .acquisition_data import NotebookAcquisitionData
-from .analysis_data import AnalysisData, FigureProtocol
-from .analysis_loop import AnalysisLoop
+from typing import TYPE_CHECKING
+
+from ..utils.lazy_module import lazy_attributes
+
+# Imported on the first use, so scripts that need only a part of the package (e.g. the
+# analysis or the writer process) do not import the rest
+__getattr__ = lazy_attributes(
+    __name__,
+    {
+        "AcquisitionManager": ".acquisition_manager",
+        "AcquisitionLoop": ".acquisition_loop",
+        "NotebookAcquisitionData": ".acquisition_data",
+        "AnalysisData": ".analysis_data",
+        "FigureProtocol": ".analysis_data",
+        "AnalysisLoop": ".analysis_loop",
+        "SharedArray": ".shared_array",
+        "extract_config_params": ".bulk",
+        "load_key_from_files": ".bulk",
+        "VirtualDataset": ".virtual_dataset",
+        "create_virtual_dataset": ".virtual_dataset",
+    },
+)
+
+if TYPE_CHECKING:
+    from .acquisition_data import NotebookAcquisitionData
+    from .acquisition_loop import AcquisitionLoop
+    from .acquisition_manager import AcquisitionManager
+    from .analysis_data import AnalysisData, FigureProtocol
+    from .analysis_loop import AnalysisLoop
+    from .bulk import extract_config_params, load_key_from_files
+    from .shared_array import SharedArray
+    from .virtual_dataset import VirtualDataset, create_virtual_dataset
@@ -1,14 +1,42 @@
 """Module that contains NotebookAcquisitionData class."""
 
-from typing import Dict, List, Optional, Union
-
+import contextlib
+import os
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Union,
+)
+
+import numpy as np
 from dh5 import DH5
 
 from ..logger import logger
 from ..utils.file_read import read_files
+from ..utils.lazy_module import LazyModule, imported_module
+from . import journal
+from .config_store import ConfigStore, get_relative_store_path
+from .pooled_save import PooledSaveMixin
+
+# Imported on the first use. Before it, no file is kept open or sent to the writer
+container = LazyModule(".container", __package__)
+h5_handles = LazyModule(".h5_handles", __package__)
+writer = LazyModule(".writer", __package__)
+
+if TYPE_CHECKING:
+    from . import container, h5_handles, writer
 
 
-class NotebookAcquisitionData(DH5):
+def _is_imported(name: str) -> bool:
+    return imported_module(name, __package__) is not None
+
+
+class NotebookAcquisitionData(PooledSaveMixin, DH5):
     """It's a DH5 that has information about the configs file and the cell.
 
     `configs` is a list of the paths to the files that saved by `save_config_files` function.
@@ -17,6 +45,9 @@ class NotebookAcquisitionData(DH5):
 
     _current_step: int
     _cells: Dict[int, Optional[str]]
+    _batch_depth: int = 0
+    _batch_save_on_edit: bool = False
+    _container_group: Optional[str] = None
 
     def __init__(
         self,
@@ -27,6 +58,11 @@ class NotebookAcquisitionData(DH5):
         save_on_edit: bool = True,
         save_files: bool = True,
         experiment_name: Optional[str] = None,
+        config_store: Optional[ConfigStore] = None,
+        config_overrides: Optional[Dict[str, Any]] = None,
+        keep_file_open: Optional[float] = None,
+        use_journal: bool = False,
+        use_writer: Union[bool, str] = False,
     ):
         """Create file.
         This class is a DH5 object that saves code and config files.
@@ -46,22 +82,70 @@ class NotebookAcquisitionData(DH5):
              inside h5 file. Defaults to True.
             experiment_name (Optional[str], optional): Completely optional property for
              external use. Never used internally. Defaults to None.
+            config_store (ConfigStore, optional): If provided, configs are saved once inside
+             the store and the file keeps only their hashes under `configs_ref` key.
+             Defaults to None, i.e. configs are saved inside the file under `configs` key.
+            config_overrides (dict[str, Any], optional): Parameters overridden in memory
+             that are already applied to `configs`. Saved under `config_overrides` key to keep
+             track of the difference with the files on disk. Defaults to None.
+            keep_file_open (float, optional): Keep the h5 file open between the saves and
+             close it after this idle time in seconds, on `save_acquisition` or with
+             `close_file`. See `h5_handles`. Defaults to None, i.e. the file is opened for
+             every save.
+            use_journal (bool, optional): Append the saves to a journal next to the file
+             instead of writing the h5 file, and fold the journal into it in the
+             background and on `close_file`. See `journal`. Defaults to False.
+            use_writer (bool | str, optional): Send the saves to the writer process that
+             owns the h5 file (see `writer`), started if needed. A string is the address
+             of the writer. Defaults to False.
+
+        If `filepath` is `container.h5::group`, the data is saved inside the group of the
+        container (see `container`). The group is never overwritten and the files are
+        never saved next to the container.
         """
+        filepath, self._container_group = container.split(filepath)
+        # A previous acquisition with the same path could still keep the file open
+        if _is_imported(".h5_handles"):
+            h5_handles.disable(filepath)
+        journal.disable(filepath)
+        if _is_imported(".writer"):
+            writer.disable(filepath)
+        if self._container_group is not None:
+            overwrite, save_files = False, False
+            journal.recover(filepath)
+            container.add_group(filepath, self._container_group, exist_ok=True)
+        elif overwrite:
+            journal.discard(filepath)
+        else:
+            journal.recover(filepath)
         super().__init__(
             filepath=filepath,
             save_on_edit=save_on_edit,
             read_only=False,
             overwrite=overwrite,
+            key_prefix=self._container_group,
         )
 
         if isinstance(configs, list):
             configs = read_files(configs)
 
+        if keep_file_open is not None:
+            h5_handles.enable(filepath, idle_timeout=keep_file_open)
+        if use_journal:
+            journal.enable(filepath)
+        if use_writer:
+            writer.enable(filepath, address=None if use_writer is True else use_writer)
+
         self._save_files = save_files
+        self._config_store = config_store
+        self._side_files_hashes: Dict[str, str] = {}
 
         self._config = configs
         self.save_configs()
 
+        if config_overrides:
+            self["config_overrides"] = config_overrides
+
         self._cells = {1: cell}
         self.save_cell(cell=cell, suffix="1")
 
@@ -89,7 +173,17 @@ class NotebookAcquisitionData(DH5):
         if configs is None:
             return
 
-        self["configs"] = configs
+        if self._config_store is not None:
+            configs_ref = {
+                name: self._config_store.put(value) for name, value in configs.items()
+            }
+            self._set_if_changed("configs_ref", configs_ref)
+            self._set_if_changed(
+                "configs_store",
+                get_relative_store_path(str(self._filepath), self._config_store),
+            )
+        else:
+            self._set_if_changed("configs", configs)
 
         if not self._save_files:
             return
@@ -97,8 +191,11 @@ class NotebookAcquisitionData(DH5):
         filepath = self._check_if_filepath_was_set(filepath, self._filepath)
 
         for name, value in configs.items():
-            with open(filepath + "_" + name, "w", encoding="utf-8") as file:
-                file.write(value)
+            self._write_side_file(
+                filepath + "_" + name,
+                value,
+                store_key=configs_ref[name] if self._config_store is not None else None,
+            )
 
     def save_cell(
         self,
@@ -118,22 +215,44 @@ class NotebookAcquisitionData(DH5):
              the desired location, i.e. it should end with the file prefix to which the suffix and
              'py' extension will be added. Defaults to save filepath as h5 file.
         """
-        if cell == "none":
+        if not self._save_cell_to_h5(cell, suffix) or not self._save_files:
             return
+
+        filepath = self._check_if_filepath_was_set(filepath, self._filepath)
+        self._write_side_file(filepath + "_CELL.py", cell)  # type: ignore
+
+    def _save_cell_to_h5(self, cell: Optional[str], suffix: Optional[str]) -> bool:
+        """Save the cell under `acquisition_cell` key. Return False if there is no cell."""
+        if cell == "none":
+            return False
         if cell is None or cell == "":
             logger.warning("Acquisition cell is not set. Nothing to save")
-            return
-        if suffix is not None:
-            self[f"acquisition_cell/{suffix}"] = cell
-        else:
-            self["acquisition_cell/0"] = cell
+            return False
+        self._set_if_changed(f"acquisition_cell/{suffix or 0}", cell)
+        return True
 
-        if not self._save_files:
+    def _set_if_changed(self, key: str, value: Any):
+        """Set the key only if it has not the same value yet, so it's not saved again."""
+        if key in self._data and self._data[key] == value:
             return
+        self[key] = value
 
-        filepath = self._check_if_filepath_was_set(filepath, self._filepath)
-        with open(filepath + "_CELL.py", "w", encoding="utf-8") as file:
-            file.write(cell)
+    def _write_side_file(
+        self, path: str, content: str, store_key: Optional[str] = None
+    ):
+        """Write the file near the h5 file, unless the same content was written already.
+
+        If `store_key` is provided, the file is linked from the config store.
+        """
+        content_hash = store_key or ConfigStore.hash(content)
+        if self._side_files_hashes.get(path) == content_hash and os.path.exists(path):
+            return
+        if store_key is not None and self._config_store is not None:
+            self._config_store.link(store_key, path)
+        else:
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(content)
+        self._side_files_hashes[path] = content_hash
 
     def save_cells(
         self,
@@ -145,26 +264,174 @@ class NotebookAcquisitionData(DH5):
         # if len(cells) == 1:
         #     self.save_cell(cells.popitem()[1], filepath)
         #     return
+        last_cell = None
         for i, cell in cells.items():
-            self.save_cell(cell, filepath, suffix=str(i))
+            if self._save_cell_to_h5(cell, suffix=str(i)):
+                last_cell = cell
+
+        # All cells share the same file, so only the last one is written
+        if last_cell is not None and self._save_files:
+            filepath = self._check_if_filepath_was_set(filepath, self._filepath)
+            self._write_side_file(filepath + "_CELL.py", last_cell)
 
     def save_additional_info(self):
-        """Save all additional information, i.e. cell code, configs. Put useful key to True."""
-        self["useful"] = True
+        """Save all additional information, i.e. cell code, configs. Put useful key to True.
+
+        Cells, configs and their files that have not changed since the last call are not
+        written again.
+        """
+        self._set_if_changed("useful", True)
 
         if not self._save_files:
             return
         self.save_cells()
         self.save_configs()
 
+    @property
+    def filepath(self) -> Optional[str]:
+        """Return the filepath without the '.h5' extension.
+
+        For an acquisition inside a container, it's the path it would have as a separate
+        file, i.e. `directory_of_the_container/group`. It's resolved by `AnalysisData`.
+        """
+        filepath = super().filepath
+        if filepath is None or self._container_group is None:
+            return filepath
+        return os.path.join(os.path.dirname(filepath), self._container_group)
+
+    @property
+    def save_on_edit(self) -> bool:
+        """Return True if the changes are saved automatically (maybe at the end of a batch)."""
+        return self._save_on_edit or self._batch_save_on_edit
+
+    @contextlib.contextmanager
+    def batch(
+        self, on_error: Literal["flush", "rollback"] = "flush"
+    ) -> Iterator["NotebookAcquisitionData"]:
+        """Keep the changes in memory and save them at once at the end of the block.
+
+        In `save_on_edit` mode every change is written to the file directly. Inside this
+        block they are saved together on exit instead. Nested blocks join the outer one.
+
+        Examples:
+            >>> with aq.batch():
+            ...     for name, value in params.items():
+            ...         aq[name] = value
+
+        Args:
+            on_error ("flush" | "rollback", optional): What to do if an exception is raised
+                inside the block. "flush" saves the changes, "rollback" restores the keys
+                as they were before the block and saves nothing. Iterations appended to
+                the loops are not rolled back and are saved with the next save.
+                Defaults to "flush".
+        """
+        if on_error not in ("flush", "rollback"):
+            raise ValueError(
+                f"on_error should be 'flush' or 'rollback', not {on_error}"
+            )
+        if self._batch_depth > 0:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            return
+
+        snapshot = (
+            dict(self._data),
+            set(self._keys),
+            set(self._last_update),
+            set(self._classes_should_be_saved_internally),
+        )
+        save_on_edit = self._save_on_edit
+        self._set_save_on_edit(False)
+        self._batch_depth, self._batch_save_on_edit = 1, save_on_edit
+        rolled_back = False
+        try:
+            yield self
+        except BaseException:
+            if on_error == "rollback":
+                self._data, self._keys, self._last_update = snapshot[:3]
+                self._classes_should_be_saved_internally = snapshot[3]
+                self._clean_precalculated_results()
+                rolled_back = True
+            raise
+        finally:
+            self._batch_depth, self._batch_save_on_edit = 0, False
+            self._set_save_on_edit(save_on_edit)
+            if save_on_edit and not rolled_back:
+                self._save_pending()
+
+    def _set_save_on_edit(self, save_on_edit: bool):
+        """Set save_on_edit for this object and the loops inside it."""
+        self._save_on_edit = save_on_edit
+        for key in self._classes_should_be_saved_internally:
+            value = self._data.get(key)
+            if isinstance(value, DH5):
+                value._save_on_edit = save_on_edit  # pylint: disable=protected-access
+
+    def _save_pending(self):
+        """Save the keys and the loops that have changed, without empty writes."""
+        for key in self._classes_should_be_saved_internally:
+            value = self._data.get(key)
+            if (
+                key not in self._last_update
+                and isinstance(value, DH5)
+                and value._last_update  # pylint: disable=protected-access
+            ):
+                value.save()
+        if self._last_update:
+            self.save()
+
     def save_acquisition(self, **kwds) -> "NotebookAcquisitionData":
-        """Save kwds and all additional information (configs, code, ...)."""
-        self.update(**kwds)
+        """Save kwds and all additional information (configs, code, ...).
+
+        Arrays produced by another process can be given as `SharedArray` (see
+        `shared_array`).
+        """
+        if kwds:
+            self.update(**kwds)
         self.save_additional_info()
         if self.save_on_edit is False:
             self.save()
+        self.close_file()
         return self
 
+    def close_file(self):
+        """Fold the journal into the h5 file (see `use_journal`), wait for the writer
+        (see `use_writer`) and close the file if it's kept open between the saves (see
+        `keep_file_open`)."""
+        if self._filepath is not None:
+            journal.fold(self._filepath)
+            if _is_imported(".writer"):
+                writer.flush(self._filepath)
+            if _is_imported(".h5_handles"):
+                h5_handles.close(self._filepath)
+
+    def get_saved_arrays(self) -> Dict[str, Any]:
+        """Return the numeric arrays that are saved to the file and still kept in memory.
+
+        Loops (`AcquisitionLoop`) are returned as dictionaries if they contain only numeric
+        arrays. It allows to open the file for analysis without reading these keys again.
+        Returned arrays are views of the acquisition arrays, i.e. no data is copied.
+        """
+        arrays = {}
+        for key, value in self.asdict().items():
+            if key in self._last_update:
+                continue
+            if _is_numeric_array(value):
+                arrays[key] = np.asarray(value)
+            elif isinstance(value, DH5) and "__loop_shape__" in value:
+                loop = value.asdict()
+                if not value._last_update and all(  # pylint: disable=W0212
+                    name == "__loop_shape__" or _is_numeric_array(item)
+                    for name, item in loop.items()
+                ):
+                    arrays[key] = {
+                        name: np.asarray(item) for name, item in loop.items()
+                    }
+        return arrays
+
     @property
     def current_step(self):
         """Return the current step of the acquisition."""
@@ -179,3 +446,9 @@ class NotebookAcquisitionData(DH5):
         if step is None:
             step = self.current_step
         self._cells[step] = cell
+
+
+def _is_numeric_array(value: Any) -> bool:
+    return (
+        isinstance(value, np.ndarray) and value.ndim > 0 and value.dtype.kind in "biufc"
+    )
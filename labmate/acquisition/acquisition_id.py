@@ -0,0 +1,115 @@
+"""Unique time stamps of the acquisitions.
+
+The name of an acquisition is `{time stamp}__{experiment name}`, where the time stamp is
+precise to the second. The acquisitions of the same experiment created within the same
+second get the sequence number as suffix: `__1`, `__2`, etc.
+
+The last (time stamp, sequence number) of each experiment directory is kept in the
+`.last_acquisition_id` file. It's updated under a lock file created atomically
+(`O_EXCL`), so the names are unique between processes without checking which files
+exist, and they never go back in time even if the clock does. A lock left by a process
+that died is taken over after a timeout by renaming it, so only one process removes it.
+"""
+
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from ..utils import get_timestamp
+
+ID_FILENAME = ".last_acquisition_id"
+
+_LOCK_TIMEOUT = 10.0
+_THREAD_LOCK = threading.Lock()
+
+
+class _ExclusiveLock:
+    """Lock file created with `O_EXCL`. A lock older than `timeout` is considered stale."""
+
+    def __init__(self, path: str, timeout: float = _LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+
+    def __enter__(self):
+        start = time.monotonic()
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                pass
+            try:
+                info = os.stat(self.path)
+            except FileNotFoundError:
+                continue
+            if time.time() - info.st_mtime > self.timeout:
+                self._remove_stale(info)
+                continue
+            if time.monotonic() - start > self.timeout:
+                raise TimeoutError(f"Cannot acquire the lock {self.path}")
+            time.sleep(0.001)
+
+    def _remove_stale(self, info: os.stat_result):
+        """Remove the stale lock, unless another process took it over first."""
+        # Renaming is atomic, so only one of the processes waiting gets the stale lock
+        stale_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.stale"
+        try:
+            os.rename(self.path, stale_path)
+        except FileNotFoundError:
+            return
+        taken = os.stat(stale_path)
+        if (taken.st_ino, taken.st_mtime) != (info.st_ino, info.st_mtime):
+            # It's the new lock of the process that took the stale one over: give it back
+            try:
+                os.link(stale_path, self.path)
+            except FileExistsError:
+                pass
+        os.remove(stale_path)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        os.remove(self.path)
+
+
+def _read_last_id(path: str) -> Optional[Tuple[str, int]]:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            time_stamp, sequence = file.read().split()
+        return time_stamp, int(sequence)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_last_id(path: str, time_stamp: str, sequence: int):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        file.write(f"{time_stamp} {sequence}")
+    os.replace(tmp_path, path)
+
+
+def new_id(directory: str) -> Tuple[str, int]:
+    """Reserve a new (time stamp, sequence number) for an acquisition.
+
+    Args:
+        directory (str): Directory of the experiment. Created if it does not exist.
+
+    Returns:
+        (str, int): Time stamp in the `get_timestamp` format and the sequence number,
+            which is 0 for the first acquisition of the second.
+    """
+    directory = str(directory)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, ID_FILENAME)
+    with _THREAD_LOCK, _ExclusiveLock(path + ".lock"):
+        time_stamp, sequence = get_timestamp(), 0
+        last_id = _read_last_id(path)
+        if last_id is not None and time_stamp <= last_id[0]:
+            time_stamp, sequence = last_id[0], last_id[1] + 1
+        _write_last_id(path, time_stamp, sequence)
+    return time_stamp, sequence
+
+
+def get_name(time_stamp: str, experiment_name: str, sequence: int = 0) -> str:
+    """Return the name of the acquisition (i.e. of its file without extension)."""
+    name = f"{time_stamp}__{experiment_name}"
+    return name if sequence == 0 else f"{name}__{sequence}"
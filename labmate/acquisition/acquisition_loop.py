@@ -4,10 +4,12 @@ from typing import Iterable, Iterator, Optional, Union, overload
 
 import numpy as np
 from dh5 import DH5
-from dh5.dh5_types import SyncNp
 
+from .pooled_save import PooledSaveMixin, PooledSyncNp
+from .shared_array import SharedArray
 
-class AcquisitionLoop(DH5):
+
+class AcquisitionLoop(PooledSaveMixin, DH5):
     """Comfort way to save a data on change inside a loop without thinking about shape.
 
     Examples:
@@ -70,7 +72,7 @@ class AcquisitionLoop(DH5):
         last_update_keys, self._last_update = self._last_update, set()
 
         for key in self.keys():
-            self[key] = SyncNp(self[key])
+            self[key] = PooledSyncNp(self[key])
 
         self._last_update = last_update_keys
 
@@ -131,7 +133,8 @@ class AcquisitionLoop(DH5):
         Args:
             level (int, Optional): level at which to append the data. By default, it is
                 calculated based on how many nested loops are run.
-            **kwds: data to append, provided as keyword arguments.
+            **kwds: data to append, provided as keyword arguments. Arrays produced by
+                another process can be given as `SharedArray` (see `shared_array`).
 
         Raises:
             ValueError: If no `kwds` is provided.
@@ -152,6 +155,10 @@ class AcquisitionLoop(DH5):
             )
 
     def __append_value(self, key, value, shape, iteration):
+        handle = None
+        if isinstance(value, SharedArray):
+            handle, value = value, value.asarray()
+
         if isinstance(value, (np.ndarray,)):
             key_shape = (*shape, *value.shape)
         elif hasattr(value, "__len__"):
@@ -161,7 +168,7 @@ class AcquisitionLoop(DH5):
 
         if key in self:
             if self[key].shape == key_shape:
-                self[key][iteration] = value
+                self.__set_item(key, iteration, value, handle)
             else:
                 if len(key_shape) < len(self[key].shape):
                     raise ValueError(
@@ -175,7 +182,7 @@ class AcquisitionLoop(DH5):
                         f"Before the shape was {self[key].shape}, but now it is {key_shape}."
                     )
 
-                self[key] = SyncNp(
+                self[key] = PooledSyncNp(
                     np.pad(
                         self[key],
                         pad_width=tuple(
@@ -183,17 +190,33 @@ class AcquisitionLoop(DH5):
                         ),
                     )
                 )
-                self[key][iteration] = value
+                self.__set_item(key, iteration, value, handle)
         else:
             if np.iscomplexobj(value):
-                self[key] = SyncNp(np.zeros(key_shape, dtype=np.complex128))
+                self[key] = PooledSyncNp(np.zeros(key_shape, dtype=np.complex128))
             else:
-                self[key] = SyncNp(np.zeros(key_shape))
+                self[key] = PooledSyncNp(np.zeros(key_shape))
 
-            self[key][iteration] = value
+            self.__set_item(key, iteration, value, handle)
 
         self._last_update.add(key)
 
+    def __set_item(self, key, iteration, value, handle: Optional[SharedArray]):
+        if handle is None:
+            self[key][iteration] = value
+            return
+
+        # The value is copied into the loop array. The handle is only needed if the item
+        # is saved right now by the writer (see `shared_array`), otherwise it's released.
+        array = self[key]
+        array._shared_items = {iteration: handle}  # pylint: disable=W0212
+        try:
+            array[iteration] = value
+        finally:
+            array._shared_items = None  # pylint: disable=W0212
+            if not handle.sent:
+                handle.release()
+
     def iter(
         self,
         iterable: Iterable,
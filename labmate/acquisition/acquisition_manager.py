@@ -1,13 +1,35 @@
+import contextlib
+import json
 import os
-from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+import time
+from types import SimpleNamespace
+from typing import (
+    Any,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from dh5 import jsn
+from dh5.jsn.encoders import StringEncoder
 from dh5.path import Path
 
-from ..parsing.saving import append_values_from_modules_to_files
-from ..utils import get_timestamp
-from ..utils.file_read import read_file, read_files
-from .acquisition_data import NotebookAcquisitionData
+from ..utils.file_read import (
+    read_file,
+    read_files,
+    update_variables_in_text,
+    write_file_atomic,
+)
+from . import acquisition_id
+from . import layout as layouts
+from .acquisition_data import NotebookAcquisitionData, container
+from .config_store import STORE_DIRNAME, ConfigStore
 
 
 class AcquisitionTmpData(NamedTuple):
@@ -17,6 +39,8 @@ class AcquisitionTmpData(NamedTuple):
     time_stamp: str
     configs: Dict[str, str] = {}
     directory: Optional[Union[str, Path]] = None
+    config_overrides: Dict[str, Any] = {}
+    sequence: int = 0
 
     def asdict(self):
         return self._asdict()  # pylint: disable=no-member
@@ -29,12 +53,21 @@ class AcquisitionManager:
     config_files: List[str] = []
     config_files_eval: Dict[str, str] = {}
     _configs_last_modified: List[float] = []
+    _configs_cache: Optional[Tuple[Tuple[Tuple[str, int, int], ...], Dict[str, str]]]
+    config_overrides: Dict[str, Any] = {}
 
     _current_acquisition: Optional[NotebookAcquisitionData] = None
     _current_filepath: Optional[str] = None
 
     _save_files: bool = False
     _save_on_edit: bool = True
+    _use_config_store: bool = False
+    _keep_file_open: Optional[float] = None
+    _use_journal: bool = False
+    _use_writer: Union[bool, str] = False
+    _container_size: Optional[int] = None
+    _session: Optional[str] = None
+    _layout: str = "flat"
     _init_code = None
     _once_saved: bool
 
@@ -47,6 +80,13 @@ class AcquisitionManager:
         config_files: Optional[List[str]] = None,
         save_files: Optional[bool] = None,
         save_on_edit: Optional[bool] = None,
+        use_config_store: Optional[bool] = None,
+        keep_file_open: Optional[float] = None,
+        use_journal: Optional[bool] = None,
+        use_writer: Optional[Union[bool, str]] = None,
+        container_size: Optional[int] = None,
+        session: Optional[str] = None,
+        layout: Optional[str] = None,
     ):
         if save_files is not None:
             self._save_files = save_files
@@ -54,6 +94,29 @@ class AcquisitionManager:
         if save_on_edit is not None:
             self._save_on_edit = save_on_edit
 
+        if use_config_store is not None:
+            self._use_config_store = use_config_store
+
+        if keep_file_open is not None:
+            self._keep_file_open = keep_file_open
+
+        if use_journal is not None:
+            self._use_journal = use_journal
+
+        if use_writer is not None:
+            self._use_writer = use_writer
+
+        if container_size is not None:
+            self._container_size = container_size
+
+        if session is not None:
+            self._session = session
+        elif "ACQUISITION_SESSION" in os.environ:
+            self._session = os.environ["ACQUISITION_SESSION"]
+
+        if layout is not None:
+            self._layout = layouts.check_layout(layout)
+
         self._current_acquisition = None
         self._acquisition_tmp_data = None
         self._once_saved = False
@@ -61,6 +124,8 @@ class AcquisitionManager:
         self.config_files = []
         self.config_files_eval = {}
         self._configs_last_modified = []
+        self._configs_cache = None
+        self.config_overrides = {}
 
         if data_directory is not None:
             self.data_directory = Path(data_directory)
@@ -69,7 +134,9 @@ class AcquisitionManager:
         else:
             raise ValueError("No data directory specified")
 
-        self.temp_file_path = self.data_directory / "temp.json"
+        self.temp_file_path = self.data_directory / (
+            f"temp_{self._session}.json" if self._session else "temp.json"
+        )
 
         if config_files is not None:
             self.set_config_file(config_files)
@@ -96,6 +163,16 @@ class AcquisitionManager:
         """
         self._data_directory = directory.makedirs()
 
+    @property
+    def config_store(self) -> Optional[ConfigStore]:
+        """Return the store of the config files if `use_config_store` is set.
+
+        The store is located at `data_directory/.config_store` and shared by all acquisitions.
+        """
+        if not self._use_config_store:
+            return None
+        return ConfigStore(self.data_directory / STORE_DIRNAME)
+
     @property
     def acquisition_tmp_data(self) -> AcquisitionTmpData:
         """Return information about the current acquisition.
@@ -119,8 +196,13 @@ class AcquisitionManager:
 
     @acquisition_tmp_data.setter
     def acquisition_tmp_data(self, dic: AcquisitionTmpData) -> None:
-        """Save AcquisitionTmpData to json file and to class attribute."""
-        jsn.write(self.temp_file_path, dic.asdict())
+        """Save AcquisitionTmpData to json file and to class attribute.
+
+        The file is replaced atomically, so the processes sharing the data directory
+        never read a partially written file.
+        """
+        content = json.dumps(dic.asdict(), sort_keys=True, indent=4, cls=StringEncoder)
+        write_file_atomic(self.temp_file_path, content)
         self._acquisition_tmp_data = dic
 
     def __setitem__(self, __key: str, __value) -> None:
@@ -163,6 +245,12 @@ class AcquisitionManager:
     def create_path_from_tmp_data(
         self, dic: AcquisitionTmpData, ignore_existence: bool = False
     ) -> "Path":
+        """Return the path of the acquisition (without extension).
+
+        The path is unique if the time stamp and the sequence number were reserved with
+        `acquisition_id.new_id`, so `ignore_existence` is kept only for compatibility.
+        """
+        del ignore_existence
         data_directory = dic.directory or self.data_directory
         experiment_path = Path(data_directory) / str(dic.experiment_name)
         if not experiment_path.exists():
@@ -174,53 +262,151 @@ class AcquisitionManager:
             ) as file:
                 file.write(self._init_code)
 
-        filepath_original = filepath = (
-            experiment_path / f"{dic.time_stamp}__{dic.experiment_name}"
+        name = acquisition_id.get_name(
+            dic.time_stamp, str(dic.experiment_name), dic.sequence
         )
+        filepath = Path(layouts.get_filepath(experiment_path, name, self._layout))
+        filepath.dirname.makedirs()
+        return filepath
 
-        # If ignore existence is True, no check is required
-        if ignore_existence:
-            return filepath
-        # If the file already exists, add a suffix to the name
-        index = 1
-        while os.path.exists(filepath + ".h5"):
-            filepath = filepath_original + f"__{index}"
-            index += 1
+    def _skip_existing(self, dic: AcquisitionTmpData) -> AcquisitionTmpData:
+        """Increase the sequence number while the file of the acquisition exists.
 
-        return filepath
+        The reserved names are unique, but the file must not be overwritten even if
+        the same name is reserved again (e.g. `.last_acquisition_id` was removed).
+        """
+        while os.path.exists(self.create_path_from_tmp_data(dic) + ".h5"):
+            dic = dic._replace(sequence=dic.sequence + 1)
+        return dic
 
     @staticmethod
-    def get_temp_data(path: Path) -> Optional[AcquisitionTmpData]:
-        if not os.path.exists(path):
-            return None
-        return AcquisitionTmpData(**jsn.read(path))
+    def get_temp_data(
+        path: Path, retry_on_error: int = 5
+    ) -> Optional[AcquisitionTmpData]:
+        """Read AcquisitionTmpData from the json file or return None if it doesn't exist.
+
+        On Windows the file cannot be opened while another process replaces it, and a
+        file written by an older version could be read while it's written. So the
+        reading is retried several times.
+        """
+        for i in range(retry_on_error):
+            if not os.path.exists(path):
+                return None
+            try:
+                return AcquisitionTmpData(**jsn.read(path))
+            except (PermissionError, json.JSONDecodeError):
+                if i == retry_on_error - 1:
+                    raise
+                time.sleep(0.01)
+        return None
 
     def _get_configs_last_modified(self) -> List[float]:
         return [os.path.getmtime(file) for file in self.config_files]
 
+    def override_config_params(self, params: Dict[str, Any]) -> "AcquisitionManager":
+        """Override the values of the parameters for the future acquisitions.
+
+        The config files on disk are not modified. The parameters are replaced inside
+        the snapshot of the configs that is saved with every new acquisition, and
+        the overrides themselves are saved under `config_overrides` key.
+
+        Note that values appended from evaluation modules (see
+        `set_config_evaluation_module`) are not recomputed, so parameters that depend on
+        the overridden ones keep the values of the imported module.
+
+        Args:
+            params (Dict[str, Any]): Dictionary {parameter name: new value}.
+        """
+        self.config_overrides.update(params)
+        return self
+
+    def reset_config_overrides(self) -> "AcquisitionManager":
+        """Remove all the overrides set by `override_config_params`."""
+        self.config_overrides = {}
+        return self
+
+    @contextlib.contextmanager
+    def overridden_config_params(self, params: Dict[str, Any]) -> Iterator[None]:
+        """Override the values of the parameters only inside the `with` block.
+
+        Examples:
+            >>> for freq in np.linspace(5e9, 6e9, 1000):
+            ...     with aqm.overridden_config_params({"qubit_freq": freq}):
+            ...         aqm.new_acquisition("qubit_spectroscopy")
+            ...         ...
+
+        Args:
+            params (Dict[str, Any]): Dictionary {parameter name: new value}.
+        """
+        previous = self.config_overrides
+        self.config_overrides = {**previous, **params}
+        try:
+            yield
+        finally:
+            self.config_overrides = previous
+
+    def _read_config_files(self) -> Dict[str, str]:
+        """Return the content of the config files. Files are read only if they changed."""
+        key = tuple(
+            (file, stat.st_mtime_ns, stat.st_size)
+            for file, stat in ((file, os.stat(file)) for file in self.config_files)
+        )
+        if self._configs_cache is None or self._configs_cache[0] != key:
+            self._configs_cache = (key, read_files(self.config_files))
+        return dict(self._configs_cache[1])
+
+    def _get_configs(self) -> Dict[str, str]:
+        """Return the configs to save with an acquisition with overrides applied."""
+        configs = self._read_config_files()
+        overrides = self.config_overrides
+
+        if overrides:
+            found = set()
+            for name, content in configs.items():
+                configs[name], updated = update_variables_in_text(content, overrides)
+                found.update(updated)
+            not_found = set(overrides).difference(found)
+            if not_found:
+                raise ValueError(
+                    f"Overridden parameters {sorted(not_found)} cannot be found in config files."
+                )
+
+        if self.config_files_eval:
+            from ..parsing.saving import append_values_from_modules_to_files
+
+            modules = self.config_files_eval
+            if overrides:
+                modules = {
+                    file: SimpleNamespace(**{**vars(module), **overrides})
+                    for file, module in modules.items()
+                }
+            configs = append_values_from_modules_to_files(configs, modules)
+
+        return configs
+
     def new_acquisition(
         self, name: str, cell: Optional[str] = None, save_on_edit: Optional[bool] = None
     ) -> NotebookAcquisitionData:
         """Create a new acquisition with the given experiment name."""
+        if self._current_acquisition is not None:
+            self._current_acquisition.close_file()
         self._current_acquisition = None
         self._once_saved = False
         self.cell = cell
-        configs = read_files(self.config_files)
+        configs = self._get_configs()
         self._configs_last_modified = self._get_configs_last_modified()
 
-        if self.config_files_eval:
-            configs = append_values_from_modules_to_files(
-                configs, self.config_files_eval
-            )
-
+        time_stamp, sequence = acquisition_id.new_id(Path(self.data_directory) / name)
         dic = AcquisitionTmpData(
             experiment_name=name,
-            time_stamp=get_timestamp(),
+            time_stamp=time_stamp,
             configs=configs,
             directory=self.data_directory,
+            config_overrides=dict(self.config_overrides),
+            sequence=sequence,
         )
 
-        self.acquisition_tmp_data = dic
+        self.acquisition_tmp_data = self._skip_existing(dic)
 
         self._current_acquisition = self.get_acquisition(
             replace=True, save_on_edit=save_on_edit
@@ -234,25 +420,33 @@ class AcquisitionManager:
         cell: Optional[str] = None,
         save_on_edit: Optional[bool] = None,
     ) -> NotebookAcquisitionData:
-        """Create a new acquisition with the given experiment name."""
-        configs = read_files(self.config_files)
+        """Create a new acquisition with the given experiment name.
 
-        if self.config_files_eval:
-            configs = append_values_from_modules_to_files(
-                configs, self.config_files_eval
-            )
+        If `container_size` is set, the acquisition is saved inside a group of the
+        current container of the experiment (see `container`) instead of its own file.
+        """
+        configs = self._get_configs()
 
         if name is None:
             name = self.current_experiment_name + "_item"
 
+        time_stamp, sequence = acquisition_id.new_id(Path(self.data_directory) / name)
         dic = AcquisitionTmpData(
             experiment_name=name,
-            time_stamp=get_timestamp(),
+            time_stamp=time_stamp,
             configs=configs,
             directory=self.data_directory,
+            sequence=sequence,
         )
 
-        filepath = self.create_path_from_tmp_data(dic)
+        filepath = self.create_path_from_tmp_data(self._skip_existing(dic))
+        if self._container_size:
+            filepath = container.add_acquisition(
+                os.path.dirname(filepath),
+                name,
+                group=os.path.basename(filepath),
+                max_acquisitions=self._container_size,
+            )
         configs = configs if configs else None
         save_on_edit = save_on_edit if save_on_edit is not None else self._save_on_edit
 
@@ -263,6 +457,11 @@ class AcquisitionManager:
             overwrite=False,
             save_on_edit=save_on_edit,
             save_files=self._save_files,
+            config_store=self.config_store,
+            config_overrides=dict(self.config_overrides),
+            keep_file_open=self._keep_file_open,
+            use_journal=self._use_journal,
+            use_writer=self._use_writer,
         )
 
     @property
@@ -292,9 +491,7 @@ class AcquisitionManager:
         self, replace: Optional[bool] = False, save_on_edit: Optional[bool] = None
     ) -> NotebookAcquisitionData:
         acquisition_tmp_data = self.acquisition_tmp_data
-        filepath = self.create_path_from_tmp_data(
-            acquisition_tmp_data, ignore_existence=True
-        )
+        filepath = self.create_path_from_tmp_data(acquisition_tmp_data)
         configs = acquisition_tmp_data.configs
         configs = configs if configs else None
         cell = self.cell
@@ -309,8 +506,35 @@ class AcquisitionManager:
             save_on_edit=save_on_edit,
             save_files=self._save_files,
             experiment_name=acquisition_tmp_data.experiment_name,
+            config_store=self.config_store,
+            config_overrides=acquisition_tmp_data.config_overrides,
+            keep_file_open=self._keep_file_open,
+            use_journal=self._use_journal,
+            use_writer=self._use_writer,
         )
 
+    def batch(
+        self, on_error: Literal["flush", "rollback"] = "flush"
+    ) -> ContextManager[NotebookAcquisitionData]:
+        """Save all the changes of the current acquisition at once at the end of the block.
+
+        Examples:
+            >>> with aqm.batch():
+            ...     for name, value in params.items():
+            ...         aqm[name] = value
+
+        Args:
+            on_error ("flush" | "rollback", optional): What to do if an exception is raised
+                inside the block. See `NotebookAcquisitionData.batch`. Defaults to "flush".
+        """
+        acq_data = self.current_acquisition
+        if acq_data is None:
+            raise ValueError(
+                "Cannot start a batch as current acquisition is None. "
+                "Possibly because you have never run `acquisition_cell(..)` or it's an old data"
+            )
+        return acq_data.batch(on_error=on_error)
+
     def save_acquisition(self, update_: bool = True, /, **kwds) -> "AcquisitionManager":
         acq_data = self.current_acquisition
         if acq_data is None:
@@ -324,9 +548,11 @@ class AcquisitionManager:
                 if key in acq_data:
                     del kwds[key]
 
-        acq_data.update(**kwds)
+        if kwds:
+            acq_data.update(**kwds)
         acq_data.save_additional_info()
         if acq_data.save_on_edit is False:
             acq_data.save()
+        acq_data.close_file()
         self._once_saved = True
         return self
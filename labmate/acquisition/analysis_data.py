@@ -2,15 +2,40 @@
 
 import json
 import os
-from typing import List, Literal, Optional, Protocol, Tuple, TypedDict, TypeVar, Union
-
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Protocol,
+    Tuple,
+    TypedDict,
+    TypeVar,
+    Union,
+)
+
+import h5py
+import numpy as np
 from dh5 import DH5
+from dh5.dh5_class.h5py_utils import open_h5_group, transform_on_open
 from dh5.path import Path
 
 from .. import utils
 from ..logger import logger
+from ..utils.lazy_module import LazyModule, imported_module
+from . import journal, layout
 from .analysis_loop import AnalysisLoop
 from .config_file import ConfigFile
+from .config_store import read_configs
+
+container = LazyModule(".container", __package__)
+
+if TYPE_CHECKING:
+    from . import container
+    from .virtual_dataset import VirtualDataset
 
 _T = TypeVar("_T", bound="AnalysisData")
 
@@ -73,6 +98,8 @@ class AnalysisData(DH5):
     _figure_saved = False
     _fig_index = 0
     _default_parse_config_str_max_length = 60
+    _container_group: Optional[str] = None
+    _journal_modified_time: float = 0
 
     def __init__(
         self,
@@ -82,6 +109,7 @@ class AnalysisData(DH5):
         save_on_edit: bool = True,
         save_fig_inside_h5: bool = False,
         open_on_init: Optional[bool] = None,
+        data: Optional[Dict[str, Any]] = None,
     ):
         """Load data from a filepath and lock it to prevent any changes.
 
@@ -93,23 +121,43 @@ class AnalysisData(DH5):
             save_on_edit (bool): Whether to save as soon as any changes are made.
             save_fig_inside_h5 (bool): Whether to save the figure inside the h5 file instead of
                 a file in the same directory. Default to False, i.e. creates a separate image file.
+            data (dict, optional): Values of some keys of the file that are already in memory
+                (e.g. just saved by the acquisition). These keys are not read from the file.
+                Values should be the same as the ones read from the file would be.
         """
         if filepath is None:
             raise ValueError("You must specify filepath")
-        filepath = str(filepath)
-        filepath = filepath if filepath.endswith(".h5") else filepath + ".h5"
-
-        if not os.path.exists(filepath):
+        filepath, self._container_group = container.resolve(str(filepath))
+        # The saves sent by this process to the writer should be in the file to read it
+        writer = imported_module(".writer", __package__)
+        if writer is not None:
+            writer.flush(filepath)
+
+        if not os.path.exists(filepath) and not os.path.exists(
+            journal.journal_path(filepath)
+        ):
             raise ValueError(f"File '{filepath}' does not exist.")
+        if self._container_group is not None and not container.exists(
+            container.join(filepath, self._container_group)
+        ):
+            raise ValueError(
+                f"Acquisition '{self._container_group}' does not exist in '{filepath}'."
+            )
 
         super().__init__(
             filepath=filepath,
             overwrite=False,
             read_only=False,
             save_on_edit=save_on_edit,
-            open_on_init=open_on_init,
+            open_on_init=False if data else open_on_init,
+            key_prefix=self._container_group,
         )
 
+        if data:
+            self._update(data)
+            self._file_modified_time = os.path.getmtime(filepath)
+
+        self._replay_journal()
         self.lock_data()
 
         self._save_files = save_files
@@ -120,19 +168,52 @@ class AnalysisData(DH5):
             self._default_config_files = tuple(self["info"]["default_config_files"])
 
         self._reset_attrs()
-
-        for key, value in self.items():
-            if isinstance(value, dict) and value.get("__loop_shape__") is not None:
-                self._update({key: AnalysisLoop(value)})
+        self._wrap_loops()
 
         self._analysis_cell = cell
 
         self.save_analysis_cell()
 
+    def _replay_journal(self):
+        """Apply the saves of the acquisition that are not folded into the file yet."""
+        # Taken before reading, so a record added during the reading is pulled next time
+        self._journal_modified_time = self._get_journal_modified_time()
+        records = journal.read_records(self.h5_filepath)
+        if not records:
+            return
+        key_prefix = self._container_group
+        values = {key: self.get(key) for key in journal.top_keys(records, key_prefix)}
+        for key, value in journal.replay(records, values, key_prefix).items():
+            if value is not None:
+                self._update({key: value})
+            elif key in self._keys:
+                self._data.pop(key, None)
+                self._keys.discard(key)
+                self._unopened_keys.discard(key)
+
+    def _get_journal_modified_time(self) -> float:
+        return _get_modified_time(journal.journal_path(self.h5_filepath))
+
     def _reset_attrs(self):
         self._fig_index = 0
         self._figure_saved = False
+        self._figure_last_name = None
         self._parsed_configs = {}
+        self._configs: Optional[Dict[str, str]] = None
+
+    def _wrap_loops(self):
+        for key, value in self.items():
+            if isinstance(value, dict) and value.get("__loop_shape__") is not None:
+                self._update({key: AnalysisLoop(value)})
+
+    def _close_nested_keys(self):
+        """Reload from the file the groups that were updated by path (e.g. `a/b`)."""
+        for key in [key for key in self._keys if "/" in key]:
+            group = key.split("/")[0]
+            for name in (key, group):
+                self._keys.discard(name)
+                self._data.pop(name, None)
+            self._unopened_keys.add(group)
 
     def save_analysis_cell(
         self: _T,
@@ -342,19 +423,20 @@ class AnalysisData(DH5):
         if config_file_name in self._parsed_configs:
             return self._parsed_configs[config_file_name]
 
-        if "configs" not in self:
+        configs = self.get_configs()
+        if not configs:
             raise KeyError("The is no config files saved within AnalysisManager")
 
-        if config_file_name not in self["configs"]:
+        if config_file_name not in configs:
             original_config_name = config_file_name
-            for possible_name in self["configs"]:
+            for possible_name in configs:
                 if possible_name.startswith(config_file_name):
                     config_file_name = possible_name
                     break
             else:
                 raise ValueError(
                     f"Cannot find config with name '{config_file_name}'. "
-                    f"Possible configs file are {tuple(self['configs'].keys())}"
+                    f"Possible configs file are {tuple(configs.keys())}"
                 )
 
             if config_file_name in self._parsed_configs:
@@ -368,7 +450,7 @@ class AnalysisData(DH5):
 
         from ..parsing import parse_str
 
-        file_content = self["configs"][config_file_name]
+        file_content = configs[config_file_name]
         config_data = ConfigFile(parse_str(file_content), file_content)
         self._parsed_configs[config_file_name] = config_data
         if original_config_name is not None:
@@ -378,6 +460,42 @@ class AnalysisData(DH5):
 
         return config_data
 
+    def get_configs(self) -> Dict[str, str]:
+        """Return the dictionary {config name: content} of the configs saved with the data.
+
+        Configs saved in the config store (`configs_ref` key) are read from the store.
+        """
+        if self._configs is None:
+            self._configs = read_configs(self)
+        return self._configs
+
+    def get_series(
+        self,
+        key: str,
+        files: Optional[Union[str, Iterable[str]]] = None,
+        stack: bool = False,
+    ) -> "VirtualDataset":
+        """Return a lazy view of the `key` concatenated across a series of acquisitions.
+
+        No data is copied and nothing is loaded until the view is indexed.
+        See `create_virtual_dataset` for details.
+
+        Args:
+            key (str): The key to concatenate. Keys inside a loop are given as `loop/key`.
+            files (str | Iterable[str], optional): Glob pattern or list of the files
+                (see `get_files_list`). Defaults to all the acquisitions of the same
+                experiment, i.e. all h5 files inside the experiment directory and its
+                date or month shards (see `layout`), in the order of their names.
+            stack (bool, optional): If True, stack along a new first axis instead of
+                concatenating along the first axis. Defaults to False.
+        """
+        if files is None:
+            assert self.filepath, "You must set self.filepath before getting a series"
+            files = os.path.join(layout.experiment_directory(self.filepath), "*.h5")
+        from .virtual_dataset import create_virtual_dataset
+
+        return create_virtual_dataset(files, key, stack=stack)
+
     def set_default_config_files(self, config_files: Union[str, Tuple[str, ...]], /):
         self._default_config_files = (
             (config_files,) if isinstance(config_files, str) else tuple(config_files)
@@ -428,9 +546,68 @@ class AnalysisData(DH5):
         # raise NotImplementedError(
         # "Not implemented for the moment. If you want to open an old figure. Use open_old_figs function")
 
-    def pull(self, force_pull: bool = False):
+    def pull(self, force_pull: bool = False, incremental: bool = True):
+        """Reload the data if the file has been modified elsewhere.
+
+        Args:
+            force_pull (bool, optional): If True, reloads the data even if the file
+                has not been modified. Defaults to False.
+            incremental (bool, optional): If True, only the loaded and the new keys
+                are read, and the arrays of the loops are read only from their last
+                loaded iteration, as AcquisitionLoop only appends to them. So pulling
+                a growing acquisition reads only the new iterations. Defaults to True.
+                False reloads the whole file.
+
+        Returns:
+            self
+        """
         self._reset_attrs()
-        return super().pull(force_pull)
+        if self.filepath is None:
+            raise ValueError("Cannot pull from file if it's not been set")
+        if not (force_pull or self.pull_available()):
+            return self
+
+        if not os.path.exists(self.h5_filepath):
+            # Everything saved by the acquisition is still inside the journal
+            self._data, self._keys, self._unopened_keys = {}, set(), set()
+            self._pull_journal()
+            return self
+
+        if not incremental:
+            super().pull(force_pull=True)
+            self._pull_journal()
+            return self
+
+        filepath = self.h5_filepath
+        # Taken before reading, so a write during the reading is pulled the next time
+        modified_time = os.path.getmtime(filepath)
+        loaded: Dict[str, Any] = {}
+        with h5py.File(filepath, "r") as h5_file:
+            file = h5_file if self._key_prefix is None else h5_file[self._key_prefix]
+            file_keys = set(file.keys())
+            new_keys = file_keys.difference(self.keys())
+            for key in new_keys.union(file_keys.intersection(self._data)):
+                loaded[key] = _read_pulled_item(file[key], self._data.get(key))
+
+        self._data = {}
+        self._keys = set()
+        self._unopened_keys = file_keys.difference(loaded)
+        self._update(loaded)
+        if new_keys and isinstance(self._read_only, set):
+            self.lock_data(new_keys)
+        self._file_modified_time = modified_time
+        self._pull_journal()
+        self._clean_precalculated_results()
+        return self
+
+    def _pull_journal(self):
+        """Replay the journal on top of the data just pulled from the file."""
+        keys = set(self.keys())
+        self._replay_journal()
+        self._wrap_loops()
+        new_keys = set(self.keys()).difference(keys)
+        if new_keys and isinstance(self._read_only, set):
+            self.lock_data(new_keys)
 
     @property
     def figure_saved(self):
@@ -440,8 +617,113 @@ class AnalysisData(DH5):
     def figure_last_name(self) -> Optional[str]:
         return self._figure_last_name
 
+    def pull_available(self) -> bool:
+        """Check if the file or its journal has been modified since the last pull."""
+        return (
+            self._file_modified_time != _get_modified_time(self.h5_filepath)
+            or self._journal_modified_time != self._get_journal_modified_time()
+        )
+
     @property
     def filepath(self) -> str:
+        """Return the filepath without the '.h5' extension.
+
+        For an acquisition inside a container, it's the path it would have as a separate
+        file, i.e. `directory_of_the_container/group`. Figures are saved next to it.
+        """
         filepath = super().filepath
         assert filepath is not None
-        return filepath
+        if self._container_group is None:
+            return filepath
+        return os.path.join(os.path.dirname(filepath), self._container_group)
+
+    @property
+    def h5_filepath(self) -> str:
+        """Return the path of the h5 file (or of the container) with the extension."""
+        return self._filepath  # type: ignore
+
+
+def _get_modified_time(path: str) -> float:
+    """Return the modification time of the file, 0 (never read) if it does not exist."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def _finished_rows(previous: Dict[str, Any]) -> int:
+    """Return the number of outer iterations of the loop that were finished when loaded.
+
+    AcquisitionLoop preallocates its arrays along the outer loop and marks a finished
+    outer iteration in `__index_1__`, so the rows before the first unmarked one do not
+    change anymore.
+    """
+    index = previous.get("__index_1__")
+    if not isinstance(index, np.ndarray) or index.ndim != 1:
+        return 0
+    unfinished = np.flatnonzero(index == 0)
+    return int(unfinished[0]) if len(unfinished) else len(index)
+
+
+def _can_be_appended(dataset: h5py.Dataset, previous: Any, rows: int) -> bool:
+    """Check if the dataset can be the `previous` array with only some rows changed."""
+    return (
+        isinstance(previous, np.ndarray)
+        and previous.ndim > 0
+        and previous.shape[0] == rows
+        and dataset.shape is not None
+        and dataset.dtype == previous.dtype
+        and dataset.dtype.kind in "biufc"
+        and dataset.shape[1:] == previous.shape[1:]
+        and dataset.shape[0] >= rows
+    )
+
+
+def _is_same_loop(dataset: h5py.Dataset, previous: np.ndarray, start: int) -> bool:
+    """Check that the finished rows in the file are still the `previous` ones.
+
+    Only the first and the last finished rows are compared, so that a loop saved again
+    under the same key (e.g. a new run of the acquisition) is read entirely.
+    """
+    for row in {0, start - 1}:
+        if not np.array_equal(dataset[row], previous[row], equal_nan=True):
+            return False
+    return True
+
+
+def _read_appended_group(group: h5py.Group, previous: Dict[str, Any]) -> Dict[str, Any]:
+    """Read the group of a loop. Finished outer iterations are not read again."""
+    start = _finished_rows(previous)
+    rows = len(previous["__index_1__"]) if start else 0
+    appended = {
+        key
+        for key in group.keys()
+        if start
+        and isinstance(group[key], h5py.Dataset)
+        and _can_be_appended(group[key], previous.get(key), rows)
+    }
+    if not all(_is_same_loop(group[key], previous[key], start) for key in appended):
+        appended = set()
+
+    data = {}
+    for key in group.keys():
+        item = group[key]
+        if isinstance(item, h5py.Group):
+            data[key] = open_h5_group(item)
+        elif key in appended:
+            data[key] = np.concatenate([previous[key][:start], item[start:]])
+        else:
+            data[key] = transform_on_open(item[()])  # type: ignore
+    return data
+
+
+def _read_pulled_item(item: Union[h5py.Group, h5py.Dataset], previous: Any) -> Any:
+    if isinstance(item, h5py.Dataset):
+        return transform_on_open(item[()])
+    if isinstance(previous, AnalysisLoop):
+        value = _read_appended_group(item, previous.asdict())
+    else:
+        value = open_h5_group(item)
+    if value.get("__loop_shape__") is not None:
+        return AnalysisLoop(value)
+    return value
@@ -0,0 +1,293 @@
+"""Functions to read the same information from many acquisition files at once."""
+
+import functools
+import glob
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import h5py
+import numpy as np
+from dh5 import DH5
+from dh5.dh5_class.h5py_utils import open_h5_group, transform_on_open
+
+from ..parsing import parse_str
+from . import container, layout
+from .analysis_loop import AnalysisLoop
+from .config_store import read_configs
+
+
+class ConfigParamsColumns(NamedTuple):
+    """Values of the config parameters extracted from many files.
+
+    `values` is a dictionary {parameter name: masked array}. The i-th element of each array
+    corresponds to the i-th file of `files`. The elements are masked if the parameter
+    cannot be found inside the file. `errors` is a dictionary {file: error message} of
+    the files that cannot be read. All their values are masked.
+    """
+
+    files: Tuple[str, ...]
+    values: Dict[str, np.ma.MaskedArray]
+    errors: Dict[str, str]
+
+
+class KeyValues(NamedTuple):
+    """Values of a key loaded from many files.
+
+    `values` is either an array where the first axis corresponds to `files`, either a list
+    with one element per file if the shapes are not compatible. `files` contains only
+    the files that were successfully loaded. `errors` is a dictionary {file: error message}
+    of the files that cannot be read.
+    """
+
+    files: Tuple[str, ...]
+    values: Union[np.ndarray, List[Any]]
+    errors: Dict[str, str]
+
+
+def get_files_list(files: Union[str, Iterable[str]]) -> List[str]:
+    """Return the list of the h5 files.
+
+    Args:
+        files (str | Iterable[str]): Either a glob pattern (e.g. `data/T1/*.h5`), either
+            the paths to the files. The `.h5` extension is added if missing. The pattern
+            also matches the files inside the date and month shards of its directory
+            (e.g. `data/T1/2024_01_31/*.h5`, see `layout`), and the files are sorted as
+            if they were in the same directory. The containers matching the pattern are
+            replaced by their acquisitions (`container.h5::group`, see `container`).
+    """
+    if isinstance(files, str):
+        matches = {
+            file
+            for pattern in layout.shard_patterns(files)
+            for file in glob.glob(pattern)
+        }
+        return [
+            acquisition
+            for file in sorted(matches, key=layout.sort_key)
+            for acquisition in (
+                container.list_groups(file)
+                if file.endswith(container.CONTAINER_SUFFIX)
+                else [file]
+            )
+        ]
+    return [
+        file if file.endswith(".h5") or container.SEPARATOR in file else f"{file}.h5"
+        for file in map(str, files)
+    ]
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_config_values(content: str, /) -> Dict[str, Any]:
+    """Return {parameter name: value} of the config content. Cached by the content."""
+    return {name: parsed.value for name, parsed in parse_str(content).items()}
+
+
+def _select_configs(
+    configs: Dict[str, str], config_files: Optional[Sequence[str]]
+) -> List[str]:
+    """Return the contents of the configs with names that start with `config_files`."""
+    if not config_files:
+        return list(configs.values())
+    selected = []
+    for config_name in config_files:
+        for name, content in configs.items():
+            if name.startswith(config_name):
+                selected.append(content)
+                break
+    return selected
+
+
+def _read_file_params(
+    file: str, params: Sequence[str], config_files: Optional[Sequence[str]]
+) -> Dict[str, Any]:
+    filepath, group = container.split(file)
+    data = DH5(filepath, mode="r", open_on_init=False, key_prefix=group)
+    if not config_files and "info" in data:
+        config_files = (data.get_raw("info") or {}).get("default_config_files")
+        if isinstance(config_files, str):
+            config_files = (config_files,)
+
+    values: Dict[str, Any] = {}
+    for content in _select_configs(read_configs(data), config_files):
+        parsed = _parse_config_values(content)
+        values.update({param: parsed[param] for param in params if param in parsed})
+    return values
+
+
+def _to_column(values: List[Any], mask: np.ndarray) -> np.ma.MaskedArray:
+    """Convert the values to the array of the narrowest suitable dtype."""
+    present = [value for value, masked in zip(values, mask) if not masked]
+    if all(
+        isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+        for value in present
+    ):
+        dtype, fill = np.int64, 0
+    elif all(isinstance(value, (int, float, np.number)) for value in present):
+        dtype, fill = np.float64, np.nan
+    elif all(isinstance(value, (int, float, complex, np.number)) for value in present):
+        dtype, fill = np.complex128, np.nan
+    else:
+        dtype, fill = object, None
+
+    data = np.array(
+        [fill if masked else value for value, masked in zip(values, mask)], dtype=dtype
+    )
+    return np.ma.masked_array(data, mask=mask)
+
+
+def extract_config_params(
+    files: Union[str, Iterable[str]],
+    params: Sequence[str],
+    config_files: Optional[Sequence[str]] = None,
+    max_workers: Optional[int] = None,
+) -> ConfigParamsColumns:
+    """Extract the values of the config parameters from many acquisition files.
+
+    Only the configs are read from each file (no `AnalysisData` is created), the files are
+    read in a thread pool, and identical config contents (e.g. shared through the config
+    store) are parsed only once.
+
+    Examples:
+        >>> columns = extract_config_params("data/T1/*.h5", ["flux_bias", "t1"])
+        >>> plt.plot(columns.values["flux_bias"], columns.values["t1"], "o")
+
+    Args:
+        files (str | Iterable[str]): Glob pattern or list of the files to read.
+        params (Sequence[str]): Names of the parameters to extract.
+        config_files (Sequence[str], optional): Names (or beginning of the names) of
+            the configs where to look for the parameters. Defaults to `default_config_files`
+            saved inside each file, or all configs if they are not set.
+        max_workers (int, optional): Number of threads. Defaults to the
+            `ThreadPoolExecutor` default.
+
+    Returns:
+        ConfigParamsColumns with the files, masked arrays of values and errors.
+    """
+    files_list = get_files_list(files)
+    params = list(params)
+
+    def read(file: str) -> Union[Dict[str, Any], Exception]:
+        try:
+            return _read_file_params(file, params, config_files)
+        except Exception as error:  # pylint: disable=broad-except
+            return error
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(read, files_list))
+
+    errors = {
+        file: f"{type(result).__name__}: {result}"
+        for file, result in zip(files_list, results)
+        if isinstance(result, Exception)
+    }
+    files_values = [
+        {} if isinstance(result, Exception) else result for result in results
+    ]
+
+    values = {}
+    for param in params:
+        column = [file_values.get(param) for file_values in files_values]
+        mask = np.array(
+            [param not in file_values for file_values in files_values], dtype=bool
+        )
+        values[param] = _to_column(column, mask)
+
+    return ConfigParamsColumns(tuple(files_list), values, errors)
+
+
+def _read_key(file: str, key: str, index: Any = None) -> Any:
+    """Read only the `key` (or only `key[index]`) from the h5 file."""
+    filepath, group = container.split(file)
+    with h5py.File(filepath, "r") as h5_file:
+        root = h5_file if group is None else h5_file[group]
+        if key not in root:
+            raise KeyError(f"Key '{key}' cannot be found inside the file.")
+        item = root[key]
+        if isinstance(item, h5py.Group):
+            if index is not None:
+                raise ValueError(f"Key '{key}' is a group and cannot be sliced.")
+            value = open_h5_group(item)
+            if value.get("__loop_shape__") is not None:
+                return AnalysisLoop(value)
+            return value
+        return transform_on_open(item[() if index is None else index])  # type: ignore
+
+
+def _stack(values: List[Any], stack: Optional[bool]) -> Union[np.ndarray, List[Any]]:
+    """Stack the values into one array if possible, otherwise return the list."""
+    if stack is False:
+        return values
+    if not any(isinstance(value, (dict, DH5)) for value in values):
+        try:
+            if len({np.shape(value) for value in values}) <= 1:
+                return np.array(values)
+        except ValueError:
+            pass
+    if stack:
+        raise ValueError("Cannot stack values as their shapes are different.")
+    return values
+
+
+def load_key_from_files(
+    files: Union[str, Iterable[str]],
+    key: str,
+    index: Any = None,
+    stack: Optional[bool] = None,
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+) -> KeyValues:
+    """Load the same key from many acquisition files concurrently.
+
+    Only the requested key is read from each file (or even only the `index` part of it),
+    so it is much faster than creating an `AnalysisData` for each file.
+
+    Examples:
+        >>> res = load_key_from_files("data/T1/*.h5", "y")
+        >>> res.values.shape  # (number of files, *shape of y)
+        >>> res = load_key_from_files(files, "y", index=np.s_[:, :100])  # read a slice only
+
+    Args:
+        files (str | Iterable[str]): Glob pattern or list of the files to read.
+        key (str): The key to load. Nested keys are given as `key1/key2`.
+        index (optional): Index or slice to read from the dataset (e.g. `np.s_[::2]`).
+            Defaults to read the whole dataset.
+        stack (bool, optional): If True, the values are stacked into one array and
+            ValueError is raised if the shapes are different. If False, a list is returned.
+            Defaults to stack only if the shapes are compatible.
+        max_workers (int, optional): Number of workers. Defaults to the executor default.
+        use_processes (bool, optional): Use processes instead of threads. HDF5 calls inside
+            one process are serialized by h5py, so processes can be faster for many large
+            files. Defaults to False.
+
+    Returns:
+        KeyValues with the loaded files, their values and the errors.
+    """
+    files_list = get_files_list(files)
+    executor: Executor = (
+        ProcessPoolExecutor(max_workers=max_workers)
+        if use_processes
+        else ThreadPoolExecutor(max_workers=max_workers)
+    )
+    with executor:
+        futures = [executor.submit(_read_key, file, key, index) for file in files_list]
+
+    loaded_files, values, errors = [], [], {}
+    for file, future in zip(files_list, futures):
+        error = future.exception()
+        if error is not None:
+            errors[file] = f"{type(error).__name__}: {error}"
+            continue
+        loaded_files.append(file)
+        values.append(future.result())
+
+    return KeyValues(tuple(loaded_files), _stack(values, stack), errors)
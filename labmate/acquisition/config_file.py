@@ -1,8 +1,51 @@
 """ConfigFile class."""
-from typing import Any
+
+import functools
+from typing import Any, Callable
 from .. import attrdict
 
 
+def _compile_content(content: str):
+    return compile(content, "<string>", "exec")  # noqa: DUO110
+
+
+def _compile_expression(expression: str):
+    return compile(expression, "<string>", "eval")  # noqa: DUO110
+
+
+_compile: Callable[[str], Any] = functools.lru_cache(maxsize=128)(_compile_content)
+_compile_expression_cached: Callable[[str], Any] = functools.lru_cache(maxsize=1024)(
+    _compile_expression
+)
+
+
+def set_eval_cache_size(modules: int = 128, expressions: int = 1024):
+    """Set the number of entries kept by the evaluation cache of `ConfigFile`.
+
+    The code compiled from the content of the config file and from the `eval_key`
+    expressions is cached. The code is executed on every call, so the returned values are
+    never shared between the callers. The least recently used entries are evicted once the
+    limit is reached. Set both sizes to 0 to disable the cache.
+
+    Args:
+        modules (int, optional): Number of config contents for which the compiled code
+            is kept. Defaults to 128.
+        expressions (int, optional): Number of expressions for which the compiled code
+            is kept. Defaults to 1024.
+    """
+    global _compile, _compile_expression_cached  # pylint: disable=W0603
+    _compile = functools.lru_cache(maxsize=modules)(_compile_content)
+    _compile_expression_cached = functools.lru_cache(maxsize=expressions)(
+        _compile_expression
+    )
+
+
+def clear_eval_cache():
+    """Remove all the entries from the evaluation cache of `ConfigFile`."""
+    for func in (_compile, _compile_expression_cached):
+        func.cache_clear()  # type: ignore
+
+
 class ConfigFile(attrdict.AttrDict):
     """A dictionary-like object that represents a configuration file.
 
@@ -12,6 +55,10 @@ class ConfigFile(attrdict.AttrDict):
     contents of the file as a Python module and for evaluating a specific
     key in the file.
 
+    The compiled code is cached, so evaluating the same content many times (e.g. the same
+    config saved inside many acquisitions) compiles it only once. See
+    `set_eval_cache_size` and `clear_eval_cache` to control the cache.
+
     Attributes:
         content (str): The contents of the configuration file as a string.
     """
@@ -30,9 +77,13 @@ class ConfigFile(attrdict.AttrDict):
         super().__init__(data)
         self.content = code
 
-    def eval_as_module(self):
+    def eval_as_module(self, cache: bool = True):
         """Evaluate the contents of the configuration file as a Python module.
 
+        Args:
+            cache (bool, optional): If the compiled code can be taken from the cache.
+                The code is executed on every call anyway. Defaults to True.
+
         Returns:
             A new module object that contains the evaluated contents of the
             configuration file.
@@ -43,15 +94,20 @@ class ConfigFile(attrdict.AttrDict):
             raise ValueError("Content is not defined")
 
         module = type(attrdict)("config_module")
-        cc = compile(self.content, "<string>", "exec")  # noqa: DUO110
-        eval(cc, module.__dict__)  # pylint: disable=W0123 # noqa: DUO104
+        if cache:
+            code = _compile(self.content)
+        else:
+            code = compile(self.content, "<string>", "exec")  # noqa: DUO110
+        eval(code, module.__dict__)  # pylint: disable=W0123 # noqa: DUO104
         return module
 
-    def eval_key(self, key) -> Any:
+    def eval_key(self, key, cache: bool = True) -> Any:
         """Evaluate a specific key in the configuration file.
 
         Args:
             key (str): The key to evaluate.
+            cache (bool, optional): If the compiled expression can be taken from the
+                cache. Defaults to True.
 
         Returns:
             The evaluated value of the specified key, or `None` if the key is not
@@ -59,5 +115,8 @@ class ConfigFile(attrdict.AttrDict):
         """
         val = self.get(key)
         if val and val.value:
-            return eval(val.value)  # pylint: disable=W0123 # noqa: DUO104
+            if not cache or not isinstance(val.value, str):
+                return eval(val.value)  # pylint: disable=W0123 # noqa: DUO104
+            code = _compile_expression_cached(val.value)
+            return eval(code)  # pylint: disable=W0123 # noqa: DUO104
         return None
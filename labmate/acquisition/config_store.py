@@ -0,0 +1,203 @@
+"""ConfigStore class and helpers to work with content-addressed config files."""
+
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+from typing import Dict, Iterable, Optional, Union
+
+from dh5 import DH5
+from dh5.path import Path
+
+STORE_DIRNAME = ".config_store"
+
+
+class ConfigStore:
+    """Content-addressed storage of the config files.
+
+    Every config is saved once under the name equal to the hash of its content. So thousands
+    of acquisitions with unchanged configs reference the same file instead of keeping
+    their own copy.
+
+    Examples:
+        >>> store = ConfigStore("data_directory/.config_store")
+        >>> key = store.put("param = 1")
+        >>> store.get(key)
+        'param = 1'
+
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        """Create a store at the `directory`. The directory is created on the first `put`.
+
+        Args:
+            directory (str | Path): Path to the directory where the configs are stored.
+        """
+        self.directory = str(directory)
+
+    @staticmethod
+    def hash(content: str) -> str:
+        """Return the key under which the `content` is stored."""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        """Return the path to the file that contains config with the `key`."""
+        return os.path.join(self.directory, key)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def put(self, content: str) -> str:
+        """Save the `content` if it's not in the store yet and return its key.
+
+        The file is written to a temporary file first and then renamed, so concurrent readers
+        never see a partially written config. Stored files are read-only.
+        """
+        key = self.hash(content)
+        if key in self:
+            return key
+
+        os.makedirs(self.directory, exist_ok=True)
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as file:
+                file.write(content)
+            os.chmod(tmp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key
+
+    def get(self, key: str) -> str:
+        """Return the content of the config with the `key`.
+
+        Raises:
+            ValueError: If there is no config with such key inside the store.
+        """
+        if key not in self:
+            raise ValueError(
+                f"Config with the hash '{key}' cannot be found in the store at {self.directory}"
+            )
+        with open(self.path(key), "r", encoding="utf-8") as file:
+            return file.read()
+
+    def link(self, key: str, destination: str):
+        """Create a file at `destination` with the content of the config with `key`.
+
+        The content is copied, so editing the file does not change the stored config that
+        other acquisitions refer to.
+        """
+        if os.path.exists(destination):
+            os.remove(destination)
+        shutil.copyfile(self.path(key), destination)
+
+
+def get_store_path(filepath: str, store: str) -> str:
+    """Return the absolute path to the store saved relatively to the `filepath` h5 file."""
+    return os.path.normpath(os.path.join(os.path.dirname(filepath), store))
+
+
+def find_store(filepath: str, store: str, keys: Iterable[str] = ()) -> ConfigStore:
+    """Return the store of the `filepath` h5 file that contains all the `keys`.
+
+    The store saved relatively to the file is checked first. If the file was moved since
+    (e.g. by `layout.migrate`), the `.config_store` of the closest parent directory with
+    the keys, i.e. of the data directory, is used.
+    """
+    keys = list(keys)
+    candidates = [get_store_path(filepath, store)]
+    directory = os.path.dirname(os.path.abspath(filepath))
+    while True:
+        candidates.append(os.path.join(directory, STORE_DIRNAME))
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    for candidate in candidates:
+        config_store = ConfigStore(candidate)
+        if os.path.isdir(candidate) and all(key in config_store for key in keys):
+            return config_store
+    return ConfigStore(candidates[0])
+
+
+def get_relative_store_path(filepath: str, store: ConfigStore) -> str:
+    """Return the path to the `store` relative to the directory of the `filepath`."""
+    try:
+        return os.path.relpath(store.directory, os.path.dirname(filepath))
+    except ValueError:  # Different drives on Windows
+        return os.path.abspath(store.directory)
+
+
+def resolve_configs(
+    configs_ref: Dict[str, str], filepath: str, store: str
+) -> Dict[str, str]:
+    """Read from the store the configs referenced by `configs_ref`.
+
+    Args:
+        configs_ref (dict[str, str]): Dictionary {config name: hash}.
+        filepath (str): Path to the h5 file that references the configs.
+        store (str): Path to the store relative to `filepath` directory.
+            See `find_store` if it's not there anymore.
+
+    Returns:
+        Dictionary {config name: content}.
+    """
+    config_store = find_store(filepath, store, configs_ref.values())
+    return {name: config_store.get(key) for name, key in configs_ref.items()}
+
+
+def read_configs(data: DH5) -> Dict[str, str]:
+    """Return the dictionary {config name: content} of the configs saved inside `data`.
+
+    Configs saved in the config store (`configs_ref` key) are read from the store.
+    """
+    configs = dict(data.get_raw("configs") or {})
+    if "configs_ref" in data:
+        configs.update(
+            resolve_configs(
+                data.get_raw("configs_ref"),
+                data.filepath,
+                data.get_raw("configs_store"),
+            )
+        )
+    return configs
+
+
+def inline_configs(filepath: str, destination: Optional[str] = None) -> str:
+    """Put the content of the configs from the store inside the h5 file.
+
+    It's used to share a single file that should not depend on the config store.
+
+    Args:
+        filepath (str): Path to the h5 file.
+        destination (str, optional): Path to where the exported copy should be saved.
+            Defaults to modify the file at `filepath` in place.
+
+    Returns:
+        Path to the file with inlined configs.
+    """
+    filepath = filepath if filepath.endswith(".h5") else filepath + ".h5"
+    if destination is not None:
+        destination = (
+            destination if destination.endswith(".h5") else destination + ".h5"
+        )
+        shutil.copyfile(filepath, destination)
+    else:
+        destination = filepath
+
+    data = DH5(destination, mode="a")
+    if "configs_ref" not in data:
+        return destination
+
+    configs = dict(data.get_raw("configs") or {})
+    configs.update(
+        resolve_configs(data.get_raw("configs_ref"), filepath, data["configs_store"])
+    )
+    data["configs"] = configs
+    data.pop("configs_ref")
+    data.pop("configs_store")
+    data.save()
+    return destination
@@ -0,0 +1,198 @@
+"""Acquisitions saved as groups of a shared h5 file (container).
+
+Creating thousands of small files is slow on most filesystems. In the container mode
+(see `container_size` of `AcquisitionManager`), every acquisition created with
+`create_acquisition` is saved into a group of the current container of the experiment.
+A new container is started once the current one has `container_size` acquisitions.
+
+An acquisition inside a container is addressed as `path/to/container.h5::group`. The path
+`path/to/group` that the acquisition would have as a separate file is resolved to it as
+well, so the acquisitions can be opened by their name as usual.
+"""
+
+import glob
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import h5py
+from dh5.dh5_class.h5py_utils import LockFile
+from dh5.errors import FileLockedError
+from dh5.utils import async_utils
+
+from ..logger import logger
+from ..utils import get_timestamp
+
+SEPARATOR = "::"
+CONTAINER_SUFFIX = "__container.h5"
+
+# Current container of each directory, the number of groups inside it and the names
+# of the last groups created by this process
+_CURRENT: Dict[str, Tuple[str, int, List[str]]] = {}
+_CURRENT_LOCK = threading.Lock()
+
+
+def split(filepath: str) -> Tuple[str, Optional[str]]:
+    """Split `container.h5::group` into the path of the h5 file and the group.
+
+    Returns:
+        (str, str | None): The path with `.h5` extension and the group, or None if the
+            path is not inside a container.
+    """
+    filepath = str(filepath)
+    filepath, _, group = filepath.partition(SEPARATOR)
+    filepath = filepath if filepath.endswith(".h5") else filepath + ".h5"
+    return filepath, group or None
+
+
+def join(filepath: str, group: str) -> str:
+    """Return the identifier of the group inside the container."""
+    filepath = str(filepath)
+    filepath = filepath if filepath.endswith(".h5") else filepath + ".h5"
+    return f"{filepath}{SEPARATOR}{group}"
+
+
+def list_containers(directory: str) -> List[str]:
+    """Return the containers inside the directory from the oldest to the newest."""
+    pattern = os.path.join(glob.escape(str(directory)), "*" + CONTAINER_SUFFIX)
+    return sorted(glob.glob(pattern))
+
+
+def list_groups(filepath: str) -> List[str]:
+    """Return the identifiers of the acquisitions inside the container."""
+    with h5py.File(filepath, "r") as file:
+        return [join(filepath, group) for group in sorted(file.keys())]
+
+
+def find(filepath: str) -> Optional[str]:
+    """Return the identifier of the acquisition that would be saved as `filepath`.
+
+    Args:
+        filepath (str): Path to the acquisition as if it was saved as a separate file,
+            with or without `.h5` extension.
+
+    Returns:
+        str | None: `container.h5::group` if a container next to the path has the group.
+    """
+    filepath = str(filepath)
+    filepath = filepath[:-3] if filepath.endswith(".h5") else filepath
+    directory, group = os.path.split(filepath)
+    for container in reversed(list_containers(directory or ".")):
+        try:
+            with h5py.File(container, "r") as file:
+                if group in file:
+                    return join(container, group)
+        except OSError as error:
+            logger.debug("Cannot read container %s: %s", container, error)
+    return None
+
+
+def resolve(filepath: str) -> Tuple[str, Optional[str]]:
+    """Return the h5 file and the group (or None) to open for the path.
+
+    The path can be a file, `container.h5::group` or the path of an acquisition inside
+    a container as if it was a separate file.
+    """
+    h5_path, group = split(filepath)
+    if group is None and not os.path.exists(h5_path):
+        identifier = find(h5_path)
+        if identifier is not None:
+            return split(identifier)
+    return h5_path, group
+
+
+def exists(filepath: str) -> bool:
+    """Check if the file or the acquisition inside a container exists."""
+    h5_path, group = resolve(filepath)
+    if not os.path.exists(h5_path):
+        return False
+    if group is None:
+        return True
+    with h5py.File(h5_path, "r") as file:
+        return group in file
+
+
+def add_group(
+    filepath: str,
+    group: str,
+    exist_ok: bool = False,
+    retry_on_locked: int = 5,
+    reserved: Sequence[str] = (),
+) -> str:
+    """Create the group inside the container (and the container if needed).
+
+    Args:
+        filepath (str): Path to the container.
+        group (str): Desired name of the group.
+        exist_ok (bool, optional): If True, an existing group is used. Otherwise, a suffix
+            `__1`, `__2`... is added to the name. Defaults to False.
+        retry_on_locked (int, optional): How many times to retry if the container is
+            locked by a writer. Defaults to 5.
+        reserved (Sequence[str], optional): Names that cannot be used in addition to the
+            groups of the container.
+
+    Returns:
+        str: Name of the created group.
+    """
+    filepath, _ = split(filepath)
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    for i in range(retry_on_locked):
+        try:
+            with LockFile(filepath), h5py.File(filepath, "a") as file:
+                name, index = group, 1
+                while (name in file and not exist_ok) or name in reserved:
+                    name = f"{group}__{index}"
+                    index += 1
+                if name not in file:
+                    file.create_group(name)
+                return name
+        except FileLockedError:
+            logger.info("Container is locked. waiting 1s and %d more retrying.", i)
+            async_utils.sleep(1)
+    raise FileLockedError(f"Even after {retry_on_locked} the group was not created")
+
+
+def add_acquisition(
+    directory: str, name: str, group: str, max_acquisitions: int
+) -> str:
+    """Create the group for a new acquisition inside the current container.
+
+    The newest container of the directory is used until it has `max_acquisitions`
+    groups, then a new one is created.
+
+    Args:
+        directory (str): Directory of the experiment.
+        name (str): Name of the experiment. Used in the name of the new container.
+        group (str): Desired name of the group, i.e. the name the file would have.
+        max_acquisitions (int): Maximum number of acquisitions in one container.
+
+    Returns:
+        str: Identifier `container.h5::group` of the acquisition.
+    """
+    directory = os.path.abspath(str(directory))
+    with _CURRENT_LOCK:
+        current = _CURRENT.get(directory)
+        if current is None or not os.path.exists(current[0]):
+            current = None
+            containers = list_containers(directory)
+            if containers:
+                with h5py.File(containers[-1], "r") as file:
+                    current = (containers[-1], len(file.keys()), [])
+
+        if current is None or current[1] >= max_acquisitions:
+            filepath_original = filepath = os.path.join(
+                directory, f"{get_timestamp()}__{name}"
+            )
+            index = 1
+            while os.path.exists(filepath + CONTAINER_SUFFIX):
+                filepath = filepath_original + f"__{index}"
+                index += 1
+            # Names are made of the time, so only the groups created in the same second
+            # in the previous container could have the same name
+            reserved = current[2] if current is not None else []
+            current = (filepath + CONTAINER_SUFFIX, 0, reserved)
+
+        reserved = [other for other in current[2] if other.startswith(group)]
+        group = add_group(current[0], group, reserved=reserved)
+        _CURRENT[directory] = (current[0], current[1] + 1, current[2][-100:] + [group])
+        return join(current[0], group)
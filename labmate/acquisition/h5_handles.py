@@ -0,0 +1,199 @@
+"""Pool of h5 files that are kept open between the saves of an acquisition.
+
+DH5 opens and closes the file for every save. For the files registered with `enable`,
+the classes with `PooledSaveMixin` (and the arrays of the loops, `PooledSyncNp`, see
+`pooled_save`) save through a handle that stays open and is flushed at most every
+`flush_interval` seconds.
+The handle is closed by `close`, after `idle_timeout` seconds without saves, and at the
+exit of the interpreter.
+
+While the file is open, it is locked with the same `.lock` file as DH5 uses while
+saving, so other writers and `repack` leave it alone until it's closed. Other processes
+cannot read it either (HDF5 file locking), so `idle_timeout` should be short if the
+file is read elsewhere during the acquisition.
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import h5py
+import numpy as np
+from dh5.dh5_class.h5py_utils import LockFile, save_sub_dict
+
+
+class _PooledFile:
+    def __init__(self, filepath: str, idle_timeout: float, flush_interval: float):
+        self.filepath = filepath
+        self.idle_timeout = idle_timeout
+        self.flush_interval = flush_interval
+        self.file: Optional[h5py.File] = None
+        self.lock: Optional[LockFile] = None
+        self.last_save = 0.0
+        self.last_flush = 0.0
+        self.timer: Optional[threading.Timer] = None
+
+
+_POOL: Dict[str, _PooledFile] = {}
+_POOL_LOCK = threading.RLock()
+
+
+def _get_key(filepath: str) -> str:
+    filepath = str(filepath)
+    return os.path.abspath(filepath if filepath.endswith(".h5") else filepath + ".h5")
+
+
+def enable(filepath: str, idle_timeout: float = 1.0, flush_interval: float = 1.0):
+    """Keep the file open between the saves.
+
+    Args:
+        filepath (str): Path to the h5 file, with or without extension.
+        idle_timeout (float, optional): Close the file after this time (in seconds)
+            without saves. Defaults to 1.
+        flush_interval (float, optional): Flush the file at most every this time (in
+            seconds) while it's open. Defaults to 1.
+    """
+    with _POOL_LOCK:
+        key = _get_key(filepath)
+        if key in _POOL:
+            _POOL[key].idle_timeout = idle_timeout
+            _POOL[key].flush_interval = flush_interval
+        else:
+            _POOL[key] = _PooledFile(key, idle_timeout, flush_interval)
+
+
+def disable(filepath: str):
+    """Close the file and open it again for every save as usual."""
+    with _POOL_LOCK:
+        pooled = _POOL.pop(_get_key(filepath), None)
+        if pooled is not None:
+            _close_file(pooled)
+
+
+def is_enabled(filepath: str) -> bool:
+    return _get_key(filepath) in _POOL
+
+
+def is_open(filepath: str) -> bool:
+    pooled = _POOL.get(_get_key(filepath))
+    return pooled is not None and pooled.file is not None
+
+
+def close(filepath: Optional[str] = None):
+    """Close the file (or all files if `filepath` is None). It's reopened on next save."""
+    with _POOL_LOCK:
+        if filepath is not None:
+            pooled = _POOL.get(_get_key(filepath))
+            pooled_files = [pooled] if pooled is not None else []
+        else:
+            pooled_files = list(_POOL.values())
+        for pooled in pooled_files:
+            _close_file(pooled)
+
+
+def _close_file(pooled: _PooledFile):
+    if pooled.timer is not None:
+        pooled.timer.cancel()
+        pooled.timer = None
+    if pooled.file is not None:
+        pooled.file.close()
+        pooled.file = None
+    if pooled.lock is not None:
+        pooled.lock.__exit__(None, None, None)
+        pooled.lock = None
+
+
+def _close_if_idle(pooled: _PooledFile):
+    with _POOL_LOCK:
+        pooled.timer = None
+        if pooled.file is None:
+            return
+        idle_time = time.monotonic() - pooled.last_save
+        if idle_time >= pooled.idle_timeout:
+            _close_file(pooled)
+        else:
+            _start_timer(pooled, pooled.idle_timeout - idle_time)
+
+
+def _start_timer(pooled: _PooledFile, delay: float):
+    if pooled.timer is not None:
+        return
+    pooled.timer = threading.Timer(delay, _close_if_idle, args=(pooled,))
+    pooled.timer.daemon = True
+    pooled.timer.start()
+
+
+def _open_file(pooled: _PooledFile) -> h5py.File:
+    if pooled.file is None:
+        os.makedirs(os.path.dirname(pooled.filepath), exist_ok=True)
+        lock = LockFile(pooled.filepath)
+        lock.__enter__()
+        try:
+            pooled.file = h5py.File(pooled.filepath, "a")
+        except BaseException:
+            lock.__exit__(None, None, None)
+            raise
+        pooled.lock = lock
+        pooled.last_flush = time.monotonic()
+    return pooled.file
+
+
+def _saved(pooled: _PooledFile):
+    pooled.last_save = time.monotonic()
+    if pooled.file is not None and (
+        pooled.last_save - pooled.last_flush >= pooled.flush_interval
+    ):
+        pooled.file.flush()
+        pooled.last_flush = pooled.last_save
+    _start_timer(pooled, pooled.idle_timeout)
+
+
+def save_dict(filepath: str, data: dict, key_prefix: Optional[str] = None) -> float:
+    """Save dict to the h5 file through the pooled handle. Same as dh5 `save_dict`.
+
+    Returns:
+        float: Time of the last modification of the file.
+
+    Raises:
+        FileLockedError: If the file is locked by another writer.
+    """
+    with _POOL_LOCK:
+        pooled = _POOL[_get_key(filepath)]
+        file = _open_file(pooled)
+        for key, value in data.items():
+            key = key if key_prefix is None else f"{key_prefix}/{key}"
+            if key in file:
+                file.pop(key)
+            if value is None:
+                continue
+            save_sub_dict(file, value, key)
+        _saved(pooled)
+    return os.path.getmtime(pooled.filepath)
+
+
+def save_items(filepath: str, key: str, array: np.ndarray, indexes: Optional[list]):
+    """Save the items of the array through the pooled handle. Same as dh5 `SyncNp.save`.
+
+    Args:
+        filepath (str): Path to the h5 file.
+        key (str): Key of the array inside h5 file.
+        array (np.ndarray): Whole array.
+        indexes (list, optional): Indexes of the items that have changed. If None, the
+            whole array is saved.
+    """
+    with _POOL_LOCK:
+        pooled = _POOL[_get_key(filepath)]
+        file = _open_file(pooled)
+        if indexes is None or key not in file:
+            if key in file:
+                del file[key]
+            file[key] = array
+        else:
+            for index in indexes:
+                file[key][index] = array[index]
+        _saved(pooled)
+
+
+atexit.register(close)
@@ -0,0 +1,539 @@
+"""Append-only journal of the saves of an acquisition.
+
+For the files registered with `enable`, the classes with `PooledSaveMixin` do not write
+the h5 file on every save. Instead, the saved values are appended as records to the
+`.journal` file next to it, which is cheap and cannot corrupt the h5 file if the kernel
+dies. The records are folded into the h5 file in the background every `fold_interval`
+seconds, on `fold` and at the exit of the interpreter.
+
+For the arrays of the loops (`AcquisitionLoop`) only the changed items are saved, so
+appending a point does not write the whole array again.
+
+If the kernel died before the journal was folded, the records are folded by `recover`,
+which is called when the acquisition is opened again, and they are replayed in memory
+when the file is opened by `AnalysisData`.
+
+Every record is stored as its size, a JSON header with the structure of the record and
+the arrays in npy format (see `encode_record`). Nothing is unpickled, so reading a
+journal cannot execute code.
+"""
+
+import atexit
+import io
+import json
+import os
+import struct
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import h5py
+import numpy as np
+from dh5.dh5_class.h5py_utils import (
+    LockFile,
+    save_sub_dict,
+    transform_not_dict_on_save,
+    transform_on_open,
+)
+from dh5.errors import FileLockedError
+
+from ..logger import logger
+from . import shared_array
+
+Record = Tuple[Any, ...]
+
+_HEADER = struct.Struct("<I")
+_ARRAY_HEADER = struct.Struct("<Q")
+
+
+def _get_key(filepath: str) -> str:
+    filepath = str(filepath)
+    return os.path.abspath(filepath if filepath.endswith(".h5") else filepath + ".h5")
+
+
+def journal_path(filepath: str) -> str:
+    """Return the path of the journal of the h5 file (with or without extension)."""
+    return os.path.splitext(_get_key(filepath))[0] + ".journal"
+
+
+def _join(key_prefix: Optional[str], key: str) -> str:
+    return key if key_prefix is None else f"{key_prefix}/{key}"
+
+
+def _to_plain(value: Any, share: bool = False) -> Any:
+    """Convert the value to what would be saved inside h5 file, so it can be recorded.
+
+    If `share` is True, the arrays mapped from a `SharedArray` are replaced by the handle,
+    unless it was already sent or released: the array mapped by this process is copied.
+    """
+    handle = shared_array.get_handle(value) if share else None
+    if shared_array.can_be_sent(handle):
+        return handle
+    if hasattr(value, "asdict"):
+        value = value.asdict()
+    if hasattr(value, "asarray"):
+        value = value.asarray()
+    if isinstance(value, dict):
+        return {key: _to_plain(sub_value, share) for key, sub_value in value.items()}
+    if isinstance(value, np.ndarray):
+        return np.asarray(value)
+    if value is None:
+        return None
+    return transform_not_dict_on_save(value)
+
+
+def set_record(
+    data: Dict[str, Any], key_prefix: Optional[str] = None, share: bool = False
+) -> Record:
+    """Return the record of data saved with dh5 `save_dict`. None values delete keys.
+
+    If `share` is True, the arrays mapped from a `SharedArray` are kept as handles, i.e.
+    the record can only be applied by another process while the memory is not released.
+    """
+    values = {key: _to_plain(value, share) for key, value in data.items()}
+    return ("set", key_prefix, values)
+
+
+def items_record(
+    key: str,
+    array: np.ndarray,
+    indexes: List[Any],
+    shared_items: Optional[Dict[Any, "shared_array.SharedArray"]] = None,
+) -> Record:
+    """Return the record of the changed items of the array saved under `key`.
+
+    `shared_items` are the handles that hold the values of some items. They are put inside
+    the record instead of the values, like with `set_record(share=True)`.
+    """
+    items = []
+    for index in indexes:
+        handle = _get_shared_item(shared_items, index)
+        if shared_array.can_be_sent(handle):
+            items.append((index, handle))
+        else:
+            items.append((index, np.asarray(array[index])))
+    return ("items", None, key, array.shape, items)
+
+
+def _get_shared_item(
+    shared_items: Optional[Dict[Any, "shared_array.SharedArray"]], index: Any
+) -> Optional["shared_array.SharedArray"]:
+    if not shared_items:
+        return None
+    try:
+        return shared_items.get(index)
+    except TypeError:  # unhashable index, e.g. a slice
+        return None
+
+
+class Journal:
+    """Journal of one h5 file. Use `enable` to create it."""
+
+    def __init__(self, filepath: str, fold_interval: float = 5.0, fsync: bool = False):
+        self.filepath = _get_key(filepath)
+        self.path = journal_path(filepath)
+        self.fold_interval = fold_interval
+        self.fsync = fsync
+        self._file = None
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
+    def write(self, data: Dict[str, Any], key_prefix: Optional[str] = None):
+        """Append the saved data to the journal.
+
+        Args:
+            data (dict): Data as given to dh5 `save_dict`. None values delete the keys.
+            key_prefix (str, optional): Location of the data inside h5 file.
+        """
+        self._append(set_record(data, key_prefix))
+
+    def write_items(self, key: str, array: np.ndarray, indexes: List[Any]):
+        """Append the items of the array that have changed to the journal.
+
+        Args:
+            key (str): Key of the array inside h5 file.
+            array (np.ndarray): Whole array.
+            indexes (list): Indexes of the items that have changed.
+        """
+        self._append(items_record(key, array, indexes))
+
+    def _append(self, record: Record):
+        payload = encode_record(record)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "ab")  # pylint: disable=R1732
+            self._file.write(_HEADER.pack(len(payload)) + payload)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._start_timer()
+
+    def fold(self):
+        """Write the records to the h5 file and empty the journal.
+
+        Raises:
+            FileLockedError: If the h5 file is locked by another writer.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            _fold(self.filepath, self.path)
+
+    def _fold_in_background(self):
+        with self._lock:
+            self._timer = None
+            try:
+                self.fold()
+            except (FileLockedError, OSError) as error:
+                logger.info("Journal was not folded (%s). Retrying later.", error)
+                self._start_timer()
+
+    def _start_timer(self):
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(self.fold_interval, self._fold_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+
+_JOURNALS: Dict[str, Journal] = {}
+_JOURNALS_LOCK = threading.RLock()
+
+
+def enable(filepath: str, fold_interval: float = 5.0, fsync: bool = False):
+    """Save the file through the journal.
+
+    Args:
+        filepath (str): Path to the h5 file, with or without extension.
+        fold_interval (float, optional): Fold the journal into the h5 file at most
+            this time (in seconds) after a record. Defaults to 5.
+        fsync (bool, optional): Force every record to the disk and not only to the
+            system, i.e. the records survive also a crash of the system and not only of
+            the kernel. Defaults to False.
+    """
+    with _JOURNALS_LOCK:
+        key = _get_key(filepath)
+        if key in _JOURNALS:
+            _JOURNALS[key].fold_interval = fold_interval
+            _JOURNALS[key].fsync = fsync
+        else:
+            _JOURNALS[key] = Journal(key, fold_interval=fold_interval, fsync=fsync)
+
+
+def disable(filepath: str):
+    """Fold the journal and save the file directly as usual."""
+    with _JOURNALS_LOCK:
+        file_journal = _JOURNALS.pop(_get_key(filepath), None)
+    if file_journal is not None:
+        file_journal.fold()
+
+
+def is_enabled(filepath: str) -> bool:
+    return _get_key(filepath) in _JOURNALS
+
+
+def get_journal(filepath: str) -> Optional[Journal]:
+    return _JOURNALS.get(_get_key(filepath))
+
+
+def fold(filepath: Optional[str] = None):
+    """Fold the journal of the file (or of all files if `filepath` is None) now."""
+    with _JOURNALS_LOCK:
+        if filepath is not None:
+            file_journal = _JOURNALS.get(_get_key(filepath))
+            journals = [file_journal] if file_journal is not None else []
+        else:
+            journals = list(_JOURNALS.values())
+    for file_journal in journals:
+        file_journal.fold()
+
+
+def recover(filepath: str) -> bool:
+    """Fold the journal left by a writer that stopped before folding it.
+
+    Should be called only when no one else writes this file, e.g. before opening the
+    acquisition again.
+
+    Returns:
+        bool: True if there was a journal to fold.
+    """
+    if is_enabled(filepath) or not os.path.exists(journal_path(filepath)):
+        return False
+    logger.warning(
+        "The acquisition '%s' was not saved completely. Recovering it from its journal.",
+        filepath,
+    )
+    _fold(_get_key(filepath), journal_path(filepath))
+    return True
+
+
+def discard(filepath: str):
+    """Remove the journal left by a writer, e.g. as the file is overwritten."""
+    if not is_enabled(filepath) and os.path.exists(journal_path(filepath)):
+        os.remove(journal_path(filepath))
+
+
+def read_records(filepath: str) -> List[Record]:
+    """Read the records of the journal of the file.
+
+    A last record that was not written completely (i.e. the writer died) is ignored.
+    """
+    path = journal_path(filepath)
+    records: List[Record] = []
+    try:
+        with open(path, "rb") as file:
+            content = file.read()
+    except FileNotFoundError:
+        return records
+
+    position = 0
+    while position + _HEADER.size <= len(content):
+        (size,) = _HEADER.unpack_from(content, position)
+        position += _HEADER.size
+        if position + size > len(content):
+            break
+        try:
+            records.append(decode_record(content[position : position + size]))
+        except ValueError as error:
+            logger.warning("Journal '%s' cannot be read (%s).", path, error)
+            return records
+        position += size
+    if position != len(content):
+        logger.warning("Last record of '%s' is incomplete and is ignored.", path)
+    return records
+
+
+def encode_record(record: Record) -> bytes:
+    """Return the bytes of the record that `decode_record` reads.
+
+    The structure of the record (lists, tuples, dicts, slices, str and numbers) is saved
+    as JSON and all the other values as npy arrays after it, without pickle.
+
+    Raises:
+        ValueError: If an array contains python objects.
+    """
+    arrays: List[np.ndarray] = []
+    header = json.dumps(_encode(record, arrays)).encode()
+    parts = [_HEADER.pack(len(header)), header]
+    for array in arrays:
+        buffer = io.BytesIO()
+        np.save(buffer, array, allow_pickle=False)
+        parts += [_ARRAY_HEADER.pack(buffer.tell()), buffer.getvalue()]
+    return b"".join(parts)
+
+
+def decode_record(payload: bytes) -> Record:
+    """Read the record written by `encode_record`.
+
+    Raises:
+        ValueError: If the payload is not a valid record.
+    """
+    (size,) = _HEADER.unpack_from(payload, 0)
+    position = _HEADER.size + size
+    try:
+        header = json.loads(payload[_HEADER.size : position])
+    except UnicodeDecodeError as error:
+        raise ValueError(str(error)) from error
+    arrays = []
+    while position < len(payload):
+        (size,) = _ARRAY_HEADER.unpack_from(payload, position)
+        position += _ARRAY_HEADER.size
+        buffer = io.BytesIO(payload[position : position + size])
+        arrays.append(np.load(buffer, allow_pickle=False))
+        position += size
+    record = _decode(header, arrays)
+    if not isinstance(record, tuple):
+        raise ValueError("Journal record should be a tuple.")
+    return record
+
+
+def _encode(value: Any, arrays: List[np.ndarray]) -> Any:
+    """Return the JSON structure of the value. Arrays are appended to `arrays`.
+
+    The dicts of JSON are always tags: the dicts of the value are under "dict" key.
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, np.generic):
+        return value
+    if isinstance(value, dict):
+        return {"dict": {str(k): _encode(v, arrays) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return {type(value).__name__: [_encode(v, arrays) for v in value]}
+    if isinstance(value, slice):
+        return {
+            "slice": [_encode(v, arrays) for v in (value.start, value.stop, value.step)]
+        }
+    arrays.append(np.asarray(value))
+    return {"npy": len(arrays) - 1}
+
+
+def _decode(value: Any, arrays: List[np.ndarray]) -> Any:
+    if not isinstance(value, dict):
+        return value
+    if "dict" in value:
+        return {k: _decode(v, arrays) for k, v in value["dict"].items()}
+    if "list" in value:
+        return [_decode(v, arrays) for v in value["list"]]
+    if "tuple" in value:
+        return tuple(_decode(v, arrays) for v in value["tuple"])
+    if "slice" in value:
+        return slice(*(_decode(v, arrays) for v in value["slice"]))
+    if "npy" in value:
+        array = arrays[value["npy"]]
+        return array[()] if array.ndim == 0 else array
+    raise ValueError(f"Unknown value {value!r} in journal record.")
+
+
+def _fold(filepath: str, path: str):
+    apply_records(filepath, read_records(filepath))
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def apply_records(filepath: str, records: List[Record]):
+    """Write the records to the h5 file in one opening.
+
+    Raises:
+        FileLockedError: If the h5 file is locked by another writer.
+    """
+    if not records:
+        return
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with LockFile(filepath), h5py.File(filepath, "a") as file:
+        for record in records:
+            _apply_to_file(file, record)
+
+
+def _apply_to_file(file: h5py.File, record: Record):
+    if record[0] == "set":
+        _, key_prefix, values = record
+        for key, value in values.items():
+            key = _join(key_prefix, key)
+            if key in file:
+                file.pop(key)
+            value = _resolve(value, key)
+            if value is not None:
+                save_sub_dict(file, value, key)
+        return
+
+    _, key_prefix, key, shape, items = record
+    key = _join(key_prefix, key)
+    dataset = file.get(key)
+    if not isinstance(dataset, h5py.Dataset) or dataset.shape != shape:
+        logger.warning("Journal record of '%s' does not match the file. Skipped.", key)
+        return
+    for index, value in items:
+        value = _resolve(value, key)
+        if value is not None:
+            dataset[index] = value
+
+
+def _resolve(value: Any, key: str) -> Any:
+    """Map the shared arrays of the value. None if one of them was already released."""
+    try:
+        return shared_array.resolve(value)
+    except FileNotFoundError:
+        logger.warning(
+            "Shared memory of '%s' was released before saving. Skipped.", key
+        )
+        return None
+
+
+def _changes(
+    records: List[Record], key_prefix: Optional[str] = None
+) -> Iterator[Tuple[str, List[str], Any]]:
+    """Yield (kind, path relative to `key_prefix`, value or items) of the records."""
+    for record in records:
+        if record[0] == "set":
+            _, record_prefix, values = record
+            changes = [
+                (_join(record_prefix, key), value) for key, value in values.items()
+            ]
+        else:
+            _, record_prefix, key, shape, items = record
+            changes = [(_join(record_prefix, key), (shape, items))]
+
+        for full_key, value in changes:
+            if key_prefix is not None:
+                if not full_key.startswith(key_prefix + "/"):
+                    continue
+                full_key = full_key[len(key_prefix) + 1 :]
+            yield record[0], full_key.split("/"), value
+
+
+def top_keys(records: List[Record], key_prefix: Optional[str] = None) -> Set[str]:
+    """Return the top level keys (inside `key_prefix` group) changed by the records."""
+    return {path[0] for _, path, _ in _changes(records, key_prefix)}
+
+
+def replay(
+    records: List[Record], data: Dict[str, Any], key_prefix: Optional[str] = None
+) -> Dict[str, Any]:
+    """Apply the records to the data read from the h5 file.
+
+    Args:
+        records (list): Records returned by `read_records`.
+        data (dict): Values of the file. Nested dictionaries are modified in place,
+            the arrays are copied before being modified.
+        key_prefix (str, optional): Group of the file that `data` contains. The records
+            outside of it are ignored. Defaults to the root of the file.
+
+    Returns:
+        dict: New values of the top level keys changed by the records. None if the key
+            was deleted.
+    """
+    copied = set()
+    changed = set()
+    for kind, path, value in _changes(records, key_prefix):
+        if kind == "set":
+            _set_path(data, path, _opened(value))
+            copied.add("/".join(path))
+            changed.add(path[0])
+            continue
+
+        shape, items = value
+        array = _get_path(data, path)
+        if not isinstance(array, np.ndarray) or array.shape != shape:
+            continue
+        if "/".join(path) not in copied:
+            array = np.array(array)
+            _set_path(data, path, array)
+            copied.add("/".join(path))
+        for index, item in items:
+            array[index] = item
+        changed.add(path[0])
+
+    return {key: data.get(key) for key in changed}
+
+
+def _opened(value: Any) -> Any:
+    """Return the value as it is read from the h5 file, e.g. lists saved as JSON."""
+    if isinstance(value, dict):
+        return {key: _opened(sub_value) for key, sub_value in value.items()}
+    return transform_on_open(value)
+
+
+def _get_path(data: Dict[str, Any], path: List[str]) -> Any:
+    for part in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)  # type: ignore
+    return data
+
+
+def _set_path(data: Dict[str, Any], path: List[str], value: Any):
+    for part in path[:-1]:
+        if not isinstance(data.get(part), dict):
+            data[part] = {}
+        data = data[part]
+    if value is None:
+        data.pop(path[-1], None)
+    else:
+        data[path[-1]] = value
+
+
+atexit.register(fold)
@@ -0,0 +1,287 @@
+"""Layout of the acquisition files inside the experiment directories.
+
+By default (`flat` layout) all the files of an experiment are saved directly inside
+`data_directory/experiment_name/`. After years of measurements these directories have
+tens of thousands of files, which are slow to list or open on network drives. The other
+layouts add a subdirectory (shard) made of the time stamp of the acquisition:
+
+- `date`: `data_directory/experiment_name/2024_01_31/2024_01_31__12_00_00__name.h5`
+- `month`: `data_directory/experiment_name/2024_01/2024_01_31__12_00_00__name.h5`
+
+The shard is computed from the name, so a file is found without listing the directories.
+The files saved with another layout are found as well, so the layout can be changed at any
+time. The glob patterns of `bulk` (e.g. `experiment_name/*.h5`) match the files inside
+the shards as well, see `shard_patterns`. Existing files are moved with `migrate` or from the command line with
+`python -m labmate.acquisition.layout DIRECTORY --layout date`.
+"""
+
+import os
+import re
+import shutil
+import time
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Tuple
+
+import h5py
+
+from ..logger import logger
+from ..utils.lazy_module import LazyModule
+from .config_store import ConfigStore, get_relative_store_path, get_store_path
+
+container = LazyModule(".container", __package__)
+
+if TYPE_CHECKING:
+    from . import container
+
+LAYOUTS = ("flat", "date", "month")
+
+_TIME_STAMP_RE = re.compile(r"^(\d{4})_(\d{2})_(\d{2})__\d{2}_\d{2}_\d{2}__")
+_SHARD_RE = re.compile(r"^\d{4}_\d{2}(_\d{2})?$")
+_SHARD_GLOBS = ("[0-9]" * 4 + "_[0-9][0-9]", "[0-9]" * 4 + "_[0-9][0-9]_[0-9][0-9]")
+
+
+class MoveResult(NamedTuple):
+    """Result of the migration of one file.
+
+    `skipped` is None if the file was moved, otherwise it's the reason why it was not.
+    """
+
+    source: str
+    destination: str
+    skipped: Optional[str] = None
+
+
+def check_layout(layout: str) -> str:
+    """Raise ValueError if the layout is unknown. Otherwise return it."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Layout should be one of {LAYOUTS}, not {layout!r}")
+    return layout
+
+
+def get_shard(name: str, layout: str) -> str:
+    """Return the subdirectory of the file `name` for the layout.
+
+    Args:
+        name (str): Name of the file. Should start with the time stamp.
+        layout (str): One of `LAYOUTS`.
+
+    Returns:
+        str: Name of the subdirectory or "" for the flat layout or if the name does not
+            start with a time stamp.
+    """
+    check_layout(layout)
+    match = _TIME_STAMP_RE.match(os.path.basename(str(name)))
+    if layout == "flat" or match is None:
+        return ""
+    year, month, day = match.groups()
+    return f"{year}_{month}_{day}" if layout == "date" else f"{year}_{month}"
+
+
+def get_filepath(experiment_path: str, name: str, layout: str) -> str:
+    """Return the path of the file `name` inside the experiment directory."""
+    return os.path.join(str(experiment_path), get_shard(name, layout), str(name))
+
+
+def find(experiment_path: str, name: str, layout: str = "flat") -> str:
+    """Return the path of an existing acquisition `name` inside the experiment directory.
+
+    The path for `layout` is checked first, then the paths of the other layouts.
+
+    Args:
+        experiment_path (str): Directory of the experiment.
+        name (str): Name of the acquisition without `.h5` extension.
+        layout (str, optional): Layout used to save the files. Defaults to "flat".
+
+    Returns:
+        str: Path without `.h5` extension. The path for `layout` if the file is not found.
+    """
+    layouts = [layout] + [other for other in LAYOUTS if other != layout]
+    filepaths = [get_filepath(experiment_path, name, other) for other in layouts]
+    for filepath in filepaths:
+        if os.path.exists(filepath + ".h5"):
+            return filepath
+    for filepath in filepaths:
+        if os.path.isdir(os.path.dirname(filepath)) and container.exists(filepath):
+            return filepath
+    return filepaths[0]
+
+
+def experiment_directory(filepath: str) -> str:
+    """Return the experiment directory of the file, i.e. its directory without shard."""
+    directory = os.path.dirname(os.path.abspath(str(filepath)))
+    if _SHARD_RE.match(os.path.basename(directory)):
+        return os.path.dirname(directory)
+    return directory
+
+
+def shard_patterns(pattern: str) -> List[str]:
+    """Return the glob pattern and the same pattern inside the shards of its directory.
+
+    Examples:
+        >>> shard_patterns("data/T1/*.h5")
+        ['data/T1/*.h5', 'data/T1/[0-9][0-9][0-9][0-9]_[0-9][0-9]/*.h5', ...]
+    """
+    directory, name = os.path.split(pattern)
+    return [pattern] + [os.path.join(directory, shard, name) for shard in _SHARD_GLOBS]
+
+
+def sort_key(filepath: str) -> Tuple[str, str]:
+    """Key to sort the files by experiment and name, whatever the shard of the files."""
+    directory, name = os.path.split(filepath)
+    if _SHARD_RE.match(os.path.basename(directory)):
+        directory = os.path.dirname(directory)
+    return directory, name
+
+
+def _experiment_files(experiment_path: str) -> List[str]:
+    """Return the files of the acquisitions inside the directory and its shards."""
+    files = []
+    for entry in sorted(os.scandir(experiment_path), key=lambda e: e.name):
+        if entry.name.startswith("."):
+            continue
+        if entry.is_dir() and _SHARD_RE.match(entry.name):
+            files.extend(
+                os.path.join(entry.path, file)
+                for file in sorted(os.listdir(entry.path))
+                if _TIME_STAMP_RE.match(file)
+            )
+        elif entry.is_file() and _TIME_STAMP_RE.match(entry.name):
+            files.append(entry.path)
+    return files
+
+
+def _move(source: str, destination: str, min_age: float) -> MoveResult:
+    if source == destination:
+        return MoveResult(source, destination, "already in place")
+    if source.endswith(".lock") or os.path.exists(
+        os.path.splitext(source)[0] + ".lock"
+    ):
+        return MoveResult(source, destination, "locked")
+    if time.time() - os.path.getmtime(source) < min_age:
+        return MoveResult(source, destination, "modified recently")
+    if os.path.exists(destination):
+        return MoveResult(source, destination, "destination exists")
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    shutil.move(source, destination)
+    if destination.endswith(".h5"):
+        _update_store_paths(source, destination)
+    return MoveResult(source, destination)
+
+
+def _update_store_paths(source: str, destination: str):
+    """Rewrite the path to the config store, which is relative to the moved h5 file.
+
+    The acquisitions inside a container (its groups) are updated as well.
+    """
+    modified_time = os.path.getmtime(destination)
+    try:
+        with h5py.File(destination, "r+") as file:
+            groups = [file] + [g for g in file.values() if isinstance(g, h5py.Group)]
+            for group in groups:
+                if not isinstance(group.get("configs_store"), h5py.Dataset):
+                    continue
+                store = group["configs_store"][()]
+                store = store.decode() if isinstance(store, bytes) else str(store)
+                store = ConfigStore(get_store_path(source, store))
+                del group["configs_store"]
+                group["configs_store"] = get_relative_store_path(destination, store)
+    except OSError as error:
+        # The store is still found from the data directory, see `config_store.find_store`
+        logger.warning(
+            "Cannot update the config store path of %s: %s", destination, error
+        )
+        return
+    os.utime(destination, (modified_time, modified_time))
+
+
+def migrate(
+    data_directory: str,
+    layout: str,
+    min_age: float = 60,
+    max_workers: Optional[int] = None,
+    dry_run: bool = False,
+) -> List[MoveResult]:
+    """Move the files of all the experiments inside `data_directory` to the layout.
+
+    Every file whose name starts with a time stamp (h5 files, containers, saved
+    config files and figures) is moved in parallel. Emptied shards are removed.
+
+    Args:
+        data_directory (str): Directory with the experiment directories.
+        layout (str): One of `LAYOUTS`.
+        min_age (float, optional): Files modified less than `min_age` seconds ago are
+            skipped, since they could still be written. Defaults to 60.
+        max_workers (int, optional): Number of threads. Defaults to the executor default.
+        dry_run (bool, optional): Only return what would be moved. Defaults to False.
+
+    Returns:
+        List of MoveResult. Files that are already in place are not reported.
+    """
+    check_layout(layout)
+    moves = []
+    for entry in sorted(os.scandir(data_directory), key=lambda e: e.name):
+        if not entry.is_dir() or entry.name.startswith("."):
+            continue
+        for file in _experiment_files(entry.path):
+            destination = get_filepath(entry.path, os.path.basename(file), layout)
+            if file != destination:
+                moves.append((file, destination))
+
+    if dry_run:
+        return [MoveResult(source, destination) for source, destination in moves]
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_move, source, destination, min_age)
+            for source, destination in moves
+        ]
+
+    results = []
+    for (source, destination), future in zip(moves, futures):
+        error = future.exception()
+        if error is None:
+            results.append(future.result())
+        else:
+            results.append(
+                MoveResult(source, destination, f"{type(error).__name__}: {error}")
+            )
+
+    for directory in {os.path.dirname(source) for source, _ in moves}:
+        if _SHARD_RE.match(os.path.basename(directory)) and not os.listdir(directory):
+            os.rmdir(directory)
+    return results
+
+
+def main(args: Optional[List[str]] = None):
+    """Command line interface of `migrate`."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m labmate.acquisition.layout",
+        description="Move the acquisition files to another directory layout.",
+    )
+    parser.add_argument("directory", help="Data directory.")
+    parser.add_argument("--layout", choices=LAYOUTS, required=True)
+    parser.add_argument("--min-age", type=float, default=60, help="In seconds.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="Only print the moves.")
+    parsed = parser.parse_args(args)
+
+    results = migrate(
+        parsed.directory,
+        parsed.layout,
+        min_age=parsed.min_age,
+        max_workers=parsed.workers,
+        dry_run=parsed.dry_run,
+    )
+    for result in results:
+        if result.skipped is None:
+            print(f"{result.source} -> {result.destination}")
+        else:
+            print(f"{result.source}: skipped ({result.skipped})")
+    print(f"Moved {sum(r.skipped is None for r in results)} files")
+
+
+if __name__ == "__main__":
+    main()
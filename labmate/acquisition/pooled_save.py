@@ -0,0 +1,197 @@
+"""Saves of the acquisitions through the journal, the writer or the pooled handle.
+
+The classes with `PooledSaveMixin` (and the arrays of the loops, `PooledSyncNp`) send
+their saves to the journal (see `journal`) if it's enabled for the file, then to the
+writer process (see `writer`), then to the handle kept open by `h5_handles`, otherwise
+the file is saved as usual.
+
+`h5_handles` and `writer` are imported only by the acquisitions that enable them, since
+no file can be registered there before.
+"""
+
+from typing import Any, Dict, Iterable, Optional, Set, Union
+
+import numpy as np
+from dh5.dh5_class import h5py_utils
+from dh5.dh5_types import SyncNp
+from dh5.errors import FileLockedError
+from dh5.utils import async_utils
+
+from ..logger import logger
+from ..utils.lazy_module import imported_module
+from . import journal, shared_array
+
+
+def _get_redirection(filepath: str):
+    """Return the journal or the writer that the saves of the file are sent to."""
+    writer = imported_module(".writer", __package__)
+    return journal.get_journal(filepath) or (
+        writer.get_writer(filepath) if writer is not None else None
+    )
+
+
+def _get_pool(filepath: str):
+    """Return `h5_handles` if the file is kept open by it, otherwise None."""
+    h5_handles = imported_module(".h5_handles", __package__)
+    if h5_handles is not None and h5_handles.is_enabled(filepath):
+        return h5_handles
+    return None
+
+
+def _is_writer(redirection) -> bool:
+    writer = imported_module(".writer", __package__)
+    return writer is not None and isinstance(redirection, writer.FileWriter)
+
+
+class PooledSaveMixin:
+    """Mixin for DH5 classes to save through the journal, the writer or the pooled handle.
+
+    `save` selects the data to save like DH5 `save`, which every save goes through (also
+    the ones of `save_on_edit`), and sends it to `_save_dict`.
+    """
+
+    _data: Dict[str, Any]
+    _filepath: Optional[str]
+    _key_prefix: Optional[str]
+    _last_update: Set[str]
+    _last_data_saved: bool
+    _read_only: Union[bool, Set[str]]
+    _classes_should_be_saved_internally: Set[str]
+    _retry_on_file_locked_error: int
+    _raise_file_locked_error: bool
+    _file_modified_time: float
+
+    def save(
+        self,
+        only_update: Union[bool, Iterable[str]] = True,
+        filepath: Optional[str] = None,
+        force: Optional[bool] = None,
+    ):
+        """Save the data to the file. Same arguments as DH5 `save`."""
+        if self._read_only is True or (filepath or self._filepath) is None:
+            # DH5 raises the error
+            return super().save(  # type: ignore
+                only_update=only_update, filepath=filepath, force=force
+            )
+
+        self._pre_save()  # type: ignore
+        if force is True or filepath is not None:
+            only_update = False
+
+        if isinstance(only_update, Iterable):
+            last_update = self._last_update.intersection(only_update)
+            self._last_update = self._last_update.difference(only_update)
+        else:
+            last_update, self._last_update = self._last_update, set()
+        if len(self._last_update) == 0:
+            self._last_data_saved = True
+
+        filepath = self._check_if_filepath_was_set(  # type: ignore
+            filepath, self._filepath
+        )
+        if only_update is False:
+            data = self._data.copy()
+            data.update(
+                {
+                    key: None
+                    for key in last_update
+                    if key not in self._data and not self._is_read_only(key)
+                }
+            )
+        else:
+            for key in last_update:
+                if key not in self._classes_should_be_saved_internally:
+                    continue
+                if hasattr(self._data[key], "save"):
+                    self._data[key].save(only_update=only_update)
+                else:
+                    self._classes_should_be_saved_internally.remove(key)
+            data = {
+                key: self._data.get(key)
+                for key in last_update
+                if key not in self._classes_should_be_saved_internally
+            }
+
+        try:
+            self._save_dict(filepath, data)
+        finally:
+            # The shared arrays stay mapped by this process, see `shared_array`
+            shared_array.release_not_sent(data)
+        return self
+
+    def _is_read_only(self, key: str) -> bool:
+        return bool(self._read_only) and (
+            self._read_only is True or key in self._read_only
+        )
+
+    def _save_dict(self, filepath: str, data: dict):
+        """Save the data to the file (without extension) or send it to be saved."""
+        redirection = _get_redirection(filepath)
+        if redirection is not None:
+            redirection.write(data, key_prefix=self._key_prefix)
+            return
+
+        pool = _get_pool(filepath)
+        save_dict = pool.save_dict if pool is not None else h5py_utils.save_dict
+        for i in range(self._retry_on_file_locked_error):
+            try:
+                self._file_modified_time = save_dict(
+                    filepath + ".h5", data, key_prefix=self._key_prefix
+                )
+                return
+            except FileLockedError as error:
+                if self._raise_file_locked_error:
+                    raise error
+                logger.info("File is locked. waiting 1s and %d more retrying.", i)
+                async_utils.sleep(1)
+
+        raise FileLockedError(
+            f"Even after {self._retry_on_file_locked_error} data was not saved"
+        )
+
+
+class PooledSyncNp(SyncNp):
+    """SyncNp that saves like `PooledSaveMixin` (journal, writer or pooled handle).
+
+    SyncNp writes the changed items directly to the file, e.g. for every point appended
+    to an `AcquisitionLoop`.
+
+    `_shared_items` are the handles that hold the values of the items being set, which are
+    sent to the writer instead of the values (see `shared_array`).
+    """
+
+    _shared_items: Optional[Dict[Any, shared_array.SharedArray]] = None
+
+    def __new__(cls, data):
+        if isinstance(data, cls):
+            return data
+        if isinstance(data, SyncNp):
+            return data.view(cls)
+        return super().__new__(cls, data)
+
+    def save(self, only_update=True):
+        filepath, key = self.__filename__, self.__filekey__
+        redirection = _get_redirection(filepath) if filepath else None
+        pool = _get_pool(filepath) if filepath and redirection is None else None
+        if self.__last_changes__ is None or (redirection is None and pool is None):
+            return super().save(only_update=only_update)
+
+        assert key is not None
+        array = self.view(np.ndarray)
+        indexes = (
+            None
+            if not only_update or self.__should_initialized__
+            else self.__last_changes__
+        )
+        if pool is not None:
+            pool.save_items(filepath, key, array, indexes)  # type: ignore
+        elif indexes is None:
+            redirection.write({key: array})
+        elif self._shared_items and _is_writer(redirection):
+            redirection.write_items(key, array, indexes, self._shared_items)
+        else:
+            redirection.write_items(key, array, indexes)
+
+        self.__should_initialized__ = False
+        self.__last_changes__ = []
+        return self
@@ -0,0 +1,307 @@
+"""Compaction of acquisition files.
+
+HDF5 does not reclaim the space freed when a key is rewritten, so files saved many times
+with `save_on_edit=True` are often several times bigger than their data. Repacking copies
+the content to a new file and replaces the original one.
+
+Run from the command line with `python -m labmate.acquisition.repack DIRECTORY`.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import h5py
+import numpy as np
+from dh5.dh5_class.h5py_utils import LockFile
+from dh5.errors import FileLockedError
+
+from . import container
+from .bulk import get_files_list
+
+
+class RepackResult(NamedTuple):
+    """Result of the repacking of one file.
+
+    `skipped` is None if the file was repacked, otherwise it's the reason why it was not.
+    """
+
+    file: str
+    size_before: int
+    size_after: int
+    skipped: Optional[str] = None
+
+
+def find_h5_files(directory: str) -> List[str]:
+    """Return all h5 files inside the `directory` and its subdirectories.
+
+    Hidden directories (e.g. `.virtual`, `.config_store`) are ignored.
+    """
+    files = []
+    for root, dirs, filenames in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        files.extend(
+            os.path.join(root, filename)
+            for filename in sorted(filenames)
+            if filename.endswith(".h5")
+        )
+    return files
+
+
+def _can_be_compressed(dataset: h5py.Dataset) -> bool:
+    return (
+        dataset.shape is not None and dataset.size > 1 and dataset.dtype.kind in "biufc"
+    )
+
+
+def _copy_group(
+    source: h5py.Group,
+    destination: h5py.Group,
+    compression: Optional[str],
+    chunks: Optional[Union[bool, Tuple[int, ...]]],
+):
+    keep_layout = compression is None and chunks is None
+    destination.attrs.update(source.attrs)
+    for key in source:
+        item = source[key]
+        if isinstance(item, h5py.Group):
+            _copy_group(item, destination.create_group(key), compression, chunks)
+        elif keep_layout or not _can_be_compressed(item):  # type: ignore
+            source.copy(item, destination, name=key)
+        else:
+            dataset = destination.create_dataset(
+                key,
+                data=item[()],  # type: ignore
+                compression=compression,
+                chunks=chunks,
+            )
+            dataset.attrs.update(item.attrs)
+
+
+def _is_same_attrs(first: h5py.AttributeManager, second: h5py.AttributeManager):
+    if set(first.keys()) != set(second.keys()):
+        return False
+    return all(np.array_equal(first[key], second[key]) for key in first.keys())
+
+
+def _is_same_group(first: h5py.Group, second: h5py.Group) -> bool:
+    if set(first.keys()) != set(second.keys()) or not _is_same_attrs(
+        first.attrs, second.attrs
+    ):
+        return False
+    for key in first:
+        item, other = first[key], second[key]
+        if isinstance(item, h5py.Group):
+            if not isinstance(other, h5py.Group) or not _is_same_group(item, other):
+                return False
+        elif not isinstance(other, h5py.Dataset):
+            return False
+        elif not _is_same_dataset(item, other):  # type: ignore
+            return False
+    return True
+
+
+def _is_same_dataset(first: h5py.Dataset, second: h5py.Dataset) -> bool:
+    if first.shape != second.shape or first.dtype != second.dtype:
+        return False
+    if not _is_same_attrs(first.attrs, second.attrs):
+        return False
+    if first.shape is None:
+        return True
+    first_value, second_value = first[()], second[()]
+    if first.dtype.kind in "fc":
+        return bool(np.array_equal(first_value, second_value, equal_nan=True))
+    return bool(np.array_equal(first_value, second_value))
+
+
+def repack_file(
+    filepath: str,
+    compression: Optional[str] = None,
+    chunks: Optional[Union[bool, Tuple[int, ...]]] = None,
+    verify: bool = True,
+    min_age: float = 60,
+    only_if_smaller: bool = True,
+) -> RepackResult:
+    """Repack one h5 file to reclaim the unused space.
+
+    The content is copied to a temporary file in the same directory, compared to
+    the original (if `verify`), and the temporary file replaces the original atomically.
+    During the whole process the file is locked with the same `.lock` file as DH5 uses
+    while saving, so writers wait for the end of repacking.
+
+    Args:
+        filepath (str): Path to the h5 file. For an acquisition inside a container
+            (`container.h5::group`), the whole container is repacked.
+        compression (str, optional): Compression to apply to numeric arrays
+            (e.g. "gzip", "lzf"). Defaults to keep the datasets as they are.
+        chunks (bool | tuple, optional): Chunk shape for the compressed arrays. True
+            lets h5py guess it. Defaults to None.
+        verify (bool, optional): Check that the repacked file has the same content.
+            Defaults to True.
+        min_age (float, optional): Files modified less than `min_age` seconds ago are
+            considered as being written and are skipped. Defaults to 60.
+        only_if_smaller (bool, optional): Keep the original file if the repacked one
+            is not smaller. Defaults to True.
+
+    Returns:
+        RepackResult
+    """
+    filepath, _ = container.split(filepath)
+    size_before = os.path.getsize(filepath)
+    if time.time() - os.path.getmtime(filepath) < min_age:
+        return RepackResult(filepath, size_before, size_before, "modified recently")
+
+    try:
+        with LockFile(filepath):
+            return _repack_locked_file(
+                filepath, compression, chunks, verify, only_if_smaller
+            )
+    except FileLockedError:
+        return RepackResult(filepath, size_before, size_before, "locked")
+
+
+def _repack_locked_file(
+    filepath: str,
+    compression: Optional[str],
+    chunks: Optional[Union[bool, Tuple[int, ...]]],
+    verify: bool,
+    only_if_smaller: bool,
+) -> RepackResult:
+    size_before = os.path.getsize(filepath)
+    modified_time = os.path.getmtime(filepath)
+    directory = os.path.dirname(os.path.abspath(filepath))
+    file_descriptor, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(filepath)}.", suffix=".tmp"
+    )
+    os.close(file_descriptor)
+    try:
+        with h5py.File(filepath, "r") as source, h5py.File(tmp_path, "w") as copy:
+            _copy_group(source, copy, compression, chunks)
+
+        skipped = None
+        size_after = os.path.getsize(tmp_path)
+        if verify:
+            with h5py.File(filepath, "r") as source, h5py.File(tmp_path, "r") as copy:
+                if not _is_same_group(source, copy):
+                    skipped = "verification failed"
+        if skipped is None and only_if_smaller and size_after >= size_before:
+            skipped = "not smaller"
+        if skipped is None and os.path.getmtime(filepath) != modified_time:
+            skipped = "modified during repacking"
+        if skipped is not None:
+            return RepackResult(filepath, size_before, size_before, skipped)
+
+        os.replace(tmp_path, filepath)
+        return RepackResult(filepath, size_before, size_after)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def repack_files(
+    files: Union[str, Iterable[str]],
+    compression: Optional[str] = None,
+    chunks: Optional[Union[bool, Tuple[int, ...]]] = None,
+    verify: bool = True,
+    min_age: float = 60,
+    only_if_smaller: bool = True,
+    max_workers: Optional[int] = None,
+    use_processes: bool = False,
+) -> List[RepackResult]:
+    """Repack many h5 files in parallel. See `repack_file` for the arguments.
+
+    Args:
+        files (str | Iterable[str]): Directory (all h5 files inside are repacked),
+            glob pattern or list of the files. Containers are repacked as a whole,
+            once for all their acquisitions.
+        max_workers (int, optional): Number of workers. Defaults to the executor default.
+        use_processes (bool, optional): Use processes instead of threads.
+            Defaults to False.
+
+    Returns:
+        List of RepackResult in the same order as the files. Files that cannot be
+        repacked because of an error are reported with the error as `skipped` reason.
+    """
+    if isinstance(files, str) and os.path.isdir(files):
+        files_list = find_h5_files(files)
+    else:
+        files_list = list(
+            dict.fromkeys(container.split(file)[0] for file in get_files_list(files))
+        )
+
+    executor: Executor = (
+        ProcessPoolExecutor(max_workers=max_workers)
+        if use_processes
+        else ThreadPoolExecutor(max_workers=max_workers)
+    )
+    with executor:
+        futures = [
+            executor.submit(
+                repack_file,
+                file,
+                compression=compression,
+                chunks=chunks,
+                verify=verify,
+                min_age=min_age,
+                only_if_smaller=only_if_smaller,
+            )
+            for file in files_list
+        ]
+
+    results = []
+    for file, future in zip(files_list, futures):
+        error = future.exception()
+        if error is None:
+            results.append(future.result())
+        else:
+            size = os.path.getsize(file) if os.path.exists(file) else 0
+            results.append(
+                RepackResult(file, size, size, f"{type(error).__name__}: {error}")
+            )
+    return results
+
+
+def main(args: Optional[List[str]] = None):
+    """Command line interface of `repack_files`."""
+    parser = argparse.ArgumentParser(
+        prog="python -m labmate.acquisition.repack",
+        description="Repack h5 files to reclaim the unused space.",
+    )
+    parser.add_argument("files", nargs="+", help="Directories, h5 files or patterns.")
+    parser.add_argument("--compression", default=None, help="e.g. gzip or lzf.")
+    parser.add_argument("--chunks", action="store_true", help="Chunk compressed data.")
+    parser.add_argument("--no-verify", action="store_true", help="Skip verification.")
+    parser.add_argument("--min-age", type=float, default=60, help="In seconds.")
+    parser.add_argument("--workers", type=int, default=None)
+    parsed = parser.parse_args(args)
+
+    results: List[RepackResult] = []
+    for files in parsed.files:
+        results.extend(
+            repack_files(
+                files if os.path.isdir(files) or "*" in files else [files],
+                compression=parsed.compression,
+                chunks=True if parsed.chunks else None,
+                verify=not parsed.no_verify,
+                min_age=parsed.min_age,
+                max_workers=parsed.workers,
+            )
+        )
+
+    saved = 0
+    for result in results:
+        if result.skipped is None:
+            saved += result.size_before - result.size_after
+            print(f"{result.file}: {result.size_before} -> {result.size_after} bytes")
+        else:
+            print(f"{result.file}: skipped ({result.skipped})")
+    print(
+        f"Repacked {sum(r.skipped is None for r in results)} files, saved {saved} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
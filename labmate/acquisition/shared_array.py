@@ -0,0 +1,227 @@
+"""Arrays passed between processes through shared memory.
+
+Sending an array from a producer process (e.g. the driver of a digitizer) to the
+acquisition kernel pickles and copies it, and the kernel copies it again to send it to the
+writer (see `writer`). A `SharedArray` is a handle of an array inside
+`multiprocessing.shared_memory`: only its name, shape and dtype are pickled.
+
+The handle is given to `AcquisitionLoop.append`, `save_acquisition` or set as a value of
+the acquisition like an array. The kernel maps the memory without copying it. If the
+writer is used for the file, the handle is forwarded to it (`sent`), the writer saves the
+array directly from the shared memory and releases it. The handle is `transferred` once
+the writer confirmed it, and the kernel releases it itself if the writer does not save it.
+Otherwise, the handle is released by the kernel once the array is saved.
+
+Examples:
+    In the producer process:
+
+    ```
+    handle = SharedArray.create(shape=(1000, 2048), dtype=np.int16)
+    driver.read_into(handle.asarray())
+    handle.close()
+    queue.put(handle)
+    ```
+
+    In the acquisition kernel:
+
+    ```
+    for i in loop(100):
+        loop.append(trace=queue.get())
+    ```
+
+Released means unlinked: the memory is freed once every process dropped the arrays
+mapped from it. A handle that is never saved should be released with `release`.
+On Windows, the memory is freed as soon as no process has it mapped, so the producer
+should keep its handle open until the kernel received it.
+"""
+
+import os
+import sys
+from typing import TYPE_CHECKING, Any, Iterator, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+
+# Before Python 3.13 every process that opens a shared memory registers it in its
+# resource tracker, which unlinks it when the process exits, even if the handle was
+# handed over to another process. The registration is undone, so only `release` unlinks.
+_TRACKED = os.name == "posix" and sys.version_info < (3, 13)
+
+
+def _open_memory(name: Optional[str] = None, size: int = 0) -> "SharedMemory":
+    # multiprocessing is imported on the first use to keep the import of labmate fast
+    from multiprocessing import shared_memory
+
+    # Empty shared memory cannot be created
+    create, size = name is None, max(size, 1)
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(  # pylint: disable=E1123
+            name, create=create, size=size, track=False
+        )
+    memory = shared_memory.SharedMemory(name, create=create, size=size)
+    if _TRACKED:
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(memory._name, "shared_memory")  # type: ignore
+    return memory
+
+
+class SharedNdarray(np.ndarray):
+    """Array mapped from the shared memory. Keeps the memory mapped while it's used.
+
+    Only the array returned by `SharedArray.asarray` refers to its handle (`shared`),
+    not the views derived from it.
+    """
+
+    shared: Optional["SharedArray"] = None
+    _memory: Optional["SharedMemory"] = None
+
+    def __array_finalize__(self, obj):
+        self._memory = getattr(obj, "_memory", None)
+
+
+class SharedArray:
+    """Handle of an array inside the shared memory. Can be sent to other processes.
+
+    Args:
+        name (str): Name of the shared memory.
+        shape (tuple): Shape of the array.
+        dtype (np.dtype): Type of the array.
+
+    Attributes:
+        sent (bool): The handle was sent to the writer, which releases the memory.
+        transferred (bool): The writer confirmed that it saved the array.
+        released (bool): The memory was released by this process.
+    """
+
+    def __init__(self, name: str, shape: Tuple[int, ...], dtype: Any):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.sent = False
+        self.transferred = False
+        self.released = False
+        self._memory: Optional["SharedMemory"] = None
+
+    @classmethod
+    def create(cls, shape: Tuple[int, ...], dtype: Any = float) -> "SharedArray":
+        """Allocate a new array (filled with zeros) inside the shared memory."""
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        memory = _open_memory(size=size)
+        handle = cls(memory.name, shape, dtype)
+        handle._memory = memory  # pylint: disable=W0212
+        return handle
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "SharedArray":
+        """Copy the array inside a new shared memory."""
+        array = np.asarray(array)
+        handle = cls.create(array.shape, array.dtype)
+        handle.asarray()[...] = array
+        return handle
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def asarray(self) -> SharedNdarray:
+        """Return the array. The memory is mapped by this process on the first call.
+
+        Raises:
+            FileNotFoundError: If the memory was already released.
+        """
+        if self._memory is None:
+            self._memory = _open_memory(self.name)
+        array = SharedNdarray(self.shape, dtype=self.dtype, buffer=self._memory.buf)
+        array._memory = self._memory  # pylint: disable=W0212
+        array.shared = self
+        return array
+
+    def close(self):
+        """Forget the memory mapped by this process.
+
+        The memory is unmapped once the arrays returned by `asarray` are not used anymore.
+        """
+        self._memory = None
+
+    def release(self):
+        """Unlink the shared memory. It is freed once no process uses it anymore."""
+        if self.released:
+            return
+        self.released = True
+        try:
+            memory = (
+                self._memory if self._memory is not None else _open_memory(self.name)
+            )
+        except FileNotFoundError:
+            return
+        if not _TRACKED:
+            try:
+                memory.unlink()
+            except FileNotFoundError:
+                pass
+            return
+
+        # `unlink` unregisters the memory, so it should be registered
+        from multiprocessing import resource_tracker
+
+        resource_tracker.register(memory._name, "shared_memory")  # type: ignore
+        try:
+            memory.unlink()
+        except FileNotFoundError:
+            resource_tracker.unregister(memory._name, "shared_memory")  # type: ignore
+
+    def __getstate__(self):
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype.str}
+
+    def __setstate__(self, state):
+        self.__init__(state["name"], state["shape"], state["dtype"])
+
+    def __repr__(self) -> str:
+        return f"SharedArray({self.name!r}, shape={self.shape}, dtype={self.dtype})"
+
+
+def get_handle(value: Any) -> Optional[SharedArray]:
+    """Return the handle of the array, if it's a whole array mapped from a handle."""
+    if isinstance(value, SharedArray):
+        return value
+    if isinstance(value, SharedNdarray):
+        return value.shared
+    return None
+
+
+def handles(value: Any) -> Iterator[SharedArray]:
+    """Yield the handles inside the value (dicts, lists and tuples are searched)."""
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, (list, tuple)):
+        handle = get_handle(value)
+        if handle is not None:
+            yield handle
+        return
+    for item in value:
+        yield from handles(item)
+
+
+def resolve(value: Any) -> Any:
+    """Return the value with the handles replaced by their arrays."""
+    if isinstance(value, SharedArray):
+        return value.asarray()
+    if isinstance(value, dict):
+        return {key: resolve(item) for key, item in value.items()}
+    return value
+
+
+def can_be_sent(handle: Optional[SharedArray]) -> bool:
+    """Check if the handle can be sent to the writer instead of the array."""
+    return handle is not None and not handle.sent and not handle.released
+
+
+def release_not_sent(value: Any):
+    """Release the handles inside the value that were not sent to the writer."""
+    for handle in handles(value):
+        if not handle.sent:
+            handle.release()
@@ -0,0 +1,216 @@
+"""VirtualDataset class that concatenates the same key of many acquisitions lazily."""
+
+import json
+import os
+import tempfile
+from typing import Any, Iterable, Optional, Tuple, Union
+
+import h5py
+import numpy as np
+
+from . import container
+from .bulk import get_files_list
+
+_DATASET_NAME = "data"
+
+
+class VirtualDataset:
+    """Lazy view of the same key concatenated across many acquisition files.
+
+    It's backed by an HDF5 virtual dataset: the file at `filepath` contains only
+    the mapping to the original files, so no data is copied. Data is read only for
+    the part that is indexed, and each indexing opens the file for the time of the read.
+
+    The original files are referenced relative to the directory of `filepath`, so they
+    can be moved together with it. If some of them are missing, indexing raises
+    FileNotFoundError instead of returning the fill value for their part.
+
+    Examples:
+        >>> y = create_virtual_dataset(files, "y")
+        >>> y.shape  # (sum of the lengths of y, ...)
+        >>> y[:1000]  # reads only the first 1000 points
+        >>> np.asarray(y)  # reads everything
+
+    """
+
+    def __init__(self, filepath: str):
+        """Open the virtual dataset created by `create_virtual_dataset`.
+
+        Args:
+            filepath (str): Path to the h5 file with the virtual dataset.
+        """
+        self.filepath = filepath
+        directory = os.path.dirname(os.path.abspath(filepath))
+        with h5py.File(filepath, "r") as file:
+            dataset: h5py.Dataset = file[_DATASET_NAME]  # type: ignore
+            self.shape: Tuple[int, ...] = dataset.shape
+            self.dtype: np.dtype = dataset.dtype
+            self.key: str = str(dataset.attrs["key"])
+            self.sources: Tuple[str, ...] = tuple(
+                os.path.normpath(os.path.join(directory, source))
+                for source in json.loads(dataset.attrs["sources"])  # type: ignore
+            )
+            self.offsets: Tuple[int, ...] = tuple(
+                json.loads(dataset.attrs["offsets"])  # type: ignore
+            )
+            # The h5 files that the data is read from (the containers, not the groups)
+            self._source_files: Tuple[str, ...] = tuple(
+                sorted(
+                    {
+                        os.path.normpath(os.path.join(directory, source.file_name))
+                        for source in dataset.virtual_sources()
+                    }
+                )
+            )
+        self._check_sources()
+
+    def _check_sources(self):
+        """Raise FileNotFoundError if some of the original files are missing."""
+        missing = [path for path in self._source_files if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(
+                f"{len(missing)} files of the virtual dataset {self.filepath} are "
+                f"missing: {', '.join(missing[:5])}{', ...' if len(missing) > 5 else ''}"
+                ". Move them back or create the virtual dataset again with "
+                "`create_virtual_dataset`."
+            )
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, index: Any) -> np.ndarray:
+        self._check_sources()
+        with h5py.File(self.filepath, "r") as file:
+            return file[_DATASET_NAME][index]  # type: ignore
+
+    def __array__(self, dtype=None, copy=None):  # pylint: disable=unused-argument
+        data = self[()]
+        return data if dtype is None else data.astype(dtype)
+
+    def source_of(self, index: int) -> str:
+        """Return the file that contains the element `index` along the first axis."""
+        if index < 0:
+            index += len(self)
+        position = int(np.searchsorted(self.offsets, index, side="right")) - 1
+        return self.sources[position]
+
+    def __repr__(self) -> str:
+        return (
+            f"VirtualDataset: '{self.key}' of {len(self.sources)} files, "
+            f"shape={self.shape}, dtype={self.dtype}"
+        )
+
+
+def create_virtual_dataset(
+    files: Union[str, Iterable[str]],
+    key: str,
+    filepath: Optional[str] = None,
+    stack: bool = False,
+) -> VirtualDataset:
+    """Create a virtual dataset that concatenates `key` of all the `files`.
+
+    Args:
+        files (str | Iterable[str]): Glob pattern or list of the acquisition files
+            (see `get_files_list`, the acquisitions inside containers are included).
+            The order of the files is the order of the concatenation.
+        key (str): The key to concatenate. Keys inside a loop are given as `loop/key`.
+        filepath (str, optional): Where to save the file with the virtual dataset.
+            Defaults to `.virtual/{key}.h5` inside the directory of the first file.
+        stack (bool, optional): If True, the datasets are stacked along a new first axis
+            (they should have the same shape). Defaults to False, i.e. they are concatenated
+            along the first axis (they should have the same shape except the first axis).
+
+    Returns:
+        VirtualDataset
+
+    Raises:
+        ValueError: If there are no files, if the key cannot be found in a file or
+            if the shapes or dtypes are not compatible.
+    """
+    files_list = [os.path.abspath(file) for file in get_files_list(files)]
+    if not files_list:
+        raise ValueError("No files provided to create a virtual dataset.")
+
+    if filepath is None:
+        filepath = os.path.join(
+            os.path.dirname(files_list[0]), ".virtual", key.replace("/", "__")
+        )
+    filepath = filepath if filepath.endswith(".h5") else filepath + ".h5"
+    directory = os.path.dirname(os.path.abspath(filepath))
+
+    sources = []
+    for file in files_list:
+        h5_path, group = container.resolve(file)
+        with h5py.File(h5_path, "r") as h5_file:
+            dataset = (h5_file if group is None else h5_file[group]).get(key)
+            if not isinstance(dataset, h5py.Dataset):
+                raise ValueError(f"Key '{key}' is not a dataset inside {file}.")
+            # HDF5 looks for a relative source next to the file with the virtual dataset
+            sources.append(
+                h5py.VirtualSource(
+                    _relative_path(h5_path, directory),
+                    dataset.name,
+                    shape=dataset.shape,
+                    dtype=dataset.dtype,
+                )
+            )
+
+    dtype = sources[0].dtype
+    shape = sources[0].shape
+    if stack:
+        compatible = all(source.shape == shape for source in sources)
+        layout_shape = (len(sources), *shape)
+    else:
+        compatible = len(shape) > 0 and all(
+            source.shape[1:] == shape[1:] for source in sources
+        )
+        layout_shape = (sum(source.shape[0] for source in sources), *shape[1:])
+    if not compatible or any(source.dtype != dtype for source in sources):
+        raise ValueError(
+            f"Cannot {'stack' if stack else 'concatenate'} '{key}' of the files "
+            "as their shapes or dtypes are not compatible."
+        )
+
+    layout = h5py.VirtualLayout(shape=layout_shape, dtype=dtype)
+    offsets = []
+    offset = 0
+    for index, source in enumerate(sources):
+        offsets.append(offset)
+        if stack:
+            layout[index] = source
+            offset += 1
+        else:
+            layout[offset : offset + source.shape[0]] = source
+            offset += source.shape[0]
+
+    os.makedirs(directory, exist_ok=True)
+
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(file_descriptor)
+    try:
+        with h5py.File(tmp_path, "w") as file:
+            dataset = file.create_virtual_dataset(_DATASET_NAME, layout)
+            dataset.attrs["key"] = key
+            dataset.attrs["sources"] = json.dumps(
+                [_relative_path(file, directory) for file in files_list]
+            )
+            dataset.attrs["offsets"] = json.dumps(offsets)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return VirtualDataset(filepath)
+
+
+def _relative_path(path: str, directory: str) -> str:
+    """Return the path relative to the directory, or absolute if it's on another drive."""
+    try:
+        return os.path.relpath(os.path.abspath(path), directory)
+    except ValueError:
+        return os.path.abspath(path)
@@ -0,0 +1,621 @@
+"""Writer process that owns the h5 files of the acquisitions.
+
+For the files registered with `enable`, the classes with `PooledSaveMixin` (and the
+arrays of the loops, `PooledSyncNp`) do not write the h5 file. Instead, the saves are
+sent as records (the same as the ones of `journal`) to a local writer process, which
+applies them to the files in batches every `flush_interval` seconds. So a slow disk or
+network share does not stall the measurement, and the data sent to the writer is saved
+even if the kernel dies.
+
+The writer is started with `start_server` (called by `enable` if needed) or from the
+command line with `python -m labmate.acquisition.writer`. It listens on a Unix socket
+(a named pipe on Windows) and keeps running after the kernel stops, so a restarted kernel
+connects to the same writer. Stop it with `stop_server`. The socket is inside a directory
+that only the user can access, and the clients authenticate with a random key generated
+on the first use and stored in `~/.labmate/writer.key`, readable only by the user.
+
+`flush` waits until all the records sent for the file are written. It's called on
+`save_acquisition` and before the file is opened by `AnalysisData` in the same process.
+The records are numbered for every file and kept by the kernel until the writer confirms
+that they are written. So the records lost by a writer that stopped or crashed are sent
+again on `flush`, or written by the kernel itself if no writer runs anymore.
+
+The arrays received from other processes as `SharedArray` are sent to the writer as
+handles, so the writer saves them directly from the shared memory and releases it.
+"""
+
+import atexit
+import functools
+import getpass
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dh5.errors import FileLockedError
+
+from ..logger import logger
+from . import journal, shared_array
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection, Listener
+
+
+def default_address() -> str:
+    """Return the address of the writer of the current user."""
+    user = getpass.getuser()
+    if sys.platform == "win32":
+        return rf"\\.\pipe\labmate-writer-{user}"
+    directory = _private_directory(
+        os.path.join(tempfile.gettempdir(), f"labmate-{user}")
+    )
+    return os.path.join(directory, "writer.sock")
+
+
+def _private_directory(path: str) -> str:
+    """Create the directory that only the user can access, or check that it's one.
+
+    Raises:
+        PermissionError: If the directory belongs to another user.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if sys.platform != "win32":
+        info = os.stat(path)
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"Directory '{path}' belongs to another user")
+        if info.st_mode & 0o077:
+            os.chmod(path, 0o700)
+    return path
+
+
+@functools.lru_cache(maxsize=1)
+def _get_authkey() -> bytes:
+    """Return the key of the writer, generated on the first use.
+
+    It can be set with the LABMATE_WRITER_AUTHKEY environment variable.
+    """
+    if os.environ.get("LABMATE_WRITER_AUTHKEY"):
+        return os.environ["LABMATE_WRITER_AUTHKEY"].encode()
+    directory = _private_directory(os.path.join(os.path.expanduser("~"), ".labmate"))
+    path = os.path.join(directory, "writer.key")
+    if not os.path.exists(path):
+        import secrets
+
+        # Written aside and linked, so another process never reads a partial key
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        file = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(file, "w") as key_file:
+            key_file.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    if sys.platform != "win32" and os.stat(path).st_mode & 0o077:
+        os.chmod(path, 0o600)
+    with open(path, encoding="utf-8") as key_file:
+        return key_file.read().strip().encode()
+
+
+def _connect(address: str) -> "Connection":
+    """Connect to the writer. Raise OSError if no writer listens on the address."""
+    # multiprocessing is imported on the first use to keep the import of labmate fast
+    from multiprocessing import AuthenticationError
+    from multiprocessing.connection import Client
+
+    try:
+        return Client(address, authkey=_get_authkey())
+    except AuthenticationError as error:
+        raise OSError(f"Cannot authenticate to the writer '{address}'") from error
+
+
+def _get_key(filepath: str) -> str:
+    filepath = str(filepath)
+    return os.path.abspath(filepath if filepath.endswith(".h5") else filepath + ".h5")
+
+
+class WriterServer:
+    """Writer that applies the records received from the clients to the h5 files.
+
+    Can be run inside a thread with `start` (e.g. as a local stand-in in the tests) or
+    as the main loop of a process with `serve_forever`.
+
+    Args:
+        address (str, optional): Address to listen on. Defaults to `default_address()`.
+        flush_interval (float, optional): Time (in seconds) between the batches.
+            Defaults to 0.2.
+    """
+
+    def __init__(self, address: Optional[str] = None, flush_interval: float = 0.2):
+        self.address = address or default_address()
+        self.flush_interval = flush_interval
+        # Records are (client, number, record), numbered for every file by each client
+        self._pending: Dict[str, List[Tuple[str, int, journal.Record]]] = {}
+        self._expected: Dict[Tuple[str, str], int] = {}
+        self._written: Dict[Tuple[str, str], int] = {}
+        self._pending_lock = threading.Lock()
+        self._file_locks: Dict[str, threading.Lock] = {}
+        self._stopped = threading.Event()
+        self._finished = threading.Event()
+        self._listener: Optional["Listener"] = None
+
+    def start(self) -> "WriterServer":
+        """Listen and serve the clients in background threads."""
+        self._listen()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        """Listen and serve the clients until `stop` or a shutdown message."""
+        self._listen()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        self._finished.wait()
+
+    def stop(self):
+        """Write all pending records and stop listening."""
+        self._stop()
+        self._finished.set()
+
+    def _stop(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self.flush(raise_errors=False)
+        if self._listener is not None:
+            # Wake up the thread waiting inside `accept`, so it sees that it's stopped
+            threading.Thread(target=self._wake_up, daemon=True).start()
+            self._listener.close()
+
+    def _wake_up(self):
+        try:
+            _connect(self.address).close()
+        except (OSError, EOFError):
+            pass
+
+    def flush(self, filepath: Optional[str] = None, raise_errors: bool = True):
+        """Write the pending records of the file (or of all files) now.
+
+        Records that cannot be written stay pending and are retried with the next batch.
+
+        Raises:
+            FileLockedError: If the h5 file is locked by another writer.
+        """
+        with self._pending_lock:
+            filepaths = list(self._pending) if filepath is None else [filepath]
+        for file in filepaths:
+            with self._get_file_lock(file):
+                with self._pending_lock:
+                    pending = self._pending.pop(file, [])
+                records = [record for _, _, record in pending]
+                try:
+                    journal.apply_records(file, records)
+                except Exception as error:  # pylint: disable=broad-except
+                    with self._pending_lock:
+                        self._pending[file] = pending + self._pending.get(file, [])
+                    if raise_errors:
+                        raise error
+                    logger.info("Writer could not save '%s' (%s).", file, error)
+                    continue
+                with self._pending_lock:
+                    for client, number, _ in pending:
+                        self._written[(file, client)] = number
+                for handle in shared_array.handles(records):
+                    handle.release()
+
+    def _receive(
+        self,
+        filepath: str,
+        client: str,
+        first: int,
+        number: int,
+        record: journal.Record,
+    ):
+        """Queue the record if it's the next one of the client.
+
+        `first` is the first record not confirmed to the client. The records received
+        twice or after a lost record (e.g. sent to a writer that crashed) are ignored,
+        the client sends them again on flush.
+        """
+        key = (filepath, client)
+        with self._pending_lock:
+            if key not in self._expected:
+                self._expected[key] = first
+                self._written[key] = first - 1
+            if number != self._expected[key]:
+                return
+            self._expected[key] = number + 1
+            self._pending.setdefault(filepath, []).append((client, number, record))
+
+    def _written_number(self, filepath: str, client: str) -> int:
+        with self._pending_lock:
+            return self._written.get((filepath, client), 0)
+
+    def _get_file_lock(self, filepath: str) -> threading.Lock:
+        with self._pending_lock:
+            return self._file_locks.setdefault(filepath, threading.Lock())
+
+    def _listen(self):
+        if sys.platform != "win32" and os.path.exists(self.address):
+            if is_running(self.address):
+                raise RuntimeError(f"Writer is already running at '{self.address}'")
+            os.remove(self.address)
+        from multiprocessing.connection import Listener
+
+        self._listener = Listener(self.address, authkey=_get_authkey())
+        if sys.platform != "win32":
+            os.chmod(self.address, 0o600)
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        from multiprocessing import AuthenticationError
+
+        assert self._listener is not None
+        while not self._stopped.is_set():
+            try:
+                connection = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                if self._stopped.is_set():
+                    return
+                continue
+            if self._stopped.is_set():
+                connection.close()
+                return
+            threading.Thread(
+                target=self._serve_client, args=(connection,), daemon=True
+            ).start()
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush(raise_errors=False)
+
+    def _serve_client(self, connection: "Connection"):
+        with connection:
+            while not self._stopped.is_set():
+                try:
+                    # Poll with timeout to close the connection soon after `stop`
+                    if not connection.poll(0.1):
+                        continue
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+                if message[0] == "shutdown":
+                    # Reply once stopped, but before `serve_forever` returns
+                    self._stop()
+                    connection.send(("ok", None))
+                    self._finished.set()
+                    return
+                reply = self._handle(message)
+                if reply is not None:
+                    connection.send(reply)
+
+    def _handle(self, message: Tuple[Any, ...]) -> Optional[Tuple[Any, ...]]:
+        kind = message[0]
+        if kind == "record":
+            self._receive(*message[1:])
+            return None
+        if kind == "flush":
+            _, filepath, client = message
+            try:
+                self.flush(filepath)
+            except Exception as error:  # pylint: disable=broad-except
+                return ("error", type(error).__name__, str(error))
+            return ("ok", self._written_number(filepath, client))
+        if kind == "written":
+            _, filepath, client = message
+            return ("ok", self._written_number(filepath, client))
+        if kind == "ping":
+            return ("ok", os.getpid())
+        return ("error", "ValueError", f"Unknown message {kind!r}")
+
+
+class _Connection:
+    """Connection of this process to the writer. Reconnects if the writer restarted."""
+
+    def __init__(self, address: str):
+        self.address = address
+        self._connection: Optional["Connection"] = None
+        self._lock = threading.Lock()
+
+    def send(self, message: Tuple[Any, ...], wait_reply: bool = False) -> Any:
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._connection is None:
+                        self._connection = _connect(self.address)
+                    self._connection.send(message)
+                    return self._connection.recv() if wait_reply else None
+                except (OSError, EOFError):
+                    self._connection = None
+                    if attempt:
+                        raise
+            return None
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class FileWriter:
+    """Sends the saves of one h5 file to the writer. Use `enable` to create it.
+
+    Has the same interface as `journal.Journal`. The records are numbered and kept until
+    the writer confirms that they are written (on `flush`, or every
+    `confirm_interval` records).
+    """
+
+    confirm_interval = 1000
+
+    def __init__(self, filepath: str, connection: _Connection):
+        self.filepath = _get_key(filepath)
+        self._connection = connection
+        self._client = uuid.uuid4().hex
+        self._number = 0
+        self._unconfirmed: List[Tuple[int, journal.Record]] = []
+        self._disconnected = False
+        self._lock = threading.RLock()
+
+    def write(self, data: Dict[str, Any], key_prefix: Optional[str] = None):
+        """Send the saved data. See `journal.Journal.write`.
+
+        The arrays mapped from a `SharedArray` are sent as handles, see `shared_array`.
+        """
+        self._send(journal.set_record(data, key_prefix, share=True))
+
+    def write_items(
+        self,
+        key: str,
+        array: np.ndarray,
+        indexes: List[Any],
+        shared_items: Optional[Dict[Any, shared_array.SharedArray]] = None,
+    ):
+        """Send the changed items of the array. See `journal.Journal.write_items`.
+
+        The items in `shared_items` are sent as handles, see `journal.items_record`.
+        """
+        self._send(journal.items_record(key, array, indexes, shared_items))
+
+    def _send(self, record: journal.Record):
+        with self._lock:
+            self._number += 1
+            self._unconfirmed.append((self._number, record))
+            # The writer releases the memory once the record is written
+            for handle in shared_array.handles(record):
+                handle.sent = True
+            if self._disconnected:
+                return
+            try:
+                self._send_record(self._number, record)
+                if self._number % self.confirm_interval == 0:
+                    self._confirm(
+                        self._request(("written", self.filepath, self._client))
+                    )
+            except (OSError, EOFError) as error:
+                # Sent again, or written by this process, on `flush`
+                self._disconnected = True
+                logger.warning(
+                    "Writer is not reachable (%s). Records of '%s' are kept until flush.",
+                    error,
+                    self.filepath,
+                )
+
+    def _send_record(self, number: int, record: journal.Record):
+        first = self._unconfirmed[0][0]
+        message = ("record", self.filepath, self._client, first, number, record)
+        self._connection.send(message)
+
+    def _request(self, message: Tuple[Any, ...]) -> Any:
+        reply = self._connection.send(message, wait_reply=True)
+        if reply[0] == "error":
+            _, error_type, error_message = reply
+            if error_type == "FileLockedError":
+                raise FileLockedError(error_message)
+            raise RuntimeError(
+                f"Writer failed to save '{self.filepath}': {error_message}"
+            )
+        return reply[1]
+
+    def _confirm(self, written: int):
+        """Forget the records that the writer has written."""
+        unconfirmed = []
+        for number, record in self._unconfirmed:
+            if number > written:
+                unconfirmed.append((number, record))
+                continue
+            for handle in shared_array.handles(record):
+                handle.transferred = True
+        self._unconfirmed = unconfirmed
+
+    def flush(self):
+        """Wait until the writer has written all the records of the file.
+
+        The records that the writer did not receive (e.g. it restarted) are sent again.
+        If no writer runs anymore, they are written by this process.
+
+        Raises:
+            FileLockedError: If the h5 file is locked by another writer.
+            RuntimeError: If the writer did not write the records sent again.
+        """
+        with self._lock:
+            try:
+                for attempt in range(2):
+                    if attempt or self._disconnected:
+                        for number, record in self._unconfirmed:
+                            self._send_record(number, record)
+                        self._disconnected = False
+                    self._confirm(self._request(("flush", self.filepath, self._client)))
+                    if not self._unconfirmed:
+                        return
+            except (OSError, EOFError) as error:
+                logger.warning(
+                    "Writer is not reachable (%s). '%s' is saved by the kernel.",
+                    error,
+                    self.filepath,
+                )
+                self._write_unconfirmed()
+                return
+            raise RuntimeError(
+                f"Writer did not save the records {self._unconfirmed[0][0]} to "
+                f"{self._unconfirmed[-1][0]} of '{self.filepath}'"
+            )
+
+    def _write_unconfirmed(self):
+        records = [record for _, record in self._unconfirmed]
+        journal.apply_records(self.filepath, records)
+        self._unconfirmed = []
+        self._disconnected = False
+        for handle in shared_array.handles(records):
+            handle.release()
+
+
+_CONNECTIONS: Dict[str, _Connection] = {}
+_WRITERS: Dict[str, FileWriter] = {}
+_WRITERS_LOCK = threading.RLock()
+
+
+def is_running(address: Optional[str] = None) -> bool:
+    """Check if a writer listens on the address."""
+    try:
+        with _connect(address or default_address()) as connection:
+            connection.send(("ping",))
+            return connection.recv()[0] == "ok"
+    except (OSError, EOFError):
+        return False
+
+
+def start_server(
+    address: Optional[str] = None, flush_interval: float = 0.2, timeout: float = 10
+) -> str:
+    """Start the writer process if it does not run yet.
+
+    The process is detached from the current one, so it keeps running after the kernel
+    stops.
+
+    Returns:
+        str: Address of the writer.
+
+    Raises:
+        TimeoutError: If the writer did not start within `timeout` seconds.
+    """
+    import subprocess
+
+    address = address or default_address()
+    if is_running(address):
+        return address
+    command = [sys.executable, "-m", "labmate.acquisition.writer", "--address"]
+    command += [address, "--flush-interval", str(flush_interval)]
+    subprocess.Popen(  # pylint: disable=consider-using-with
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=sys.platform != "win32",
+    )
+    start = time.monotonic()
+    while not is_running(address):
+        if time.monotonic() - start > timeout:
+            raise TimeoutError(f"Writer did not start at '{address}'")
+        time.sleep(0.05)
+    return address
+
+
+def stop_server(address: Optional[str] = None):
+    """Stop the writer after it writes all pending records."""
+    address = address or default_address()
+    with _WRITERS_LOCK:
+        connection = _CONNECTIONS.pop(address, None)
+        for key in [key for key, w in _WRITERS.items() if w._connection is connection]:
+            _WRITERS.pop(key)
+    if connection is not None:
+        connection.close()
+    if is_running(address):
+        with _connect(address) as client:
+            client.send(("shutdown",))
+            client.recv()
+
+
+def enable(filepath: str, address: Optional[str] = None, start: bool = True):
+    """Send the saves of the file to the writer.
+
+    Args:
+        filepath (str): Path to the h5 file, with or without extension.
+        address (str, optional): Address of the writer. Defaults to `default_address()`.
+        start (bool, optional): Start the writer if it does not run. Defaults to True.
+    """
+    address = address or default_address()
+    if start:
+        start_server(address)
+    with _WRITERS_LOCK:
+        connection = _CONNECTIONS.setdefault(address, _Connection(address))
+        _WRITERS[_get_key(filepath)] = FileWriter(filepath, connection)
+
+
+def disable(filepath: str):
+    """Wait until the writer saves the file and save it directly as usual."""
+    with _WRITERS_LOCK:
+        file_writer = _WRITERS.pop(_get_key(filepath), None)
+    if file_writer is not None:
+        file_writer.flush()
+
+
+def is_enabled(filepath: str) -> bool:
+    return _get_key(filepath) in _WRITERS
+
+
+def get_writer(filepath: str) -> Optional[FileWriter]:
+    return _WRITERS.get(_get_key(filepath))
+
+
+def flush(filepath: Optional[str] = None):
+    """Wait until the writer saves the file (or all files if `filepath` is None)."""
+    with _WRITERS_LOCK:
+        if filepath is not None:
+            file_writer = _WRITERS.get(_get_key(filepath))
+            writers = [file_writer] if file_writer is not None else []
+        else:
+            writers = list(_WRITERS.values())
+    for file_writer in writers:
+        file_writer.flush()
+
+
+def _flush_at_exit():
+    """Save the records that the writer did not confirm yet before the kernel exits."""
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values())
+    for file_writer in writers:
+        try:
+            file_writer.flush()
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("Could not save '%s' (%s).", file_writer.filepath, error)
+
+
+atexit.register(_flush_at_exit)
+
+
+def main(args: Optional[List[str]] = None):
+    """Command line interface to run the writer."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m labmate.acquisition.writer",
+        description="Run the process that writes the acquisition files.",
+    )
+    parser.add_argument("--address", default=None, help="Socket or pipe address.")
+    parser.add_argument("--flush-interval", type=float, default=0.2, help="In seconds.")
+    parser.add_argument("--stop", action="store_true", help="Stop the running writer.")
+    parsed = parser.parse_args(args)
+
+    if parsed.stop:
+        stop_server(parsed.address)
+        return
+    WriterServer(parsed.address, flush_interval=parsed.flush_interval).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
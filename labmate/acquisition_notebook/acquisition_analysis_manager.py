@@ -1,6 +1,7 @@
 import logging
 import os
 import time
+from collections import OrderedDict
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -14,22 +15,30 @@ from typing import (
     Union,
 )
 
-from .. import display, utils
-from ..acquisition import AcquisitionManager, AnalysisData
+from .. import utils
+from ..acquisition import AcquisitionManager, AnalysisData, journal
+from ..acquisition import layout as layouts
 from ..logger import logger
-from . import display_widget
+from ..utils.lazy_module import LazyModule
+
+# The display modules import IPython and ipywidgets, so they are imported on first use
+display = LazyModule("..display", __package__)
+display_widget = LazyModule(".display_widget", __package__)
+container = LazyModule("..acquisition.container", __package__)
 
 if TYPE_CHECKING:
+    from ..acquisition import container
     from dh5.path import Path
 
+    from .. import display
+    from . import display_widget
+
     from ..acquisition import FigureProtocol
     from ..acquisition.config_file import ConfigFile
 
     # from ..logger import Logger
 
 
-logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
-
 _CallableWithNoArgs = Callable[[], Any]
 
 
@@ -71,6 +80,7 @@ class AcquisitionAnalysisManager(AcquisitionManager):
     _analysis_cell_prerun_hook: Optional[Tuple[_CallableWithNoArgs, ...]] = None
     _acquisition_cell_prerun_hook: Optional[Tuple[_CallableWithNoArgs, ...]] = None
     _connected_widgets: Optional[List["display_widget.WidgetProtocol"]] = None
+    _analysis_cache_size: int = 4
 
     def __init__(
         self,
@@ -82,6 +92,14 @@ class AcquisitionAnalysisManager(AcquisitionManager):
         save_on_edit: bool = True,
         save_on_edit_analysis: Optional[bool] = None,
         save_fig_inside_h5: bool = False,
+        use_config_store: bool = False,
+        analysis_cache_size: Optional[int] = None,
+        keep_file_open: Optional[float] = None,
+        use_journal: bool = False,
+        use_writer: Union[bool, str] = False,
+        container_size: Optional[int] = None,
+        session: Optional[str] = None,
+        layout: Optional[str] = None,
         shell: Any = True,
     ):
         """
@@ -101,9 +119,39 @@ class AcquisitionAnalysisManager(AcquisitionManager):
                 True to save data for every change.
             save_on_edit_analysis (bool. Defaults to same as save_on_edit):
                 save_on_edit parameter for AnalysisManager i.e. data inside analysis_cell
+            use_config_store (bool. Defaults to False):
+                True to save the config files once inside `data_directory/.config_store`
+                and keep only their hashes inside the h5 files.
+            analysis_cache_size (int. Defaults to 4):
+                Number of loaded files kept in memory. Loading a file that has not
+                changed since returns the same AnalysisData. 0 to disable the cache.
+            keep_file_open (float, optional. Defaults to None):
+                Keep the acquisition file open between the saves and close it after this
+                idle time in seconds or on save_acquisition. Other processes cannot open
+                the file while it's open. Defaults to open the file for every save.
+            use_journal (bool, optional. Defaults to False):
+                Append the saves of the acquisition to a journal next to the file and
+                fold it into the file in the background and on save_acquisition. If the
+                kernel dies, the saves are recovered from the journal.
+            use_writer (bool | str, optional. Defaults to False):
+                Send the saves of the acquisition to a local writer process that owns the
+                files and writes them in batches, so slow disks do not stall the kernel.
+                The writer is started if needed. A string is the address of the writer.
+            container_size (int, optional. Defaults to None):
+                Save the acquisitions made with create_acquisition as groups of a shared
+                container file, with at most this number of acquisitions per container.
+            session (str, optional. Defaults to None):
+                Name of the session to keep the current acquisition inside
+                `temp_{session}.json` instead of `temp.json`, so several kernels can use
+                the same data_directory. Defaults to ACQUISITION_SESSION environ.
+            layout (str, optional. Defaults to "flat"):
+                "date" or "month" to save the acquisitions inside subdirectories of the
+                experiment directory. See `labmate.acquisition.layout`.
             shell (InteractiveShell | None, optional. Defaults to True):
                 could be provided or explicitly set to None. Defaults to get_ipython().
         """
+        logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.INFO)
+
         if shell is False or shell is True:  # behavior by default shell
             try:
                 from IPython.core.getipython import get_ipython
@@ -124,6 +172,9 @@ class AcquisitionAnalysisManager(AcquisitionManager):
 
         self._save_on_edit_analysis = save_on_edit_analysis
         self._save_fig_inside_h5 = save_fig_inside_h5
+        if analysis_cache_size is not None:
+            self._analysis_cache_size = analysis_cache_size
+        self._analysis_cache: "OrderedDict[str, AnalysisData]" = OrderedDict()
 
         self._logger = logger
         super().__init__(
@@ -131,6 +182,13 @@ class AcquisitionAnalysisManager(AcquisitionManager):
             config_files=config_files,
             save_files=save_files,
             save_on_edit=save_on_edit,
+            use_config_store=use_config_store,
+            keep_file_open=keep_file_open,
+            use_journal=use_journal,
+            use_writer=use_writer,
+            container_size=container_size,
+            session=session,
+            layout=layout,
         )
 
     @property
@@ -266,19 +324,29 @@ class AcquisitionAnalysisManager(AcquisitionManager):
     def _load_analysis_data(self, filepath: Optional[str] = None):
         filepath = filepath or str(self.current_filepath)
 
-        self._analysis_data = self.load_file(filepath)
+        # The arrays saved by the current acquisition are reused instead of read again
+        data = None
+        acquisition = None if self._is_old_data else self._current_acquisition
+        if acquisition is not None and _same_file(str(acquisition.filepath), filepath):
+            data = acquisition.get_saved_arrays()
+
+        self._analysis_data = self.load_file(filepath, data=data)
 
         if self._save_on_edit_analysis is False:
             self._analysis_data.save()
 
         return self._analysis_data
 
-    def load_file(self, filename) -> "AnalysisData":
+    def load_file(
+        self, filename, data: Optional[Dict[str, Any]] = None
+    ) -> "AnalysisData":
         """
         Loads an analysis data file.
 
         Args:
             filename (str): The name of the file to load.
+            data (dict, optional): Values of some keys that are already in memory, so they
+                are not read from the file. See `AnalysisData`.
 
         Returns:
             AnalysisData: An instance of AnalysisData containing the loaded data.
@@ -288,22 +356,33 @@ class AcquisitionAnalysisManager(AcquisitionManager):
 
         Notes:
             - The method checks if the file exists with a ".h5" extension.
+            - The file can be an acquisition inside a container, given either as
+              "container.h5::group" or by its name (see `labmate.acquisition.container`).
+            - If the file was loaded recently and has not changed since, the cached
+              AnalysisData is returned with its figure and config state reset.
             - If the data does not have a "useful" attribute set to True, it updates this attribute.
             - If default configuration files are provided, they are set in the loaded data.
         """
         filename = self._get_full_filename(filename)
-        if not os.path.exists(
-            filename if filename.endswith(".h5") else filename + ".h5"
-        ):
+        if not container.exists(filename):
             raise ValueError(f"File {filename} cannot be found")
 
-        data = AnalysisData(
-            filepath=filename,
-            save_files=self._save_files,
-            save_on_edit=self._save_on_edit_analysis,
-            save_fig_inside_h5=self._save_fig_inside_h5,
-            open_on_init=False,
-        )
+        h5_filepath, group = container.resolve(filename)
+        cache_key = os.path.abspath(h5_filepath)
+        cache_key = cache_key if group is None else container.join(cache_key, group)
+        cached_data = self._get_cached_analysis_data(cache_key)
+        if cached_data is not None:
+            data = cached_data
+        else:
+            data = AnalysisData(
+                filepath=filename,
+                save_files=self._save_files,
+                save_on_edit=self._save_on_edit_analysis,
+                save_fig_inside_h5=self._save_fig_inside_h5,
+                open_on_init=False,
+                data=data,
+            )
+            self._cache_analysis_data(cache_key, data)
 
         if not data.get("useful", True):
             data.unlock_data("useful").update(**{"useful": True}).lock_data("useful")
@@ -313,6 +392,36 @@ class AcquisitionAnalysisManager(AcquisitionManager):
 
         return data
 
+    def _get_cached_analysis_data(self, cache_key: str) -> Optional[AnalysisData]:
+        """Return the cached AnalysisData if the file has not changed since."""
+        data = self._analysis_cache.pop(cache_key, None)
+        if data is None:
+            return None
+        try:
+            changed = data.pull_available()
+        except (OSError, AttributeError):
+            changed = True
+        if changed or data._last_update:  # pylint: disable=protected-access
+            return None
+
+        data._reset_attrs()  # pylint: disable=protected-access
+        data._close_nested_keys()  # pylint: disable=protected-access
+        # Values saved by the previous analysis are read-only, as in a new AnalysisData
+        data.lock_data()
+        self._analysis_cache[cache_key] = data
+        return data
+
+    def _cache_analysis_data(self, cache_key: str, data: AnalysisData):
+        if self._analysis_cache_size <= 0:
+            return
+        self._analysis_cache[cache_key] = data
+        while len(self._analysis_cache) > self._analysis_cache_size:
+            self._analysis_cache.popitem(last=False)
+
+    def clear_analysis_cache(self):
+        """Forget the loaded files, so the next analysis_cell reads the file again."""
+        self._analysis_cache.clear()
+
     def acquisition_cell(
         self,
         name: str,
@@ -428,7 +537,8 @@ class AcquisitionAnalysisManager(AcquisitionManager):
                 "Check if everything is ok and executive again"
             )
 
-        if os.path.exists(filename + ".h5"):
+        # The acquisition can be a separate file or a group inside a container
+        if container.exists(filename):
             self._load_analysis_data(filename)
         else:
             if self._is_old_data:
@@ -480,7 +590,8 @@ class AcquisitionAnalysisManager(AcquisitionManager):
 
         filepath = utils.get_path_from_filename(filename)
         if isinstance(filepath, tuple):
-            return os.path.join(self.data_directory, *filepath)
+            experiment_path = os.path.join(self.data_directory, filepath[0])
+            return layouts.find(experiment_path, filepath[1], self._layout)
         return filepath
 
     def parse_config_file(self, config_file_name: str, /) -> "ConfigFile":
@@ -552,7 +663,7 @@ class AcquisitionAnalysisManager(AcquisitionManager):
 
     def find_param_in_config(self, param: str) -> Optional[Tuple[str, int]]:
         for file in self._default_config_files:
-            for line_no, line in enumerate(self.d["configs", file].split("\n")):
+            for line_no, line in enumerate(self.d.get_configs()[file].split("\n")):
                 if line.startswith(param):
                     return file, line_no + 1
         return None
@@ -635,19 +746,21 @@ class AcquisitionAnalysisManager(AcquisitionManager):
         return display.display_widgets_vertically(links, class_="labmate-params")
 
     def update_config_params_on_disk(self, params: Dict[str, Any]):
-        # params_per_files = {}
-        # for param, value in params.items():
-        #     res = self.find_param_in_data_config(param)
-        #     if res is None:
-        #         raise ValueError(
-        #             f"Parameter '{param}' cannot be found in default config files."
-        #         )
-        #     file, _ = res
-        #     params_per_files.setdefault(file, {})[param] = value
-
-        for file in self.config_files:
-            file = self._config_files_names_to_path.get(file, file)
-            utils.file_read.update_file_variable(file, params)
+        """Update the values of the parameters inside the config files on disk.
+
+        Each config file is read and rewritten (atomically) at most once.
+        """
+        files = [
+            self._config_files_names_to_path.get(file, file)
+            for file in self.config_files
+        ]
+        updated = utils.file_read.update_files_variables(files, params)
+
+        not_found = set(params).difference(*updated.values())
+        for param in sorted(not_found):
+            self.logger.warning(
+                "Parameter '%s' cannot be found in config files.", param
+            )
 
         return self
 
@@ -663,6 +776,119 @@ class AcquisitionAnalysisManager(AcquisitionManager):
             self._connected_widgets = []
         self._connected_widgets.extend(objs)
 
+    def live_analysis(
+        self,
+        callback: _CallableWithNoArgs,
+        *,
+        max_rate: float = 1.0,
+        settle_time: float = 0.2,
+        poll_interval: float = 0.05,
+        timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        clear_output: bool = True,
+    ) -> "AcquisitionAnalysisManager":
+        """Run `callback` again every time the analysed file changes.
+
+        Should be called inside the analysis cell, while the acquisition is running in
+        another kernel. The file and its journal (see `use_journal`) are polled with
+        `os.stat`, the data is pulled incrementally (see `AnalysisData.pull`), and
+        `callback` is run again. A missing file is not ready yet. It blocks until a
+        timeout or until the cell is interrupted.
+
+        Examples:
+            >>> aqm.analysis_cell()
+            >>> def plot():
+            ...     plt.plot(aqm.d.loop.x, aqm.d.loop.y)
+            ...     plt.show()
+            >>> aqm.live_analysis(plot, max_rate=2)
+
+        Args:
+            callback (Callable[[], Any]): Function to run, e.g. to plot the data.
+            max_rate (float, optional): Maximum number of runs per second. 0 means
+                no limit. Defaults to 1.
+            settle_time (float, optional): Wait until the file has not changed for this
+                time (in seconds), so a burst of writes triggers only one run. If the file
+                keeps changing, `callback` is run anyway at `max_rate` (every
+                `settle_time` if there is no limit). Defaults to 0.2.
+            poll_interval (float, optional): Time between the checks of the file.
+                Defaults to 0.05.
+            timeout (float, optional): Stop after this time. Defaults to never.
+            idle_timeout (float, optional): Stop if the file has not changed for this
+                time, e.g. when the acquisition is finished. Defaults to never.
+            clear_output (bool, optional): Clear the cell output before each run.
+                Defaults to True.
+        """
+        data = self.data
+        filepath = data.h5_filepath
+        lock_filepath = os.path.splitext(filepath)[0] + ".lock"
+        min_period = 1 / max_rate if max_rate else 0
+        # Longest wait for the file to settle
+        max_wait = max(min_period, settle_time)
+        clear = None
+        if clear_output and self.shell is not None:
+            from IPython.display import clear_output as clear
+
+        def run():
+            if clear is not None:
+                clear(wait=True)
+            callback()
+
+        start = last_run = last_change = time.monotonic()
+        first_change: Optional[float] = None
+        signature = _file_signature(filepath)
+        run()
+        try:
+            while timeout is None or time.monotonic() - start < timeout:
+                time.sleep(poll_interval)
+                now = time.monotonic()
+                new_signature = _file_signature(filepath)
+                if new_signature != signature:
+                    signature, last_change = new_signature, now
+                    first_change = first_change or now
+
+                if first_change is None:
+                    if idle_timeout is not None and now - last_change > idle_timeout:
+                        break
+                    continue
+                if now - last_run < min_period or os.path.exists(lock_filepath):
+                    continue
+                if now - last_change < settle_time and now - first_change < max_wait:
+                    continue
+
+                try:
+                    data.pull()
+                except OSError as error:  # the file is being written
+                    self.logger.debug("Cannot pull %s: %s", filepath, error)
+                    continue
+                first_change, last_run = None, now
+                run()
+        except KeyboardInterrupt:
+            pass
+        return self
+
+
+def _file_signature(filepath: str) -> Tuple[Optional[Tuple[int, int]], ...]:
+    """Return the modification time and size of the h5 file and of its journal.
+
+    Like `AnalysisData.pull_available`, the journal is checked as the saves can be
+    appended to it without modifying the h5 file. None for a file that does not exist.
+    """
+    signature = []
+    for path in (filepath, journal.journal_path(filepath)):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _same_file(first: str, second: str) -> bool:
+    """Compare two paths to h5 files with or without extension."""
+    first = first[:-3] if first.endswith(".h5") else first
+    second = second[:-3] if second.endswith(".h5") else second
+    return os.path.abspath(first) == os.path.abspath(second)
+
 
 def get_current_cell(shell: Any) -> Optional[str]:
     if shell is None:
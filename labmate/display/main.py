@@ -4,7 +4,6 @@ import logging
 import sys
 from typing import Callable, List
 
-logging.basicConfig(format="%(levelname)s:%(message)s", level=logging.WARNING)
 logger = logging.getLogger(__name__)
 handler = logging.StreamHandler()
 formatter = logging.Formatter("%(levelname)s:%(message)s")
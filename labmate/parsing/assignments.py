@@ -0,0 +1,91 @@
+"""Single pass parser of the assignments inside a config file."""
+
+import functools
+import re
+from typing import List, NamedTuple, Tuple
+
+_VALUE_COMMENT = "# value: "
+_HAS_BRACKETS = re.compile(r"[()\[\]{}]").search
+
+
+class ParsedAssignment(NamedTuple):
+    """Assignment found inside a config file.
+
+    `original` is the value as written in the file and `value` is the value to evaluate, i.e.
+    the one after `# value: ` comment if it exists, otherwise same as `original`.
+    `start_line` and `end_line` are the numbers (starting from 1) of the first and
+    the last line of the assignment. They are different for multiline values.
+    """
+
+    name: str
+    original: str
+    value: str
+    start_line: int
+    end_line: int
+
+
+def _brackets_score(text: str) -> int:
+    """Return non zero value if brackets inside the text are not balanced.
+
+    It's the same as `BracketsScore.update_from_str` followed by `is_zero`, but the three
+    scores are packed into one number.
+    """
+    return (
+        (text.count("(") - text.count(")"))
+        + ((text.count("{") - text.count("}")) << 20)
+        + ((text.count("[") - text.count("]")) << 40)
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def parse_assignments(text: str, /) -> Tuple[ParsedAssignment, ...]:
+    """Find all the assignments inside the text in one pass.
+
+    Only the lines that start with a letter and contain `=` are considered as assignments.
+    If brackets are not closed at the end of the line, the value continues on the next lines.
+    The value to evaluate is taken from the `# value: ` comment of the first line.
+    The output is the same as the one of `parse_str`, with the lines of each assignment.
+
+    The result is cached by the content of the text, so the same config file saved inside
+    many acquisitions is parsed only once.
+
+    Args:
+        text (str): Content of the config file.
+
+    Returns:
+        Tuple of ParsedAssignment in the order they appear in the text.
+    """
+    assignments: List[ParsedAssignment] = []
+    append = assignments.append
+    lines = text.split("\n")
+    lines_number = len(lines)
+    index = 0
+
+    while index < lines_number:
+        line = lines[index]
+        index += 1
+        if not line[:1].isalpha() or "=" not in line:
+            continue
+
+        start_line = index
+        param, value = line.split("=")[:2]
+        if _HAS_BRACKETS(line):
+            score = _brackets_score(line)
+            while score and index < lines_number:
+                line = lines[index]
+                index += 1
+                value += f"{line.split('#')[0].strip()}\n"
+                score += _brackets_score(line)
+            if score:
+                break
+
+        if _VALUE_COMMENT in value:
+            value_eval = value[value.rfind(_VALUE_COMMENT) + len(_VALUE_COMMENT) :]
+            value = value.split("#")[0].strip()
+        else:
+            value = value.split("#")[0].strip()
+            value_eval = value
+
+        append(ParsedAssignment(param.strip(), value, value_eval, start_line, index))
+
+    return tuple(assignments)
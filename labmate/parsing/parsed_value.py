@@ -61,7 +61,7 @@ class ParsedValue:
             value (Any): converted value if possible
         """
         self.original = parse_value(original)
-        self.value = parse_value(value)
+        self.value = self.original if value is original else parse_value(value)
 
     def __iter__(self):
         return iter((self.original, self.value))
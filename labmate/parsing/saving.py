@@ -1,8 +1,14 @@
 """This file contains functions that prepare file for saving for further parsing."""
 
-from typing import Dict
+import ast
+from typing import Any, Dict, Optional
 
-from . import parse_str
+from .assignments import ParsedAssignment, parse_assignments
+from .parsed_value import parse_value
+
+# Larger dicts, lists and tuples are not annotated, so the saved configs stay readable
+MAX_ANNOTATED_ITEMS = 20
+MAX_ANNOTATION_LENGTH = 200
 
 
 def append_values_from_modules_to_files(
@@ -39,6 +45,11 @@ def append_values_from_module_to_file(
     Returns:
         Multiline string of the updated file body with added values.
 
+    The file is parsed only once. Dicts, lists and tuples are annotated only if they are
+    short (see `MAX_ANNOTATED_ITEMS` and `MAX_ANNOTATION_LENGTH`). For a multiline value,
+    the value is appended to the last line of the assignment. It's there only for
+    reading, since `parse_str` takes the `# value: ` comment only from the first line.
+
     Example:
         Let you know your config file `config_file.py`:
         ```
@@ -64,18 +75,41 @@ def append_values_from_module_to_file(
     """
     variables = vars(module)
     lines = body.split("\n")
-    for i, line in enumerate(lines):
-        for key, (val, _) in parse_str(line).items():
-            real_val = variables.get(key, "")
-            if (
-                isinstance(val, str)
-                and isinstance(real_val, str)
-                and real_val != val.strip("\"'")
-            ) or (
-                isinstance(val, str)
-                and isinstance(real_val, (float, int, complex))
-                and not isinstance(real_val, bool)
-            ):
-                lines[i] += f"{separator}{real_val}"
+    for assignment in parse_assignments(body):
+        annotation = _get_annotation(assignment, variables.get(assignment.name, ""))
+        if annotation is not None:
+            lines[assignment.end_line - 1] += f"{separator}{annotation}"
 
     return "\n".join(lines)
+
+
+def _get_annotation(assignment: ParsedAssignment, real_val: Any) -> Optional[str]:
+    """Return the value to append to the assignment or None if it's clear from parsing."""
+    val = parse_value(assignment.original)
+    if not isinstance(val, str):
+        return None
+
+    if isinstance(real_val, str):
+        annotation = real_val if real_val != val.strip("\"'") else None
+    elif isinstance(real_val, (float, int, complex)) and not isinstance(real_val, bool):
+        annotation = str(real_val)
+    elif isinstance(real_val, (dict, list, tuple)):
+        if len(real_val) > MAX_ANNOTATED_ITEMS or _is_same_literal(val, real_val):
+            return None
+        annotation = str(real_val)
+        if len(annotation) > MAX_ANNOTATION_LENGTH:
+            return None
+    else:
+        return None
+
+    if annotation is None or "\n" in annotation:
+        return None
+    return annotation
+
+
+def _is_same_literal(value: str, real_val: Any) -> bool:
+    """Check if the value is a python literal equal to `real_val`."""
+    try:
+        return bool(ast.literal_eval(value) == real_val)
+    except Exception:  # pylint: disable=broad-except
+        return False
@@ -3,9 +3,9 @@
 import json
 import os
 import re
-from typing import Any, Dict, List, Optional
-
-from ..parsing.brackets_score import BracketsScore
+import shutil
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 
 def read_file(file: str, /) -> str:
@@ -54,53 +54,128 @@ def read_files(files: List[str], /) -> Dict[str, str]:
     return configs
 
 
-def update_file_variable(file, params: Dict[str, Any]):
+def write_file_atomic(file: str, content: str, /):
+    """Write the content to a temporary file and rename it to `file`.
+
+    Readers of the file see either the old or the new content, but never a partially written
+    file. The permissions of the existing file are preserved.
+
+    Args:
+        file (str): The path to the file to write.
+        content (str): The content to write.
     """
-    Update the variables in a file with the given parameters.
+    directory = os.path.dirname(os.path.abspath(file))
+    file_descriptor, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(file)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as file_opened:
+            file_opened.write(content)
+            file_opened.flush()
+            os.fsync(file_opened.fileno())
+        if os.path.exists(file):
+            shutil.copymode(file, tmp_path)
+        os.replace(tmp_path, file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _format_variable_value(value: Any) -> str:
+    """Return the string to write inside config file for the value."""
+    if hasattr(value, "dtype") and hasattr(value, "tolist"):
+        value = value.tolist()  # numpy scalars and arrays
+    try:
+        value_str = json.JSONEncoder().encode(value)
+    except TypeError:
+        return repr(value)
+    if re.match(r"^['\"]?[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?['\"]?$", value_str):
+        value_str = value_str.replace('"', "")
+    return value_str
+
+
+def update_variables_in_text(text: str, params: Dict[str, Any]) -> Tuple[str, Set[str]]:
+    """Replace the values of the variables inside a config file content.
+
+    The text is read once. Every line `name = ...` where `name` is in `params` (also
+    indented ones) starts an assignment that lasts until its brackets are closed. It's
+    replaced by a single line `name = value` with the same indentation. The comment of
+    the last line of the assignment is kept.
 
     Args:
-        file (str): The path to the file to update.
-        params (Dict[str, Any]): The parameters to update the file with.
+        text (str): The content of the config file.
+        params (Dict[str, Any]): The variables to update with their new values.
+
+    Returns:
+        The updated text and the set of the variables that were found and updated.
     """
-    with open(file, "r", encoding="utf-8") as file_opened:
-        lines = file_opened.readlines()
+    from ..parsing.brackets_score import BracketsScore
+
+    new_lines: List[str] = []
+    updated: Set[str] = set()
     brackets = BracketsScore()
     current_param: Optional[str] = None
-    # print(lines)
-    start_line = 0
-    for line in lines:
-        # print(line)
-        if len(line) == 0:
-            continue
+    current_lines: List[str] = []
+
+    for line in text.split("\n"):
         if brackets.is_zero() and "=" in line:
             param = line.split("=")[0].strip()
-            # print("param", param)
             if param in params:
-                current_param = param
-                start_line = lines.index(line)
+                current_param, current_lines = param, []
 
         brackets.update_from_str(line)
-        if brackets.is_zero() and current_param is not None:
-            end_line = lines.index(line)
+        if current_param is None:
+            new_lines.append(line)
+            continue
+        current_lines.append(line)
+        if brackets.is_zero():
+            start_line = current_lines[0]
+            indent = start_line[: len(start_line) - len(start_line.lstrip())]
             end_comment = "#".join(line.split("#")[1:]).strip() if "#" in line else None
-            del lines[start_line : end_line + 1]
-            value_str = json.JSONEncoder().encode(params[current_param])
-
-            print("value_str", value_str)
-            if re.match(
-                r"^['\"]?[-+]?[0-9]*\.?[0-9]+([eE][-+]?[0-9]+)?['\"]?$", value_str
-            ):
-                value_str = value_str.replace('"', "")
-
-            lines.insert(
-                start_line,
-                (
-                    f"{current_param} = {value_str}"
-                    + (f"  # {end_comment}" if end_comment is not None else "")
-                    + "\n"
-                ),
+            new_lines.append(
+                f"{indent}{current_param} = "
+                f"{_format_variable_value(params[current_param])}"
+                + (f"  # {end_comment}" if end_comment is not None else "")
             )
+            updated.add(current_param)
             current_param = None
 
-    with open(file, "w", encoding="utf-8") as file_opened:
-        file_opened.writelines(lines)
+    # The brackets of the last assignment are never closed, it's kept as it is
+    new_lines.extend(current_lines if current_param is not None else [])
+    return "\n".join(new_lines), updated
+
+
+def update_file_variable(file: str, params: Dict[str, Any]) -> Set[str]:
+    """
+    Update the variables in a file with the given parameters.
+
+    The file is rewritten atomically and only if any of the variables were found.
+
+    Args:
+        file (str): The path to the file to update.
+        params (Dict[str, Any]): The parameters to update the file with.
+
+    Returns:
+        The set of the variables that were updated.
+    """
+    text = read_file(file)
+    new_text, updated = update_variables_in_text(text, params)
+    if updated and new_text != text:
+        write_file_atomic(file, new_text)
+    return updated
+
+
+def update_files_variables(
+    files: Iterable[str], params: Dict[str, Any]
+) -> Dict[str, Set[str]]:
+    """Update the variables in many files in one pass per file.
+
+    Args:
+        files (Iterable[str]): The paths to the files to update.
+        params (Dict[str, Any]): The parameters to update the files with.
+
+    Returns:
+        Dictionary {file: set of the variables updated inside this file}.
+    """
+    return {file: update_file_variable(file, params) for file in files}
@@ -0,0 +1,64 @@
+"""Modules imported on the first use.
+
+Importing the notebook parts (display, widgets, IPython) or the rarely used parts of the
+acquisition package takes time that scripts and worker processes do not need to pay.
+"""
+
+import importlib
+import importlib.util
+import sys
+from types import ModuleType
+from typing import Any, Callable, Dict, Optional
+
+
+class LazyModule:
+    """Module that is imported on the first access to one of its attributes.
+
+    Args:
+        name (str): Name of the module. Can be relative (e.g. `.links`) if `package` is set.
+        package (str, optional): Package used to resolve a relative name.
+    """
+
+    def __init__(self, name: str, package: Optional[str] = None):
+        self.__module: Optional[ModuleType] = None
+        self.__name = name
+        self.__package = package
+
+    def __getattr__(self, name):
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name, package=self.__package)
+        return getattr(self.__module, name)
+
+
+def lazy_attributes(package: str, attributes: Dict[str, str]) -> Callable[[str], Any]:
+    """Return a module `__getattr__` that imports the attributes on the first access.
+
+    Args:
+        package (str): Name of the module that defines `__getattr__`, i.e. `__name__`.
+        attributes (Dict[str, str]): Name of the attribute -> (relative) module with it.
+
+    Examples:
+        >>> __getattr__ = lazy_attributes(__name__, {"VirtualDataset": ".virtual_dataset"})
+    """
+
+    def __getattr__(name: str) -> Any:
+        if name not in attributes:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(attributes[name], package), name)
+        setattr(sys.modules[package], name, value)
+        return value
+
+    return __getattr__
+
+
+def imported_module(name: str, package: Optional[str] = None) -> Optional[ModuleType]:
+    """Return the module if it's already imported, otherwise None.
+
+    The modules with a state (e.g. the files enabled for the writer) have nothing to
+    flush or disable before their first use, so they don't need to be imported for it.
+
+    Args:
+        name (str): Name of the module. Can be relative (e.g. `.writer`) if `package` is set.
+        package (str, optional): Package used to resolve a relative name.
+    """
+    return sys.modules.get(importlib.util.resolve_name(name, package))
@@ -38,7 +38,8 @@ setuptools.setup(
     python_requires=">=3.8",
     install_requires=[
         "numpy",
-        "dh5",
+        # h5_handles overrides a private method of DH5 that may change in 0.9
+        "dh5>=0.8.1,<0.9",
     ],
     extras_require={
         "all": ["matplotlib", "pltsave"],
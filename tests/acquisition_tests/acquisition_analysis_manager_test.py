@@ -1,10 +1,14 @@
 import os
 import shutil
+import threading
+import time
 import unittest
 
+import numpy as np
 from dh5 import DH5
+from dh5.errors import ReadOnlyKeyError
 
-from labmate.acquisition import AnalysisData
+from labmate.acquisition import AcquisitionLoop, AnalysisData, AnalysisLoop, journal
 from labmate.acquisition_notebook import AcquisitionAnalysisManager
 
 from .analysis_data_test import AnalysisDataParceTest
@@ -178,6 +182,163 @@ class AcquisitionAnalysisManagerTest(unittest.TestCase):
         self.check_2_list(self.aqm.current_analysis["x"], self.x)
         self.check_2_list(self.aqm.current_analysis["y"], self.y)
 
+    def test_analysis_reuses_acquisition_arrays(self):
+        self.create_acquisition_cell()
+        loop = AcquisitionLoop()
+        for i in loop(3):
+            for j in loop(2):
+                loop.append(i=i, j=j * 1.5)
+        self.aqm.save_acquisition(x=np.arange(5), loop=loop, s="text", lst=[1, 2])
+
+        analysis = self.aqm.d.asdict()
+        self.assertTrue(np.shares_memory(analysis["x"], self.aqm.aq.asdict()["x"]))
+        self.assertIsInstance(analysis["loop"], AnalysisLoop)
+
+        from_disk = AnalysisData(self.aqm.current_filepath)
+        self.assertEqual(set(self.aqm.d.keys()), set(from_disk.keys()))
+        for key in ("x", "s", "lst", "useful"):
+            self.assertEqual(type(self.aqm.d[key]), type(from_disk[key]))
+            self.assertTrue(np.array_equal(self.aqm.d[key], from_disk[key]))
+        for key in ("i", "j", "__loop_shape__"):
+            self.assertTrue(np.array_equal(self.aqm.d.loop[key], from_disk.loop[key]))
+        self.assertEqual(
+            [list(d.j) for d in self.aqm.d.loop], [list(d.j) for d in from_disk.loop]
+        )
+
+        with self.assertRaises(KeyError):
+            self.aqm.d["x"] = 1
+
+        self.create_analysis_cell()
+        self.assertTrue(np.shares_memory(self.aqm.d.asdict()["x"], analysis["x"]))
+
+    def test_analysis_data_cached(self):
+        self.create_acquisition_cell()
+        self.aqm.save_acquisition(x=self.x)
+        self.create_analysis_cell()
+        data = self.aqm.d
+        data._fig_index = 3  # pylint: disable=protected-access
+
+        self.create_analysis_cell()
+        self.assertIs(self.aqm.d, data)
+        self.assertEqual(self.aqm.d._fig_index, 0)  # pylint: disable=protected-access
+
+        external = DH5(self.aqm.current_filepath, mode="a")
+        external["z"] = 5
+        external.save()
+        self.create_analysis_cell()
+        self.assertIsNot(self.aqm.d, data)
+        self.assertEqual(self.aqm.d["z"], 5)
+
+    def test_live_analysis(self):
+        self.create_acquisition_cell()
+        self.aqm.save_acquisition(x=[1])
+        self.create_analysis_cell()
+        calls = []
+
+        def callback():
+            calls.append(list(self.aqm.d["x"]))
+            if len(calls) < 3:
+                self.aqm.aq["x"] = calls[-1] + [len(calls) + 1]
+
+        self.aqm.live_analysis(
+            callback,
+            max_rate=100,
+            settle_time=0,
+            poll_interval=0.01,
+            idle_timeout=0.3,
+            clear_output=False,
+        )
+        self.assertEqual(calls, [[1], [1, 2], [1, 2, 3]])
+
+    def test_live_analysis_settles_without_max_rate(self):
+        self.create_acquisition_cell()
+        self.aqm.save_acquisition(x=[0])
+        self.create_analysis_cell()
+        calls = []
+
+        def write():
+            time.sleep(0.1)
+            for i in range(1, 4):
+                self.aqm.aq["x"] = [i]
+                time.sleep(0.03)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        self.aqm.live_analysis(
+            lambda: calls.append(list(self.aqm.d["x"])),
+            max_rate=0,
+            settle_time=0.3,
+            poll_interval=0.01,
+            idle_timeout=0.6,
+            clear_output=False,
+        )
+        thread.join()
+        self.assertEqual(calls, [[0], [3]])
+
+    def test_live_analysis_with_journal(self):
+        self.aqm = AcquisitionAnalysisManager(
+            DATA_DIR, save_on_edit=True, use_journal=True, shell=None
+        )
+        self.create_acquisition_cell()
+        self.aqm.save_acquisition(x=[1])
+        self.create_analysis_cell()
+        calls = []
+
+        def callback():
+            calls.append(list(self.aqm.d["x"]))
+            if len(calls) < 3:
+                # appended to the journal only, the h5 file does not change
+                self.aqm.aq["x"] = calls[-1] + [len(calls) + 1]
+
+        try:
+            self.aqm.live_analysis(
+                callback,
+                max_rate=100,
+                settle_time=0,
+                poll_interval=0.01,
+                idle_timeout=0.3,
+                clear_output=False,
+            )
+        finally:
+            journal.disable(self.aqm.aq.filepath)
+        self.assertEqual(calls, [[1], [1, 2], [1, 2, 3]])
+
+    def test_live_analysis_missing_file(self):
+        self.create_acquisition_cell()
+        self.aqm.save_acquisition(x=[1])
+        self.create_analysis_cell()
+        os.remove(self.aqm.aq.filepath + ".h5")
+        calls = []
+        self.aqm.live_analysis(
+            lambda: calls.append(1),
+            poll_interval=0.01,
+            idle_timeout=0.1,
+            clear_output=False,
+        )
+        self.assertEqual(calls, [1])
+
+    def test_analysis_data_cache_disabled(self):
+        self.aqm = AcquisitionAnalysisManager(
+            DATA_DIR, save_on_edit=True, analysis_cache_size=0, shell=None
+        )
+        self.aqm.acquisition_cell(self.experiment_name, cell="none")
+        self.aqm.save_acquisition(x=self.x)
+        self.aqm.analysis_cell(cell="none")
+        data = self.aqm.d
+        self.aqm.analysis_cell(cell="none")
+        self.assertIsNot(self.aqm.d, data)
+
+    def test_analysis_data_cache_locks_saved_values(self):
+        self.create_acquisition_cell()
+        self.aqm.save_acquisition(x=self.x)
+        self.create_analysis_cell()
+        data = self.aqm.d
+        self.aqm.d["fit"] = 1
+        self.create_analysis_cell()
+        self.assertIs(self.aqm.d, data)
+        with self.assertRaises(ReadOnlyKeyError):
+            self.aqm.d["fit"] = 2
+
     def test_useful_flag_after_save_acquisition(self):
         self.create_acquisition_cell()
         self.assertEqual(self.aqm.aq.get("useful"), False)
@@ -0,0 +1,104 @@
+import os
+import shutil
+import threading
+import unittest
+from unittest import mock
+
+from labmate.acquisition import AcquisitionManager, AnalysisData, acquisition_id
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data", "acquisition_id")
+
+
+class AcquisitionIdTest(unittest.TestCase):
+    """Test that the names of the acquisitions are unique and monotonic."""
+
+    def setUp(self):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+    def test_burst(self):
+        ids = [acquisition_id.new_id(DATA_DIR) for _ in range(300)]
+        self.assertEqual(len(set(ids)), 300)
+        self.assertEqual(ids, sorted(ids))
+
+    def test_threads(self):
+        ids = []
+
+        def allocate():
+            for _ in range(50):
+                ids.append(acquisition_id.new_id(DATA_DIR))
+
+        threads = [threading.Thread(target=allocate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(ids)), 200)
+        self.assertFalse(
+            os.path.exists(os.path.join(DATA_DIR, ".last_acquisition_id.lock"))
+        )
+
+    def test_clock_goes_back(self):
+        os.makedirs(DATA_DIR)
+        with open(os.path.join(DATA_DIR, acquisition_id.ID_FILENAME), "w") as file:
+            file.write("2999_01_01__00_00_00 4")
+        self.assertEqual(acquisition_id.new_id(DATA_DIR), ("2999_01_01__00_00_00", 5))
+
+    def test_stale_lock(self):
+        os.makedirs(DATA_DIR)
+        lock_path = os.path.join(DATA_DIR, acquisition_id.ID_FILENAME + ".lock")
+        with open(lock_path, "w", encoding="utf-8"):
+            pass
+        os.utime(lock_path, (0, 0))
+        ids = []
+
+        def allocate():
+            ids.append(acquisition_id.new_id(DATA_DIR))
+
+        threads = [threading.Thread(target=allocate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(ids)), 4)
+        self.assertEqual(os.listdir(DATA_DIR), [acquisition_id.ID_FILENAME])
+
+    def test_existing_file_not_overwritten(self):
+        aqm = AcquisitionManager(DATA_DIR)
+        aqm.new_acquisition("abc", cell="none")
+        aqm["x"] = 1
+        filepath = str(aqm.aq.filepath)
+        # The same id is reserved again, as if `.last_acquisition_id` was removed
+        dic = aqm.acquisition_tmp_data
+        with mock.patch.object(
+            acquisition_id, "new_id", return_value=(dic.time_stamp, dic.sequence)
+        ):
+            aqm.new_acquisition("abc", cell="none")
+        self.assertEqual(str(aqm.aq.filepath), filepath + "__1")
+        self.assertEqual(AnalysisData(filepath)["x"], 1)
+
+    def test_get_name(self):
+        self.assertEqual(acquisition_id.get_name("ts", "abc"), "ts__abc")
+        self.assertEqual(acquisition_id.get_name("ts", "abc", 2), "ts__abc__2")
+
+    def test_create_acquisition(self):
+        aqm = AcquisitionManager(DATA_DIR)
+        aqm.new_acquisition("abc", cell="none")
+        filepaths = set()
+        for _ in range(20):
+            aq = aqm.create_acquisition("item")
+            aq["x"] = 1
+            filepaths.add(aq.filepath)
+        self.assertEqual(len(filepaths), 20)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
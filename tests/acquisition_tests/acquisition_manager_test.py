@@ -4,7 +4,7 @@ import unittest
 
 from dh5 import DH5
 
-from labmate.acquisition import AcquisitionManager
+from labmate.acquisition import AcquisitionLoop, AcquisitionManager, AnalysisData
 
 TEST_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data")
@@ -119,6 +119,25 @@ class AcquisitionManagerTest(unittest.TestCase):
 
         self.assertTrue(self.aqm.aq["useful"])
 
+    def test_save_additional_info_unchanged_not_written(self):
+        self.aqm._save_files = True  # pylint: disable=protected-access
+        self.aqm.set_config_file(os.path.join(TEST_DIR, "data/line_config.txt"))
+        self.aqm.new_acquisition(self.experiment_name, cell=self.acquisition_cell)
+        self.aqm.aq.save_additional_info()
+
+        files = [
+            self.aqm.aq.filepath + ".h5",
+            self.aqm.current_filepath + "_line_config.txt",
+            self.aqm.current_filepath + "_CELL.py",
+        ]
+        modified_times = [os.stat(file).st_mtime_ns for file in files]
+        self.aqm.save_acquisition()
+        self.assertEqual([os.stat(file).st_mtime_ns for file in files], modified_times)
+
+        os.remove(files[2])
+        self.aqm.aq.save_additional_info()
+        self.assertTrue(os.path.exists(files[2]))
+
     def test_save_config2(self):
         self.aqm.set_config_file(
             [
@@ -178,6 +197,142 @@ class AcquisitionManagerTest(unittest.TestCase):
             sd.get("configs", {}).get("line_config2.txt"), "this is a config file2"
         )
 
+    def test_save_config_store(self):
+        self.aqm = AcquisitionManager(DATA_DIR, use_config_store=True)
+        self.aqm.set_config_file(os.path.join(TEST_DIR, "data/line_config.txt"))
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        sd1 = self.load_data()
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        sd2 = self.load_data()
+
+        self.assertNotIn("configs", sd1)
+        key = sd1["configs_ref"]["line_config.txt"]
+        self.assertEqual(key, sd2["configs_ref"]["line_config.txt"])
+        self.assertEqual(self.aqm.config_store.get(key), "this is a config file")  # type: ignore
+
+    def test_save_config_store_file_created(self):
+        self.aqm = AcquisitionManager(DATA_DIR, save_files=True, use_config_store=True)
+        self.aqm.set_config_file(os.path.join(TEST_DIR, "data/line_config.txt"))
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+
+        config_filename = self.aqm.current_filepath + "_line_config.txt"
+        with open(config_filename, encoding="utf-8") as file:
+            line = file.readline()
+        self.assertEqual(line, "this is a config file")
+
+        # Editing the saved file does not change the stored config
+        with open(config_filename, "w", encoding="utf-8") as file:
+            file.write("edited")
+        key = self.load_data()["configs_ref"]["line_config.txt"]
+        self.assertEqual(self.aqm.config_store.get(key), "this is a config file")  # type: ignore
+
+    def test_config_store_after_relocation(self):
+        self.aqm = AcquisitionManager(DATA_DIR, use_config_store=True)
+        self.aqm.set_config_file(os.path.join(TEST_DIR, "data/line_config.txt"))
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.aqm.save_acquisition(x=1)
+
+        filepath = str(self.aqm.aq.filepath)
+        directory = os.path.join(os.path.dirname(filepath), "moved")
+        os.makedirs(directory, exist_ok=True)
+        moved = os.path.join(directory, os.path.basename(filepath))
+        shutil.copyfile(filepath + ".h5", moved + ".h5")
+
+        configs = AnalysisData(moved).get_configs()
+        self.assertEqual(configs["line_config.txt"], "this is a config file")
+        # Reading does not create a store next to the file
+        self.assertEqual(os.listdir(directory), [os.path.basename(moved) + ".h5"])
+
+    def test_config_overrides(self):
+        config_file = os.path.join(TEST_DIR, "data/config.txt")
+        with open(config_file, encoding="utf-8") as file:
+            original = file.read()
+        self.aqm.set_config_file(config_file)
+        self.aqm.override_config_params({"int": 5, "float": 1.5})
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+
+        sd = self.load_data()
+        self.assertEqual(sd["config_overrides"], {"int": 5, "float": 1.5})
+        self.assertEqual(
+            sd["configs"]["config.txt"],
+            original.replace("int = 123\n", "int = 5\n", 1).replace(
+                "\nfloat = 123.45\n", "\nfloat = 1.5\n"
+            ),
+        )
+        with open(config_file, encoding="utf-8") as file:
+            self.assertEqual(file.read(), original)
+
+    def test_config_overrides_context(self):
+        self.aqm.set_config_file(os.path.join(TEST_DIR, "data/config.txt"))
+        for value in range(3):
+            with self.aqm.overridden_config_params({"int": value}):
+                self.aqm.new_acquisition(self.experiment_name, cell="none")
+            sd = self.load_data()
+            self.assertEqual(sd["config_overrides"], {"int": value})
+            self.assertTrue(sd["configs"]["config.txt"].startswith(f"int = {value}\n"))
+
+        self.assertEqual(self.aqm.config_overrides, {})
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.assertNotIn("config_overrides", self.load_data())
+
+    def test_config_overrides_wrong_param(self):
+        self.aqm.set_config_file(os.path.join(TEST_DIR, "data/config.txt"))
+        self.aqm.override_config_params({"not_a_param": 1})
+        with self.assertRaises(ValueError):
+            self.aqm.new_acquisition(self.experiment_name, cell="none")
+
+    def test_config_files_not_read_twice(self):
+        self.aqm.set_config_file(os.path.join(TEST_DIR, "data/config.txt"))
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        cache = self.aqm._configs_cache  # pylint: disable=protected-access
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.assertIs(
+            self.aqm._configs_cache, cache
+        )  # pylint: disable=protected-access
+
+    def test_batch(self):
+        loop = AcquisitionLoop()
+        self.aqm["loop"] = loop
+        filepath = self.aqm.aq.filepath + ".h5"
+        modified_time = os.stat(filepath).st_mtime_ns
+
+        with self.aqm.batch():
+            for i in loop(3):
+                loop.append(i=i)
+            for i in range(5):
+                self.aqm[f"x{i}"] = i
+            self.aqm.save_acquisition(y=1)
+            self.assertEqual(os.stat(filepath).st_mtime_ns, modified_time)
+
+        sd = self.load_data()
+        self.assertEqual([sd[f"x{i}"] for i in range(5)], list(range(5)))
+        self.assertEqual(list(sd["loop"]["i"]), [0, 1, 2])
+        self.assertEqual(sd["y"], 1)
+        self.assertTrue(sd["useful"])
+
+        self.aqm["z"] = 2
+        self.assertEqual(self.load_data()["z"], 2)
+
+    def test_batch_rollback(self):
+        self.aqm["x"] = 1
+        with self.assertRaises(RuntimeError):
+            with self.aqm.batch(on_error="rollback"):
+                self.aqm["x"] = 2
+                self.aqm["y"] = 3
+                raise RuntimeError
+
+        self.assertEqual(self.aqm.aq["x"], 1)
+        self.assertNotIn("y", self.aqm.aq)
+        sd = self.load_data()
+        self.assertEqual(sd["x"], 1)
+        self.assertNotIn("y", sd)
+
+        with self.assertRaises(RuntimeError):
+            with self.aqm.batch():
+                self.aqm["y"] = 3
+                raise RuntimeError
+        self.assertEqual(self.load_data()["y"], 3)
+
     def test_file_was_explicitly_saved_false(self):
         sd = self.load_data()
         self.assertEqual(sd.get("useful"), False)
@@ -208,6 +363,29 @@ class AcquisitionManagerTest(unittest.TestCase):
     def test_current_filepath(self):
         self.assertEqual(str(self.aqm.aq.filepath), str(self.aqm.current_filepath))
 
+    def test_temp_file_replaced_atomically(self):
+        self.aqm.new_acquisition("other", cell="none")
+        files = os.listdir(DATA_DIR)
+        self.assertIn("temp.json", files)
+        self.assertEqual([file for file in files if file.endswith(".tmp")], [])
+        aqm = AcquisitionManager(DATA_DIR)
+        self.assertEqual(aqm.current_experiment_name, "other")
+
+    def test_session(self):
+        aqm1 = AcquisitionManager(DATA_DIR, session="first")
+        aqm1.new_acquisition("first_experiment", cell="none")
+        os.environ["ACQUISITION_SESSION"] = "second"
+        aqm2 = AcquisitionManager(DATA_DIR)
+        del os.environ["ACQUISITION_SESSION"]
+        aqm2.new_acquisition("second_experiment", cell="none")
+
+        self.assertTrue(os.path.exists(os.path.join(DATA_DIR, "temp_first.json")))
+        aqm = AcquisitionManager(DATA_DIR, session="first")
+        self.assertEqual(aqm.current_experiment_name, "first_experiment")
+        aqm = AcquisitionManager(DATA_DIR, session="second")
+        self.assertEqual(aqm.current_experiment_name, "second_experiment")
+        self.assertEqual(self.aqm.current_experiment_name, self.experiment_name)
+
     @classmethod
     def tearDownClass(cls):
         """Remove tmp_test_data directory ones all test finished."""
@@ -2,10 +2,17 @@ import os
 import shutil
 import unittest
 
+import h5py
 from dh5 import DH5
 
-from labmate.acquisition import AcquisitionManager, AnalysisData
+from labmate.acquisition import (
+    AcquisitionLoop,
+    AcquisitionManager,
+    AnalysisData,
+    AnalysisLoop,
+)
 from labmate.acquisition.acquisition_manager import read_files
+from labmate.acquisition.config_store import inline_configs
 
 TEST_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data")
@@ -134,6 +141,48 @@ class AnalysisDataTest(unittest.TestCase):
 
         self.assertFalse(fig.tighted_layout)
 
+    def test_pull(self):
+        self.aqm.aq["loop"] = loop = AcquisitionLoop()
+        for i in loop(4):
+            for j in loop(2):
+                loop.append(a=10 * i + j)
+            if i == 3:
+                self.ad.pull()
+                self.assertIsInstance(self.ad["loop"], AnalysisLoop)
+                self.assertEqual(self.ad["loop"]["a"][0].tolist(), [0, 1])
+
+        # the finished iterations are not read again (only the first and the last one
+        # are checked)
+        with h5py.File(self.ad.filepath + ".h5", "a") as file:
+            file["loop/a"][1] = -1
+        self.aqm.aq["x"] = [4, 5]
+        self.assertTrue(self.ad.pull_available())
+        self.ad.pull()
+        self.assertFalse(self.ad.pull_available())
+        self.assertEqual(list(self.ad["x"]), [4, 5])
+        self.assertEqual(
+            self.ad["loop"]["a"].tolist(), [[0, 1], [10, 11], [20, 21], [30, 31]]
+        )
+        with self.assertRaises(KeyError):
+            self.ad["loop"] = 1
+
+        self.ad.pull(force_pull=True, incremental=False)
+        self.assertIsInstance(self.ad["loop"], AnalysisLoop)
+        self.assertEqual(self.ad["loop"]["a"][1].tolist(), [-1, -1])
+
+    def test_pull_loop_saved_again(self):
+        self.aqm.aq["loop"] = loop = AcquisitionLoop()
+        for i in loop(3):
+            loop.append(a=i)
+        self.ad.pull()
+        self.assertEqual(self.ad["loop"]["a"].tolist(), [0, 1, 2])
+
+        self.aqm.aq["loop"] = loop = AcquisitionLoop()
+        for i in loop(3):
+            loop.append(a=10 * i)
+        self.ad.pull()
+        self.assertEqual(self.ad["loop"]["a"].tolist(), [0, 10, 20])
+
     @classmethod
     def tearDownClass(cls):
         """Remove tmp_test_data directory ones all test finished."""
@@ -330,6 +379,30 @@ class AnalysisDataParceTest(unittest.TestCase):
         return super().tearDownClass()
 
 
+class AnalysisDataParceConfigStoreTest(AnalysisDataParceTest):
+    """Same as AnalysisDataParceTest, but configs are saved inside the config store."""
+
+    def setUp(self):
+        super().setUp()
+        self.aqm = AcquisitionManager(DATA_DIR, use_config_store=True)
+        self.aqm.set_config_file(self.config)
+        self.aqm.new_acquisition(self.experiment_name)
+        self.ad = AnalysisData(self.aqm.current_filepath, cell=self.analysis_cell)
+
+    def test_configs_not_inside_file(self):
+        self.assertNotIn("configs", self.ad)
+        self.assertIn("configs_ref", self.ad)
+
+    def test_inline_configs(self):
+        filepath = inline_configs(
+            self.ad.filepath, os.path.join(DATA_DIR, "exported_data")
+        )
+        self.ad = AnalysisData(filepath)
+        self.assertNotIn("configs_ref", self.ad)
+        self.assertIn("config.txt", self.ad["configs"])
+        self.compare_config()
+
+
 class SimpleSaveFig:
     """This is emulation of a Figure class.
     The only goal of this class is to save something with savefig method.
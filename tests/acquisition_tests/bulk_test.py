@@ -0,0 +1,147 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+from labmate.acquisition import (
+    AcquisitionLoop,
+    AcquisitionManager,
+    AnalysisLoop,
+    extract_config_params,
+    load_key_from_files,
+)
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data")
+
+
+class ExtractConfigParamsTest(unittest.TestCase):
+    """Test extraction of config parameters from many files."""
+
+    experiment_name = "bulk_config"
+
+    @classmethod
+    def setUpClass(cls):
+        aqm = AcquisitionManager(DATA_DIR, use_config_store=True)
+        aqm.set_config_file(os.path.join(TEST_DIR, "data/config.txt"))
+        cls.files = []
+        for value in range(5):
+            with aqm.overridden_config_params({"int": value, "float": value / 2}):
+                aq = aqm.create_acquisition(cls.experiment_name, cell="none")
+            cls.files.append(aq.filepath + ".h5")
+
+        aqm.set_config_file(os.path.join(TEST_DIR, "data/line_config.txt"))
+        aq = aqm.create_acquisition(cls.experiment_name, cell="none")
+        cls.files.append(aq.filepath + ".h5")
+
+    def test_values(self):
+        columns = extract_config_params(self.files, ["int", "float", "wrong_int"])
+
+        self.assertEqual(columns.files, tuple(self.files))
+        self.assertEqual(columns.errors, {})
+        self.assertEqual(columns.values["int"].dtype, np.int64)
+        self.assertEqual(columns.values["int"][:5].tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(columns.values["float"].dtype, np.float64)
+        self.assertEqual(columns.values["float"][:5].tolist(), [0, 0.5, 1, 1.5, 2])
+        self.assertEqual(columns.values["wrong_int"].dtype, object)
+        self.assertEqual(columns.values["wrong_int"][0], "123 213")
+
+    def test_mask(self):
+        columns = extract_config_params(self.files, ["int", "not_a_param"])
+
+        self.assertEqual(columns.values["int"].mask.tolist(), [False] * 5 + [True])
+        self.assertTrue(columns.values["not_a_param"].mask.all())
+
+    def test_glob(self):
+        pattern = os.path.join(DATA_DIR, self.experiment_name, "*.h5")
+        columns = extract_config_params(pattern, ["int"])
+        self.assertEqual(len(columns.files), len(self.files))
+
+    def test_errors(self):
+        files = self.files[:2] + [os.path.join(DATA_DIR, "not_a_file.h5")]
+        columns = extract_config_params(files, ["int"], max_workers=2)
+
+        self.assertEqual(list(columns.errors), [files[-1]])
+        self.assertEqual(columns.values["int"].mask.tolist(), [False, False, True])
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+class LoadKeyFromFilesTest(unittest.TestCase):
+    """Test loading of a key from many files."""
+
+    experiment_name = "bulk_load"
+
+    @classmethod
+    def setUpClass(cls):
+        aqm = AcquisitionManager(DATA_DIR)
+        cls.files = []
+        for value in range(4):
+            aq = aqm.create_acquisition(cls.experiment_name, cell="none")
+            loop = AcquisitionLoop()
+            for i in loop(3):
+                loop.append(i=i * value)
+            aq.update(
+                y=np.arange(10) * value,
+                ragged=np.arange(value + 1),
+                scalar=value,
+                loop=loop,
+            )
+            cls.files.append(aq.filepath)
+
+    def test_stack(self):
+        res = load_key_from_files(self.files, "y")
+        self.assertEqual(res.errors, {})
+        self.assertEqual(res.values.shape, (4, 10))  # type: ignore
+        self.assertEqual(res.values[2].tolist(), list(np.arange(10) * 2))
+
+    def test_scalar(self):
+        res = load_key_from_files(self.files, "scalar")
+        self.assertEqual(res.values.tolist(), [0, 1, 2, 3])  # type: ignore
+
+    def test_slice(self):
+        res = load_key_from_files(self.files, "y", index=np.s_[::3])
+        self.assertEqual(res.values[3].tolist(), [0, 9, 18, 27])
+
+    def test_ragged(self):
+        res = load_key_from_files(self.files, "ragged")
+        self.assertIsInstance(res.values, list)
+        self.assertEqual([len(value) for value in res.values], [1, 2, 3, 4])
+
+        with self.assertRaises(ValueError):
+            load_key_from_files(self.files, "ragged", stack=True)
+
+    def test_loop(self):
+        res = load_key_from_files(self.files, "loop")
+        self.assertIsInstance(res.values[1], AnalysisLoop)
+        self.assertEqual(res.values[1].i.tolist(), [0, 1, 2])
+
+    def test_errors(self):
+        files = self.files + [os.path.join(DATA_DIR, "not_a_file.h5")]
+        res = load_key_from_files(files, "y", max_workers=2)
+        self.assertEqual(list(res.errors), [files[-1]])
+        self.assertEqual(res.values.shape, (4, 10))  # type: ignore
+        self.assertEqual(res.files, tuple(file + ".h5" for file in self.files))
+
+        res = load_key_from_files(self.files, "not_a_key")
+        self.assertEqual(len(res.errors), 4)
+        self.assertEqual(res.files, ())
+
+    def test_processes(self):
+        res = load_key_from_files(self.files, "y", use_processes=True, max_workers=2)
+        self.assertEqual(res.values.shape, (4, 10))  # type: ignore
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from labmate.acquisition import config_file
+from labmate.acquisition.config_file import ConfigFile
+from labmate.parsing import parse_str
+
+CONFIG = """
+import numpy as np
+calls = []
+calls.append(1)
+param = 2
+param_list = [1, 2]
+param_link = param * 3
+freqs = np.array([1.0, 2.0])
+def get_param():
+    return param
+"""
+
+
+def get_config(content: str = CONFIG) -> ConfigFile:
+    return ConfigFile(parse_str(content), content)
+
+
+class ConfigFileEvalCacheTest(unittest.TestCase):
+    """Test the cache of ConfigFile evaluations."""
+
+    def setUp(self):
+        config_file.clear_eval_cache()
+
+    def tearDown(self):
+        config_file.set_eval_cache_size()
+
+    def test_eval_as_module(self):
+        module = get_config().eval_as_module()
+        self.assertEqual(module.param_link, 6)
+        self.assertEqual(module.param_list, [1, 2])
+
+    def test_eval_as_module_compiled_once(self):
+        get_config().eval_as_module()
+        get_config().eval_as_module()
+        info = config_file._compile.cache_info()  # type: ignore # pylint: disable=protected-access
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_eval_as_module_returns_copy(self):
+        module = get_config().eval_as_module()
+        module.param_list.append(3)
+        module.calls.append(1)
+        module.param = 10
+        module.freqs *= 100
+        self.assertEqual(module.get_param(), 10)
+
+        module = get_config().eval_as_module()
+        self.assertEqual(module.param_list, [1, 2])
+        self.assertEqual(module.calls, [1])
+        self.assertEqual(module.param, 2)
+        self.assertEqual(module.freqs.tolist(), [1.0, 2.0])
+        self.assertEqual(module.get_param(), 2)
+
+    def test_eval_as_module_without_cache(self):
+        get_config().eval_as_module(cache=False)
+        info = config_file._compile.cache_info()  # type: ignore # pylint: disable=protected-access
+        self.assertEqual(info.currsize, 0)
+
+    def test_eval_key(self):
+        cfg = get_config()
+        self.assertEqual(cfg.eval_key("param_list"), [1, 2])
+        cfg.eval_key("param_list").append(3)
+        self.assertEqual(cfg.eval_key("param_list"), [1, 2])
+        self.assertIsNone(cfg.eval_key("not_a_key"))
+
+        cfg = get_config("data = bytearray(b'ab')")
+        cfg.eval_key("data").extend(b"cd")
+        self.assertEqual(cfg.eval_key("data"), bytearray(b"ab"))
+
+    def test_eviction(self):
+        config_file.set_eval_cache_size(modules=2)
+        for index in range(5):
+            module = get_config(f"param = {index}").eval_as_module()
+            self.assertEqual(module.param, index)
+        info = config_file._compile.cache_info()  # type: ignore # pylint: disable=protected-access
+        self.assertEqual(info.currsize, 2)
+
+    def test_disable_cache(self):
+        config_file.set_eval_cache_size(modules=0, expressions=0)
+        get_config().eval_as_module()
+        get_config().eval_as_module()
+        info = config_file._compile.cache_info()  # type: ignore # pylint: disable=protected-access
+        self.assertEqual((info.hits, info.currsize), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import shutil
+import unittest
+
+from labmate.acquisition import (
+    AcquisitionLoop,
+    AcquisitionManager,
+    AnalysisData,
+    container,
+    create_virtual_dataset,
+    load_key_from_files,
+)
+from labmate.acquisition.repack import repack_files
+from labmate.acquisition_notebook import AcquisitionAnalysisManager
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data", "container")
+
+
+class ContainerTest(unittest.TestCase):
+    """Test that the acquisitions are saved as groups of a container."""
+
+    experiment_name = "abc"
+
+    def setUp(self):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        self.aqm = AcquisitionManager(DATA_DIR, container_size=3)
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+
+    def create(self, x):
+        aq = self.aqm.create_acquisition("item")
+        aq["x"] = x
+        aq["loop"] = loop = AcquisitionLoop()
+        for i in loop(2):
+            loop.append(a=i * x)
+        aq.save_acquisition()
+        return aq
+
+    def test_saved_inside_containers(self):
+        acquisitions = [self.create(x) for x in range(4)]
+        files = os.listdir(os.path.join(DATA_DIR, "item"))
+        files = [f for f in files if not f.startswith(".")]
+        # 4 acquisitions in 2 containers and no other files (except hidden ones)
+        self.assertEqual(len(files), 2)
+        self.assertTrue(all(f.endswith(container.CONTAINER_SUFFIX) for f in files))
+
+        # same second, so the groups get different names
+        names = {os.path.basename(aq.filepath) for aq in acquisitions}
+        self.assertEqual(len(names), 4)
+
+    def test_open(self):
+        aq = self.create(2)
+        ad = AnalysisData(aq.filepath)
+        self.assertEqual(ad["x"], 2)
+        self.assertEqual(list(ad["loop"]["a"]), [0, 2])
+
+        h5_filepath, group = container.resolve(aq.filepath)
+        self.assertEqual(AnalysisData(container.join(h5_filepath, group))["x"], 2)
+
+        with self.assertRaises(ValueError):
+            AnalysisData(container.join(h5_filepath, "unknown"))
+
+    def test_analysis_manager(self):
+        aqm = AcquisitionAnalysisManager(
+            DATA_DIR, container_size=3, use_magic=False, shell=None
+        )
+        aqm.new_acquisition(self.experiment_name, cell="none")
+        aq = aqm.create_acquisition("item")
+        aq["x"] = 3
+        aq.save_acquisition()
+
+        ad = aqm.load_file(os.path.basename(aq.filepath))
+        self.assertEqual(ad["x"], 3)
+        self.assertIs(aqm.load_file(aq.filepath), ad)
+
+        aqm.analysis_cell(os.path.basename(aq.filepath), cell="none")
+        self.assertEqual(aqm.d["x"], 3)
+
+    def test_bulk(self):
+        for x in range(4):
+            self.create(x)
+        pattern = os.path.join(DATA_DIR, "item", "*.h5")
+        result = load_key_from_files(pattern, "x")
+        self.assertEqual(len(result.files), 4)
+        self.assertEqual(sorted(result.values), [0, 1, 2, 3])
+
+    def test_virtual_dataset(self):
+        for x in range(4):
+            self.create(x)
+        pattern = os.path.join(DATA_DIR, "item", "*.h5")
+        dataset = create_virtual_dataset(pattern, "loop/a", stack=True)
+        self.assertEqual(sorted(dataset[:, 1].tolist()), [0, 1, 2, 3])
+
+        ad = AnalysisData(self.create(5).filepath)
+        self.assertEqual(len(ad.get_series("x", stack=True)), 5)
+
+    def test_repack(self):
+        for x in range(4):
+            self.create(x)
+        pattern = os.path.join(DATA_DIR, "item", "*.h5")
+        results = repack_files(pattern, min_age=0, only_if_smaller=False)
+        self.assertEqual(len(results), 2)
+        self.assertTrue(all(result.skipped is None for result in results))
+        self.assertEqual(sorted(load_key_from_files(pattern, "x").values), [0, 1, 2, 3])
+
+    def test_not_used_by_default(self):
+        aqm = AcquisitionManager(DATA_DIR)
+        aqm.new_acquisition(self.experiment_name, cell="none")
+        aq = aqm.create_acquisition("other")
+        aq["x"] = 1
+        self.assertTrue(os.path.exists(aq.filepath + ".h5"))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import time
+import unittest
+
+from dh5 import DH5
+
+from labmate.acquisition import AcquisitionLoop, AcquisitionManager, h5_handles
+from labmate.acquisition.repack import repack_file
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data", "h5_handles")
+
+
+class H5HandlesTest(unittest.TestCase):
+    """Test that the acquisition file is kept open between the saves."""
+
+    experiment_name = "abc"
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR, keep_file_open=0.2)
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.filepath = self.aqm.aq.filepath
+
+    def tearDown(self):
+        h5_handles.disable(self.filepath)
+
+    def test_file_kept_open(self):
+        self.aqm["x"] = 1
+        self.aqm.aq["loop"] = loop = AcquisitionLoop()
+        for i in loop(3):
+            loop.append(i=i)
+        self.assertTrue(h5_handles.is_open(self.filepath))
+
+        sd = DH5(self.filepath)
+        self.assertEqual(sd["x"], 1)
+        self.assertEqual(list(sd["loop"]["i"]), [0, 1, 2])
+
+    def test_locked_while_open(self):
+        self.aqm["x"] = 1
+        lock_filepath = self.filepath + ".lock"
+        self.assertTrue(os.path.exists(lock_filepath))
+        result = repack_file(self.filepath + ".h5", min_age=0, only_if_smaller=False)
+        self.assertEqual(result.skipped, "locked")
+
+        h5_handles.close(self.filepath)
+        self.assertFalse(os.path.exists(lock_filepath))
+        result = repack_file(self.filepath + ".h5", min_age=0, only_if_smaller=False)
+        self.assertIsNone(result.skipped)
+        self.assertEqual(DH5(self.filepath)["x"], 1)
+
+    def test_closed_on_save_acquisition(self):
+        self.aqm["x"] = 1
+        self.aqm.save_acquisition(y=2)
+        self.assertFalse(h5_handles.is_open(self.filepath))
+        self.assertEqual(DH5(self.filepath)["y"], 2)
+
+    def test_closed_on_new_acquisition(self):
+        self.aqm["x"] = 1
+        self.aqm.new_acquisition("other", cell="none")
+        self.assertFalse(h5_handles.is_open(self.filepath))
+
+    def test_closed_when_idle(self):
+        self.aqm["x"] = 1
+        time.sleep(0.5)
+        self.assertFalse(h5_handles.is_open(self.filepath))
+        self.aqm["x"] = 2
+        self.assertTrue(h5_handles.is_open(self.filepath))
+        self.assertEqual(DH5(self.filepath)["x"], 2)
+
+    def test_not_kept_open_by_default(self):
+        self.aqm = AcquisitionManager(DATA_DIR)
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.aqm["x"] = 1
+        self.assertFalse(h5_handles.is_open(self.aqm.aq.filepath))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
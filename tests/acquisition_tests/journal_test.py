@@ -0,0 +1,201 @@
+import os
+import pickle
+import shutil
+import struct
+import time
+import unittest
+
+import numpy as np
+from dh5 import DH5
+
+from labmate.acquisition import (
+    AcquisitionLoop,
+    AcquisitionManager,
+    AnalysisData,
+    journal,
+)
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data", "journal")
+
+
+class _CreateFile:
+    """Object that creates a file when it is unpickled."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __reduce__(self):
+        return (open, (self.path, "w"))
+
+
+class JournalTest(unittest.TestCase):
+    """Test that the acquisition is saved through the journal."""
+
+    experiment_name = "abc"
+
+    def setUp(self):
+        self.aqm = AcquisitionManager(DATA_DIR, use_journal=True)
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.filepath = self.aqm.aq.filepath
+
+    def tearDown(self):
+        journal.disable(self.filepath)
+
+    def run_loop(self):
+        self.aqm.aq["loop"] = loop = AcquisitionLoop()
+        for i in loop(3):
+            for j in loop(2):
+                loop.append(a=10 * i + j)
+
+    def crash(self):
+        """Forget the journal without folding it, as if the kernel died."""
+        file_journal = journal.get_journal(self.filepath)
+        assert file_journal is not None
+        file_journal._timer.cancel()  # pylint: disable=protected-access
+        journal._JOURNALS.pop(file_journal.filepath)  # pylint: disable=protected-access
+
+    def test_saved_to_journal(self):
+        self.aqm["x"] = 1
+        self.run_loop()
+        self.assertTrue(os.path.exists(journal.journal_path(self.filepath)))
+
+        records = journal.read_records(self.filepath)
+        # every appended point is a record with only this point
+        self.assertEqual(records[-1][0], "items")
+        self.assertEqual(len(records[-1][-1]), 1)
+
+        ad = AnalysisData(self.filepath)
+        self.assertEqual(ad["x"], 1)
+        self.assertEqual(ad["loop"]["a"].tolist(), [[0, 1], [10, 11], [20, 21]])
+
+    def test_replayed_as_read(self):
+        self.aqm["x"] = [1, 2]
+        self.aqm["d"] = {"s": "abc", "l": ["a", 1]}
+        ad = AnalysisData(self.filepath)
+        self.assertEqual(ad["x"], [1, 2])
+        self.assertEqual(ad["d"]["l"], ["a", 1])
+        journal.fold(self.filepath)
+        self.assertEqual(AnalysisData(self.filepath)["x"], [1, 2])
+
+    def test_pulled_from_journal(self):
+        self.aqm["x"] = 1
+        ad = AnalysisData(self.filepath)
+        self.assertFalse(ad.pull_available())
+
+        self.aqm["y"] = 2
+        self.run_loop()
+        self.assertTrue(ad.pull_available())
+        ad.pull()
+        self.assertFalse(ad.pull_available())
+        self.assertEqual(ad["y"], 2)
+        self.assertEqual(ad["loop"]["a"].tolist(), [[0, 1], [10, 11], [20, 21]])
+        with self.assertRaises(KeyError):
+            ad["y"] = 3
+
+        journal.fold(self.filepath)
+        self.aqm["z"] = 3
+        self.assertTrue(os.path.exists(journal.journal_path(self.filepath)))
+        self.assertTrue(ad.pull_available())
+        ad.pull()
+        self.assertEqual(ad["z"], 3)
+        self.aqm["z"] = 4
+        ad.pull(incremental=False)
+        self.assertEqual((ad["x"], ad["y"], ad["z"]), (1, 2, 4))
+        self.assertEqual(ad["loop"]["a"].tolist(), [[0, 1], [10, 11], [20, 21]])
+
+    def test_folded_on_save_acquisition(self):
+        self.aqm["x"] = 1
+        self.run_loop()
+        self.aqm.save_acquisition(y=2)
+        self.assertFalse(os.path.exists(journal.journal_path(self.filepath)))
+
+        sd = DH5(self.filepath)
+        self.assertEqual(sd["x"], 1)
+        self.assertEqual(sd["y"], 2)
+        self.assertEqual(sd["loop"]["a"].tolist(), [[0, 1], [10, 11], [20, 21]])
+
+    def test_folded_in_background(self):
+        journal.enable(self.filepath, fold_interval=0.1)
+        journal.fold(self.filepath)
+        self.aqm["x"] = 1
+        time.sleep(0.5)
+        self.assertFalse(os.path.exists(journal.journal_path(self.filepath)))
+        self.assertEqual(DH5(self.filepath)["x"], 1)
+
+    def test_recover(self):
+        self.aqm["x"] = 1
+        self.run_loop()
+        self.crash()
+        # the last record was not written completely
+        with open(journal.journal_path(self.filepath), "ab") as file:
+            file.write(b"\x10\x00\x00\x00abc")
+
+        aqm = AcquisitionManager(DATA_DIR)
+        self.assertEqual(aqm.aq["x"], 1)
+        self.assertFalse(os.path.exists(journal.journal_path(self.filepath)))
+        sd = DH5(self.filepath)
+        self.assertEqual(sd["loop"]["a"].tolist(), [[0, 1], [10, 11], [20, 21]])
+
+    def test_discarded_on_overwrite(self):
+        self.aqm["x"] = 1
+        self.crash()
+        self.aqm.get_acquisition(replace=True)
+        records = journal.read_records(self.filepath)
+        self.assertNotIn("x", journal.top_keys(records))
+
+    def test_not_used_by_default(self):
+        self.aqm = AcquisitionManager(DATA_DIR)
+        self.aqm.new_acquisition("other", cell="none")
+        self.aqm["x"] = 1
+        self.assertFalse(os.path.exists(journal.journal_path(self.aqm.aq.filepath)))
+
+    def test_encoded_record(self):
+        record = journal.set_record(
+            {
+                "x": 1,
+                "y": np.float32(2.5),
+                "s": "abc",
+                "c": 1 + 2j,
+                "d": {"a": np.arange(3), "b": None},
+            }
+        )
+        decoded = journal.decode_record(journal.encode_record(record))
+        self.assertEqual(decoded[:2], ("set", None))
+        values = decoded[2]
+        self.assertEqual(values["x"], 1)
+        self.assertEqual(values["y"].dtype, np.float32)
+        self.assertEqual(values["s"], "abc")
+        self.assertEqual(values["c"], 1 + 2j)
+        self.assertEqual(values["d"]["a"].tolist(), [0, 1, 2])
+        self.assertIsNone(values["d"]["b"])
+
+        record = journal.items_record("a", np.zeros((2, 3)), [(0, slice(1, None))])
+        decoded = journal.decode_record(journal.encode_record(record))
+        self.assertEqual(decoded[:4], ("items", None, "a", (2, 3)))
+        self.assertEqual(decoded[4][0][0], (0, slice(1, None)))
+
+    def test_pickle_is_not_loaded(self):
+        self.aqm["x"] = 1
+        self.crash()
+        marker = os.path.join(DATA_DIR, "unpickled")
+        payload = pickle.dumps(_CreateFile(marker))
+        with open(journal.journal_path(self.filepath), "ab") as file:
+            file.write(struct.pack("<I", len(payload)) + payload)
+
+        records = journal.read_records(self.filepath)
+        self.assertIn("x", journal.top_keys(records))
+        self.assertFalse(os.path.exists(marker))
+        self.assertEqual(AnalysisData(self.filepath)["x"], 1)
+        self.assertFalse(os.path.exists(marker))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
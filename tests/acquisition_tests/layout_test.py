@@ -0,0 +1,143 @@
+import os
+import shutil
+import unittest
+
+from dh5 import DH5
+
+from labmate.acquisition import (
+    AcquisitionManager,
+    AnalysisData,
+    layout,
+    load_key_from_files,
+)
+from labmate.acquisition_notebook import AcquisitionAnalysisManager
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data", "layout")
+
+
+class LayoutTest(unittest.TestCase):
+    """Test the date-sharded layout of the experiment directories."""
+
+    experiment_name = "abc"
+
+    def setUp(self):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+
+    def create(self, file_layout: str, x: int = 1) -> str:
+        aqm = AcquisitionManager(DATA_DIR, layout=file_layout)
+        aqm.new_acquisition(self.experiment_name, cell="none")
+        aqm["x"] = x
+        return str(aqm.aq.filepath)
+
+    def make_old(self):
+        for root, _, files in os.walk(DATA_DIR):
+            for file in files:
+                os.utime(os.path.join(root, file), (0, 0))
+
+    def test_get_shard(self):
+        name = "2024_01_31__12_00_00__abc"
+        self.assertEqual(layout.get_shard(name, "flat"), "")
+        self.assertEqual(layout.get_shard(name, "date"), "2024_01_31")
+        self.assertEqual(layout.get_shard(name, "month"), "2024_01")
+        self.assertEqual(layout.get_shard("init_analyse.py", "date"), "")
+        with self.assertRaises(ValueError):
+            layout.get_shard(name, "unknown")
+
+    def test_saved_in_shard(self):
+        filepath = self.create("date")
+        name = os.path.basename(filepath)
+        self.assertEqual(
+            filepath,
+            os.path.join(DATA_DIR, self.experiment_name, name[:10], name),
+        )
+        self.assertTrue(os.path.exists(filepath + ".h5"))
+
+    def test_bulk_glob_matches_shards(self):
+        filepaths = [
+            self.create(file_layout, x=x)
+            for x, file_layout in enumerate(("flat", "date", "month"))
+        ]
+        pattern = os.path.join(DATA_DIR, self.experiment_name, "*.h5")
+        result = load_key_from_files(pattern, "x")
+        self.assertEqual(list(result.values), [0, 1, 2])
+        self.assertEqual(list(result.files), [f + ".h5" for f in filepaths])
+
+        series = AnalysisData(filepaths[1]).get_series("x", stack=True)
+        self.assertEqual(series[:].tolist(), [0, 1, 2])
+
+    def test_load_file(self):
+        filepath = self.create("date", x=2)
+        name = os.path.basename(filepath)
+        for file_layout in ("date", "flat"):
+            aqm = AcquisitionAnalysisManager(
+                DATA_DIR, layout=file_layout, use_magic=False, shell=None
+            )
+            self.assertEqual(aqm.load_file(name)["x"], 2)
+            aqm.analysis_cell(name, cell="none")
+            self.assertEqual(aqm.d["x"], 2)
+
+    def test_migrate(self):
+        filepaths = [self.create("flat", x) for x in range(3)]
+        self.make_old()
+        dry_run = layout.migrate(DATA_DIR, "month", dry_run=True)
+        self.assertEqual(len(dry_run), 3)
+        self.assertTrue(all(os.path.exists(f + ".h5") for f in filepaths))
+
+        results = layout.migrate(DATA_DIR, "month", max_workers=2)
+        self.assertEqual([r.skipped for r in results], [None] * 3)
+        aqm = AcquisitionAnalysisManager(
+            DATA_DIR, layout="month", use_magic=False, shell=None
+        )
+        for x, filepath in enumerate(filepaths):
+            self.assertFalse(os.path.exists(filepath + ".h5"))
+            self.assertEqual(aqm.load_file(os.path.basename(filepath))["x"], x)
+
+        # back to flat layout: the emptied shards are removed
+        self.make_old()
+        layout.migrate(DATA_DIR, "flat")
+        self.assertTrue(all(os.path.exists(f + ".h5") for f in filepaths))
+        experiment_path = os.path.join(DATA_DIR, self.experiment_name)
+        self.assertEqual(
+            [f for f in os.scandir(experiment_path) if f.is_dir()],
+            [],
+        )
+
+    def test_migrate_keeps_configs(self):
+        aqm = AcquisitionManager(DATA_DIR, use_config_store=True)
+        aqm.set_config_file(os.path.join(TEST_DIR, "data", "line_config.txt"))
+        aqm.new_acquisition(self.experiment_name, cell="none")
+        aqm["x"] = 1
+        filepath = str(aqm.aq.filepath)
+
+        results = layout.migrate(DATA_DIR, "date", min_age=0)
+        self.assertEqual([r.skipped for r in results], [None])
+        moved = layout.get_filepath(
+            os.path.dirname(filepath), os.path.basename(filepath), "date"
+        )
+        self.assertEqual(
+            DH5(moved)["configs_store"], os.path.join("..", "..", ".config_store")
+        )
+        configs = AnalysisData(moved).get_configs()
+        self.assertEqual(configs["line_config.txt"], "this is a config file")
+        self.assertFalse(
+            os.path.exists(os.path.join(os.path.dirname(moved), ".config_store"))
+        )
+
+    def test_migrate_skips_recent(self):
+        filepath = self.create("flat")
+        results = layout.migrate(DATA_DIR, "date")
+        self.assertEqual([r.skipped for r in results], ["modified recently"])
+        self.assertTrue(os.path.exists(filepath + ".h5"))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+from dh5 import DH5
+
+from labmate.acquisition.repack import repack_file, repack_files
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data", "repack")
+
+
+class RepackTest(unittest.TestCase):
+    """Test repacking of h5 files."""
+
+    def create_file(self, name: str = "data") -> str:
+        filepath = os.path.join(DATA_DIR, name + ".h5")
+        data = DH5(filepath, save_on_edit=True, overwrite=True)
+        for index in range(10):
+            data["x"] = np.arange(1000) * index
+        data["y"] = {"a": np.linspace(0, 1, 1000), "b": "text"}
+        data["nan"] = np.array([1.0, np.nan])
+        return filepath
+
+    def setUp(self):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        self.filepath = self.create_file()
+
+    def assert_content(self, filepath):
+        data = DH5(filepath)
+        self.assertEqual(data["x"].tolist(), (np.arange(1000) * 9).tolist())
+        self.assertEqual(data["y"]["a"].tolist(), np.linspace(0, 1, 1000).tolist())
+        self.assertEqual(data["y"]["b"], "text")
+
+    def test_repack(self):
+        result = repack_file(self.filepath, min_age=0)
+
+        self.assertIsNone(result.skipped)
+        self.assertLess(result.size_after, result.size_before)
+        self.assertEqual(os.path.getsize(self.filepath), result.size_after)
+        self.assert_content(self.filepath)
+        self.assertEqual(
+            [file for file in os.listdir(DATA_DIR) if file.endswith(".tmp")], []
+        )
+
+    def test_repack_compression(self):
+        size = repack_file(self.filepath, min_age=0).size_after
+        result = repack_file(self.filepath, compression="gzip", min_age=0)
+
+        self.assertIsNone(result.skipped)
+        self.assertLess(result.size_after, size)
+        self.assert_content(self.filepath)
+
+    def test_skip_recent(self):
+        result = repack_file(self.filepath)
+        self.assertEqual(result.skipped, "modified recently")
+
+    def test_skip_locked(self):
+        lock_file = os.path.splitext(self.filepath)[0] + ".lock"
+        with open(lock_file, "w", encoding="utf-8"):
+            pass
+        try:
+            result = repack_file(self.filepath, min_age=0)
+        finally:
+            os.remove(lock_file)
+        self.assertEqual(result.skipped, "locked")
+        self.assertEqual(os.path.getsize(self.filepath), result.size_before)
+
+    def test_repack_directory(self):
+        self.create_file("data2")
+        os.makedirs(os.path.join(DATA_DIR, ".virtual"), exist_ok=True)
+        shutil.copyfile(self.filepath, os.path.join(DATA_DIR, ".virtual", "x.h5"))
+
+        results = repack_files(DATA_DIR, min_age=0, max_workers=2)
+
+        self.assertEqual(
+            [os.path.basename(result.file) for result in results],
+            ["data.h5", "data2.h5"],
+        )
+        self.assertTrue(all(result.skipped is None for result in results))
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
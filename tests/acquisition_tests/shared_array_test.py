@@ -0,0 +1,202 @@
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import unittest
+
+import numpy as np
+from dh5 import DH5
+
+from labmate.acquisition import (
+    AcquisitionLoop,
+    AcquisitionManager,
+    SharedArray,
+    journal,
+    shared_array,
+    writer,
+)
+from labmate.logger import logger
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data", "shared_array")
+ADDRESS = os.path.join(DATA_DIR, "writer.sock")
+
+
+def produce(queue, count):
+    """Producer process: sends the arrays as handles and exits."""
+    for i in range(count):
+        handle = SharedArray.create((2, 3), dtype=np.int16)
+        handle.asarray()[...] = i
+        handle.close()
+        queue.put(handle)
+
+
+def is_released(handle: SharedArray) -> bool:
+    try:
+        shared_array._open_memory(handle.name)  # pylint: disable=W0212
+    except FileNotFoundError:
+        return True
+    return False
+
+
+class SharedArrayTest(unittest.TestCase):
+    """Test that the arrays are passed through the shared memory."""
+
+    experiment_name = "abc"
+
+    def setUp(self):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        self.aqm = AcquisitionManager(DATA_DIR)
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.filepath = str(self.aqm.aq.filepath)
+
+    def test_handle(self):
+        handle = SharedArray.from_array(np.arange(6.0).reshape(2, 3))
+        received = pickle.loads(pickle.dumps(handle))
+        self.assertEqual(received.name, handle.name)
+        array = received.asarray()
+        self.assertEqual(array.tolist(), [[0, 1, 2], [3, 4, 5]])
+
+        array[0, 0] = 10
+        self.assertEqual(handle.asarray()[0, 0], 10)
+
+        received.release()
+        self.assertTrue(is_released(handle))
+        # Still mapped by this process
+        self.assertEqual(array[0, 0], 10)
+        received.release()
+
+    def test_released_handle_not_sent(self):
+        handle = SharedArray.from_array(np.arange(4))
+        self.assertIs(journal.set_record({"a": handle}, share=True)[2]["a"], handle)
+        handle.release()
+        # Copied from the memory still mapped by this process
+        value = journal.set_record({"a": handle}, share=True)[2]["a"]
+        self.assertNotIsInstance(value, SharedArray)
+        self.assertEqual(value.tolist(), [0, 1, 2, 3])
+
+    def test_save_acquisition(self):
+        handle = SharedArray.from_array(np.arange(4))
+        self.aqm.save_acquisition(trace=handle)
+        self.assertTrue(is_released(handle))
+        self.assertEqual(DH5(self.filepath)["trace"].tolist(), [0, 1, 2, 3])
+        self.assertEqual(self.aqm.aq["trace"].tolist(), [0, 1, 2, 3])
+
+    def test_loop(self):
+        self.aqm.aq["loop"] = loop = AcquisitionLoop()
+        handles = [SharedArray.from_array(np.full(3, i)) for i in range(2)]
+        for i in loop(2):
+            loop.append(trace=handles[i])
+        self.assertTrue(all(is_released(handle) for handle in handles))
+        self.aqm.save_acquisition()
+        self.assertEqual(
+            DH5(self.filepath)["loop"]["trace"].tolist(), [[0] * 3, [1] * 3]
+        )
+
+    def test_from_other_process(self):
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        process = context.Process(target=produce, args=(queue, 3))
+        process.start()
+        handles = [queue.get(timeout=30) for _ in range(3)]
+        process.join(timeout=30)
+
+        self.aqm.aq["loop"] = loop = AcquisitionLoop()
+        for i in loop(3):
+            loop.append(trace=handles[i])
+        self.aqm.save_acquisition()
+        trace = DH5(self.filepath)["loop"]["trace"]
+        self.assertEqual(trace[:, 0, 0].tolist(), [0, 1, 2])
+        self.assertTrue(all(is_released(handle) for handle in handles))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+@unittest.skipIf(sys.platform == "win32", "Unix socket is used in the tests")
+class SharedArrayWriterTest(unittest.TestCase):
+    """Test that the writer saves the arrays directly from the shared memory."""
+
+    experiment_name = "abc"
+
+    def setUp(self):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        # Writer that never flushes by itself, so the tests see when data is written
+        self.server = writer.WriterServer(ADDRESS, flush_interval=3600).start()
+        self.aqm = AcquisitionManager(DATA_DIR, use_writer=ADDRESS)
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.filepath = str(self.aqm.aq.filepath)
+
+    def tearDown(self):
+        writer.disable(self.filepath)
+        writer.stop_server(ADDRESS)
+
+    def test_save_acquisition(self):
+        handle = SharedArray.from_array(np.arange(4))
+        self.aqm["trace"] = handle
+        self.assertFalse(is_released(handle))
+
+        self.aqm.save_acquisition()
+        self.assertTrue(is_released(handle))
+        self.assertEqual(DH5(self.filepath)["trace"].tolist(), [0, 1, 2, 3])
+        self.assertEqual(self.aqm.aq["trace"].tolist(), [0, 1, 2, 3])
+
+    def test_loop(self):
+        self.aqm.aq["loop"] = loop = AcquisitionLoop()
+        handles = [SharedArray.from_array(np.full(3, i)) for i in range(3)]
+        for i in loop(3):
+            loop.append(trace=handles[i])
+        # Sent as handles, released by the writer once saved
+        self.assertFalse(any(is_released(handle) for handle in handles))
+
+        self.aqm.save_acquisition()
+        self.assertTrue(all(is_released(handle) for handle in handles))
+        trace = DH5(self.filepath)["loop"]["trace"]
+        self.assertEqual(trace.tolist(), [[0] * 3, [1] * 3, [2] * 3])
+
+    def test_transferred_once_confirmed(self):
+        handle = SharedArray.from_array(np.arange(4))
+        self.aqm["trace"] = handle
+        self.assertTrue(handle.sent)
+        self.assertFalse(handle.transferred)
+        writer.flush(self.filepath)
+        self.assertTrue(handle.transferred)
+        self.assertTrue(is_released(handle))
+
+    def test_released_by_kernel_without_writer(self):
+        handle = SharedArray.from_array(np.arange(4))
+        self.aqm["trace"] = handle
+        # The writer stops without saving the record
+        self.server._pending.clear()  # pylint: disable=protected-access
+        self.server.stop()
+        with self.assertLogs(logger, level="WARNING"):
+            self.aqm.save_acquisition()
+        self.assertFalse(handle.transferred)
+        self.assertTrue(is_released(handle))
+        self.assertEqual(DH5(self.filepath)["trace"].tolist(), [0, 1, 2, 3])
+
+    def test_released_before_saving(self):
+        handle = SharedArray.from_array(np.arange(4))
+        self.aqm["trace"] = handle
+        handle.release()
+        with self.assertLogs(logger, level="WARNING"):
+            self.aqm.save_acquisition(x=1)
+        sd = DH5(self.filepath)
+        self.assertEqual(sd["x"], 1)
+        self.assertNotIn("trace", sd)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
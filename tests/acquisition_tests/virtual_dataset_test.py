@@ -0,0 +1,127 @@
+import os
+import shutil
+import unittest
+
+import numpy as np
+
+from labmate.acquisition import (
+    AcquisitionLoop,
+    AcquisitionManager,
+    AnalysisData,
+    VirtualDataset,
+    create_virtual_dataset,
+)
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data")
+
+
+class VirtualDatasetTest(unittest.TestCase):
+    """Test concatenation of a key across many acquisitions."""
+
+    experiment_name = "virtual"
+
+    @classmethod
+    def setUpClass(cls):
+        aqm = AcquisitionManager(DATA_DIR)
+        cls.files = []
+        for value in range(3):
+            aq = aqm.create_acquisition(cls.experiment_name, cell="none")
+            loop = AcquisitionLoop()
+            for i in loop(2):
+                loop.append(i=i + value)
+            aq.update(
+                x=np.arange(5) + 10 * value,
+                y=np.ones((value + 1, 2)) * value,
+                loop=loop,
+            )
+            cls.files.append(aq.filepath + ".h5")
+
+    def test_concatenate(self):
+        data = create_virtual_dataset(self.files, "x")
+        self.assertEqual(data.shape, (15,))
+        self.assertEqual(len(data), 15)
+        self.assertEqual(data[4:7].tolist(), [4, 10, 11])
+        self.assertEqual(
+            np.asarray(data).tolist(),
+            np.concatenate([np.arange(5) + 10 * v for v in range(3)]).tolist(),
+        )
+        self.assertEqual(data.source_of(6), os.path.abspath(self.files[1]))
+        self.assertEqual(data.source_of(-1), os.path.abspath(self.files[2]))
+
+    def test_concatenate_different_length(self):
+        data = create_virtual_dataset(self.files, "y")
+        self.assertEqual(data.shape, (6, 2))
+        self.assertEqual(data[:, 0].tolist(), [0, 1, 1, 2, 2, 2])
+
+    def test_stack(self):
+        data = create_virtual_dataset(self.files, "x", stack=True)
+        self.assertEqual(data.shape, (3, 5))
+        self.assertEqual(data[2, 1], 21)
+
+        with self.assertRaises(ValueError):
+            create_virtual_dataset(self.files, "y", stack=True)
+
+    def test_loop_key(self):
+        data = create_virtual_dataset(self.files, "loop/i")
+        self.assertEqual(data[:].tolist(), [0, 1, 1, 2, 2, 3])
+
+    def test_no_copy(self):
+        data = create_virtual_dataset(self.files, "x")
+        self.assertIn(os.sep + ".virtual" + os.sep, data.filepath)
+        reopened = VirtualDataset(data.filepath)
+        self.assertEqual(reopened.sources, tuple(map(os.path.abspath, self.files)))
+        self.assertEqual(reopened.key, "x")
+
+    def test_wrong_key(self):
+        with self.assertRaises(ValueError):
+            create_virtual_dataset(self.files, "not_a_key")
+        with self.assertRaises(ValueError):
+            create_virtual_dataset([], "x")
+
+    def test_moved_with_sources(self):
+        moved_dir = os.path.join(DATA_DIR, "moved")
+        os.makedirs(os.path.join(moved_dir, "data"))
+        files = []
+        for file in self.files:
+            files.append(os.path.join(moved_dir, "data", os.path.basename(file)))
+            shutil.copy(file, files[-1])
+        data = create_virtual_dataset(files, "x")
+
+        shutil.move(moved_dir, moved_dir + "_2")
+        moved = VirtualDataset(data.filepath.replace(moved_dir, moved_dir + "_2"))
+        self.assertEqual(moved[4:7].tolist(), [4, 10, 11])
+        self.assertEqual(
+            moved.source_of(-1), files[-1].replace(moved_dir, moved_dir + "_2")
+        )
+
+    def test_missing_source(self):
+        missing_dir = os.path.join(DATA_DIR, "missing")
+        os.makedirs(missing_dir)
+        files = []
+        for file in self.files:
+            files.append(os.path.join(missing_dir, os.path.basename(file)))
+            shutil.copy(file, files[-1])
+        data = create_virtual_dataset(files, "x")
+
+        os.remove(files[1])
+        with self.assertRaises(FileNotFoundError):
+            data[:3]  # pylint: disable=pointless-statement
+        with self.assertRaises(FileNotFoundError):
+            VirtualDataset(data.filepath)
+
+    def test_analysis_data(self):
+        data = AnalysisData(self.files[0])
+        series = data.get_series("x")
+        self.assertEqual(series.shape, (15,))
+        self.assertEqual(series[-1], 24)
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
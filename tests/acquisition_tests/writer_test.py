@@ -0,0 +1,173 @@
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+from dh5 import DH5
+
+from labmate.acquisition import (
+    AcquisitionLoop,
+    AcquisitionManager,
+    AnalysisData,
+    writer,
+)
+from labmate.logger import logger
+
+TEST_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.join(TEST_DIR, "tmp_test_data", "writer")
+ADDRESS = os.path.join(DATA_DIR, "writer.sock")
+
+KERNEL_CODE = """
+import os
+from labmate.acquisition import AcquisitionLoop, AcquisitionManager
+aqm = AcquisitionManager({data_dir!r}, use_writer={address!r})
+aqm.new_acquisition("killed", cell="none")
+aqm["x"] = 5
+aqm["loop"] = loop = AcquisitionLoop()
+for i in loop(3):
+    loop.append(a=i)
+print(aqm.aq.filepath, flush=True)
+os._exit(1)
+"""
+
+
+@unittest.skipIf(sys.platform == "win32", "Unix socket is used in the tests")
+class WriterTest(unittest.TestCase):
+    """Test that the acquisition is saved by the writer process."""
+
+    experiment_name = "abc"
+
+    def setUp(self):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        # Writer that never flushes by itself, so the tests see when data is written
+        self.server = writer.WriterServer(ADDRESS, flush_interval=3600).start()
+        self.aqm = AcquisitionManager(DATA_DIR, use_writer=ADDRESS)
+        self.aqm.new_acquisition(self.experiment_name, cell="none")
+        self.filepath = str(self.aqm.aq.filepath)
+
+    def tearDown(self):
+        writer.disable(self.filepath)
+        writer.stop_server(ADDRESS)
+
+    def run_loop(self):
+        self.aqm.aq["loop"] = loop = AcquisitionLoop()
+        for i in loop(3):
+            for j in loop(2):
+                loop.append(a=10 * i + j)
+
+    def test_saved_by_writer(self):
+        self.aqm["x"] = 1
+        self.run_loop()
+        self.assertFalse(os.path.exists(self.filepath + ".h5"))
+
+        self.aqm.save_acquisition(y=2)
+        sd = DH5(self.filepath)
+        self.assertEqual(sd["x"], 1)
+        self.assertEqual(sd["y"], 2)
+        self.assertEqual(sd["loop"]["a"].tolist(), [[0, 1], [10, 11], [20, 21]])
+
+    def test_analysis_data(self):
+        self.aqm["x"] = 1
+        self.run_loop()
+        ad = AnalysisData(self.filepath)
+        self.assertEqual(ad["x"], 1)
+        self.assertEqual(ad["loop"]["a"].tolist(), [[0, 1], [10, 11], [20, 21]])
+
+    def test_saved_after_kernel_died(self):
+        code = KERNEL_CODE.format(data_dir=DATA_DIR, address=ADDRESS)
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=False
+        )
+        self.assertEqual(result.returncode, 1, result.stderr)
+        filepath = result.stdout.strip()
+
+        self.server.flush()
+        sd = DH5(filepath)
+        self.assertEqual(sd["x"], 5)
+        self.assertEqual(sd["loop"]["a"].tolist(), [0, 1, 2])
+
+    def crash_server(self):
+        """Stop the writer without writing the records it received."""
+        self.server._pending.clear()  # pylint: disable=protected-access
+        self.server.stop()
+
+    def test_sent_again_to_restarted_writer(self):
+        self.aqm["x"] = 1
+        self.run_loop()
+        self.crash_server()
+        self.server = writer.WriterServer(ADDRESS, flush_interval=3600).start()
+
+        self.aqm.save_acquisition(y=2)
+        sd = DH5(self.filepath)
+        self.assertEqual((sd["x"], sd["y"]), (1, 2))
+        self.assertEqual(sd["loop"]["a"].tolist(), [[0, 1], [10, 11], [20, 21]])
+
+    def test_saved_by_kernel_without_writer(self):
+        self.aqm["x"] = 1
+        self.crash_server()
+        with self.assertLogs(logger, level="WARNING"):
+            self.run_loop()
+            self.aqm.save_acquisition(y=2)
+        sd = DH5(self.filepath)
+        self.assertEqual((sd["x"], sd["y"]), (1, 2))
+        self.assertEqual(sd["loop"]["a"].tolist(), [[0, 1], [10, 11], [20, 21]])
+
+    def test_confirmed_records_forgotten(self):
+        file_writer = writer.get_writer(self.filepath)
+        assert file_writer is not None
+        writer.flush(self.filepath)
+        self.aqm["x"] = 1
+        self.assertEqual(len(file_writer._unconfirmed), 1)  # pylint: disable=W0212
+        writer.flush(self.filepath)
+        self.assertEqual(file_writer._unconfirmed, [])  # pylint: disable=W0212
+
+    def test_authkey_readable_only_by_user(self):
+        home = os.path.join(DATA_DIR, "home")
+        writer._get_authkey.cache_clear()  # pylint: disable=protected-access
+        try:
+            with mock.patch.dict(os.environ, {"HOME": home}):
+                os.environ.pop("LABMATE_WRITER_AUTHKEY", None)
+                key = writer._get_authkey()  # pylint: disable=protected-access
+        finally:
+            writer._get_authkey.cache_clear()  # pylint: disable=protected-access
+        path = os.path.join(home, ".labmate", "writer.key")
+        with open(path, encoding="utf-8") as file:
+            self.assertEqual(file.read().encode(), key)
+        self.assertEqual(len(key), 64)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        self.assertEqual(os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
+
+    def test_default_address_private(self):
+        directory = os.path.dirname(writer.default_address())
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+
+    def test_not_used_by_default(self):
+        aqm = AcquisitionManager(DATA_DIR)
+        aqm.new_acquisition("other", cell="none")
+        self.assertFalse(writer.is_enabled(aqm.aq.filepath))
+        self.assertTrue(os.path.exists(aqm.aq.filepath + ".h5"))
+
+    def test_writer_process(self):
+        address = os.path.join(DATA_DIR, "process.sock")
+        writer.start_server(address)
+        try:
+            self.assertTrue(writer.is_running(address))
+        finally:
+            writer.stop_server(address)
+        for _ in range(100):
+            if not writer.is_running(address):
+                break
+        self.assertFalse(writer.is_running(address))
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove tmp_test_data directory ones all test finished."""
+        if os.path.exists(DATA_DIR):
+            shutil.rmtree(DATA_DIR)
+        return super().tearDownClass()
+
+
+if __name__ == "__main__":
+    unittest.main()
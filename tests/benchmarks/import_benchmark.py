@@ -0,0 +1,64 @@
+"""Benchmark of the cold import time of labmate.
+
+Every import is done in a new interpreter, so nothing is cached in `sys.modules`.
+Run with `python -m tests.benchmarks.import_benchmark`.
+"""
+
+import subprocess
+import sys
+from typing import List, Tuple
+
+MODULES = ("dh5", "labmate.acquisition", "labmate.acquisition_notebook")
+
+# Modules that are needed only inside a notebook or for rarely used features
+OPTIONAL_MODULES = (
+    "IPython",
+    "ipywidgets",
+    "matplotlib",
+    "multiprocessing",
+    "labmate.display",
+    "labmate.parsing",
+    "labmate.acquisition.bulk",
+    "labmate.acquisition.virtual_dataset",
+    "labmate.acquisition.h5_handles",
+    "labmate.acquisition.writer",
+    "labmate.acquisition.container",
+)
+
+_CODE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(",".join(m for m in {optional!r} if m in sys.modules))
+"""
+
+
+def cold_import(module: str) -> Tuple[float, List[str]]:
+    """Return the import time in ms and the optional modules that were imported."""
+    output = subprocess.run(
+        [sys.executable, "-c", _CODE.format(module=module, optional=OPTIONAL_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split("\n")
+    return float(output[0]) * 1e3, [m for m in output[1].split(",") if m]
+
+
+def best_time(module: str, repeat: int = 7) -> Tuple[float, List[str]]:
+    """Return the best cold import time in ms out of `repeat` interpreters."""
+    results = [cold_import(module) for _ in range(repeat)]
+    return min(result[0] for result in results), results[0][1]
+
+
+def main():
+    for module in MODULES:
+        time_ms, imported = best_time(module)
+        print(
+            f"{module:>30}: {time_ms:8.2f} ms | "
+            f"optional modules imported: {', '.join(imported) or 'none'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark of parse_str on large generated config files.
+
+Run with `python tests/benchmarks/parse_str_benchmark.py`
+or `python -m tests.benchmarks.parse_str_benchmark`.
+
+All the timings are without the cache of `parse_assignments`. On a cold input the single
+pass is about as fast as the line by line implementation: most of the time is spent per
+assignment (stripping, ParsedValue objects) and not in splitting the lines. The gain
+comes from the cache, when the same config is parsed again.
+"""
+
+import os
+import random
+import sys
+import timeit
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from labmate.parsing import parse_assignments, parse_str  # noqa: E402
+from tests.parsing_tests.parse_str_test import parse_str_line_by_line  # noqa: E402
+
+
+def generate_config(lines_number: int = 5000, seed: int = 0) -> str:
+    """Generate a config that looks like an instrument config."""
+    rnd = random.Random(seed)
+    lines = ["# generated config", ""]
+    index = 0
+    while len(lines) < lines_number:
+        index += 1
+        choice = rnd.random()
+        if choice < 0.5:
+            lines.append(f"param_{index} = {rnd.random() * 1e3:.4f}  # comment")
+        elif choice < 0.65:
+            lines.append(f"int_{index} = {rnd.randint(-1000, 1000)}")
+        elif choice < 0.75:
+            lines.append(f"str_{index} = 'value_{index}'")
+        elif choice < 0.8:
+            lines.append(f"link_{index} = param_{index - 1} * 2  # value: 12.5")
+        elif choice < 0.85:
+            lines.extend(
+                [f"dict_{index} = {{", f"    'a': {index},", "    'b': [1, 2],", "}"]
+            )
+        elif choice < 0.9:
+            lines.append(f"list_{index} = [1, 2, {index}]")
+        elif choice < 0.95:
+            lines.append("")
+        else:
+            lines.append(f"# comment line {index}")
+    return "\n".join(lines)
+
+
+def best_time(func, number: int = 10, repeat: int = 5) -> float:
+    """Return the best time of one call in ms."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e3
+
+
+def main():
+    # The cache of parse_assignments is cleared before every call, so only the parsing
+    # itself is measured and not a lookup of the same content
+    def parse_cold(text: str):
+        parse_assignments.cache_clear()
+        return parse_str(text)
+
+    def assignments_cold(text: str):
+        parse_assignments.cache_clear()
+        return parse_assignments(text)
+
+    for lines_number in (500, 5000, 50000):
+        text = generate_config(lines_number)
+
+        reference = best_time(lambda: parse_str_line_by_line(text))  # noqa: B023
+        cold = best_time(lambda: parse_cold(text))  # noqa: B023
+        assignments = best_time(lambda: assignments_cold(text))  # noqa: B023
+        cached = best_time(lambda: parse_str(text))  # noqa: B023
+
+        print(
+            f"{lines_number:>6} lines: line by line {reference:8.2f} ms | "
+            f"parse_str {cold:8.2f} ms (x{reference / cold:.1f}) | "
+            f"parse_assignments {assignments:8.2f} ms (x{reference / assignments:.1f}) | "
+            f"cached parse_str {cached:8.2f} ms (x{reference / cached:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
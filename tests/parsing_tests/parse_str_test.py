@@ -0,0 +1,112 @@
+import random
+import unittest
+
+from labmate.parsing import BracketsScore, ParsedValue, parse_assignments, parse_str
+
+
+def parse_str_line_by_line(file: str):
+    """Reference implementation: parse_str before the single pass parser."""
+    parsed_values = {}
+    brackets = BracketsScore()
+    param, value = "", ""
+    for line in file.split("\n"):
+        if not brackets.is_zero():
+            value += f"{line.split('#')[0].strip()}\n"  # type: ignore
+        elif len(line) == 0 or not line[0].isalpha() or "=" not in line:
+            continue
+        else:
+            param, value = line.split("=")[:2]
+
+        brackets.update_from_str(line)
+        if not brackets.is_zero():
+            continue
+
+        if "# value: " in value:
+            value_eval = value[value.rfind("# value: ") + 9 :]
+        else:
+            value_eval = None
+
+        value = value.split("#")[0].strip()
+
+        if value_eval is None:
+            value_eval = value
+
+        parsed_values[param.strip()] = ParsedValue(value, value_eval)
+
+    return parsed_values
+
+
+CONFIG = """\
+int = 123
+float = -12.5  # comment
+link = int  # value: 123
+multi = {
+    'a': 1,  # comment
+    'b': [1, 2],
+}
+multi_value = [  # value: [123]
+    int,
+]
+kwargs = dict(x=1)
+    indented = 1
+# commented = 1
+1digit = 1
+text = 'a = b'
+after = 1
+"""
+
+
+class ParseStrTest(unittest.TestCase):
+    """Test parse_str and parse_assignments."""
+
+    def assert_same_as_reference(self, text: str):
+        expected = parse_str_line_by_line(text)
+        result = parse_str(text)
+        self.assertListEqual(list(result), list(expected))
+        for key, value in expected.items():
+            self.assertEqual(tuple(result[key]), tuple(value), msg=key)
+
+    def test_values(self):
+        data = parse_str(CONFIG)
+        self.assertEqual(data["int"], 123)
+        self.assertEqual(data["float"], -12.5)
+        self.assertEqual(data["link"].original, "int")
+        self.assertEqual(data["link"], 123)
+        self.assertEqual(data["multi"], "{'a': 1,\n'b': [1, 2],\n}")
+        self.assertNotIn("indented", data)
+        self.assertNotIn("commented", data)
+        self.assertNotIn("1digit", data)
+
+    def test_same_as_reference(self):
+        self.assert_same_as_reference(CONFIG)
+
+    def test_unclosed_brackets(self):
+        self.assert_same_as_reference("a = 1\nb = (1,\nc = 2\n")
+        self.assert_same_as_reference("a = 1\nb = )\nc = 2\n")
+
+    def test_windows_line_endings(self):
+        self.assert_same_as_reference(CONFIG.replace("\n", "\r\n"))
+
+    def test_random_configs(self):
+        rnd = random.Random(0)
+        parts = ["a", "b1", "c_", " ", "=", "#", "# value: ", "(", ")", "[", "]"]
+        parts += ["{", "}", "\n", "\n", "1", "-2.5", "'s'", "\t", "é", "²"]
+        for _ in range(300):
+            text = "".join(rnd.choice(parts) for _ in range(rnd.randint(0, 60)))
+            self.assert_same_as_reference(text)
+
+    def test_lines(self):
+        lines = {
+            assignment.name: (assignment.start_line, assignment.end_line)
+            for assignment in parse_assignments(CONFIG)
+        }
+        self.assertEqual(lines["int"], (1, 1))
+        self.assertEqual(lines["link"], (3, 3))
+        self.assertEqual(lines["multi"], (4, 7))
+        self.assertEqual(lines["multi_value"], (8, 10))
+        self.assertEqual(lines["kwargs"], (11, 11))
+        self.assertEqual(lines["after"], (16, 16))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import types
+import unittest
+
+from labmate.parsing import parse_str
+from labmate.parsing.saving import append_values_from_module_to_file
+
+CONFIG = """\
+param1 = 123
+param2 = param1
+name = 'abc'
+name_link = name
+param_dict = {
+    'a': param1,
+}
+param_list = [
+    1,
+    2,
+]
+"""
+
+
+def config_module():
+    module = types.ModuleType("config")
+    exec(CONFIG, module.__dict__)  # pylint: disable=W0122 # noqa: DUO105
+    return module
+
+
+class AppendValuesTest(unittest.TestCase):
+    """Test append_values_from_module_to_file."""
+
+    def setUp(self):
+        self.body = append_values_from_module_to_file(CONFIG, config_module())
+        self.lines = self.body.split("\n")
+
+    def test_single_line(self):
+        self.assertEqual(self.lines[0], "param1 = 123")
+        self.assertEqual(self.lines[1], "param2 = param1  # value: 123")
+        self.assertEqual(self.lines[2], "name = 'abc'")
+        self.assertEqual(self.lines[3], "name_link = name  # value: abc")
+
+    def test_multiline(self):
+        self.assertEqual(self.lines[6], "}  # value: {'a': 123}")
+        self.assertEqual(self.lines[10], "]")
+
+    def test_large_values_not_annotated(self):
+        module = types.ModuleType("config")
+        module.__dict__.update(long_list=list(range(1000)), long_str=["a" * 300])
+        body = "long_list = list(range(1000))\nlong_str = ['a' * 300]\n"
+        self.assertEqual(append_values_from_module_to_file(body, module), body)
+
+    def test_same_number_of_lines(self):
+        self.assertEqual(len(self.lines), len(CONFIG.split("\n")))
+
+    def test_parse_annotated(self):
+        data = parse_str(self.body)
+        self.assertEqual(data["param2"], 123)
+        # the annotation of a multiline value is only for reading, as parse_str takes
+        # the value from the first line
+        self.assertEqual(data["param_dict"], "{'a': param1,\n}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from labmate.utils.file_read import (
+    read_file,
+    update_file_variable,
+    update_files_variables,
+    update_variables_in_text,
+)
+
+CONFIG = """\
+a = 1
+b = 2  # comment
+a = 1
+c = {
+    'x': 1,
+}  # dict
+d = 'text'
+"""
+
+
+class UpdateVariablesTest(unittest.TestCase):
+    """Test update_variables_in_text and update_file_variable."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.files = []
+        for name in ("config1.py", "config2.py"):
+            self.files.append(os.path.join(self.directory, name))
+            with open(self.files[-1], "w", encoding="utf-8") as file:
+                file.write(CONFIG)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_duplicated_lines(self):
+        text, updated = update_variables_in_text(CONFIG, {"a": 5})
+        self.assertSetEqual(updated, {"a"})
+        self.assertEqual(text.split("\n")[0], "a = 5")
+        self.assertEqual(text.split("\n")[2], "a = 5")
+
+    def test_multiline(self):
+        text, _ = update_variables_in_text(CONFIG, {"c": 3, "d": "new"})
+        lines = text.split("\n")
+        self.assertEqual(lines[3], "c = 3  # dict")
+        self.assertEqual(lines[4], 'd = "new"')
+        self.assertEqual(len(lines), len(CONFIG.split("\n")) - 2)
+
+    def test_comment_kept(self):
+        text, _ = update_variables_in_text(CONFIG, {"b": 1.5})
+        self.assertEqual(text.split("\n")[1], "b = 1.5  # comment")
+
+    def test_not_found(self):
+        text, updated = update_variables_in_text(CONFIG, {"e": 1})
+        self.assertEqual(text, CONFIG)
+        self.assertSetEqual(updated, set())
+
+    def test_private_and_indented(self):
+        config = "_a = 1\nif True:\n    b = 2  # comment\n"
+        text, updated = update_variables_in_text(config, {"_a": 3, "b": 4})
+        self.assertSetEqual(updated, {"_a", "b"})
+        self.assertEqual(text, "_a = 3\nif True:\n    b = 4  # comment\n")
+
+    def test_numpy_values(self):
+        params = {"a": np.int64(5), "b": np.float32(1.5), "d": np.array([1, 2])}
+        text, updated = update_variables_in_text(CONFIG, params)
+        self.assertSetEqual(updated, {"a", "b", "d"})
+        lines = text.split("\n")
+        self.assertEqual(lines[0], "a = 5")
+        self.assertEqual(lines[1], "b = 1.5  # comment")
+        self.assertEqual(lines[-2], "d = [1, 2]")
+
+    def test_unclosed_brackets(self):
+        config = "a = 1\nc = (1,\n"
+        text, updated = update_variables_in_text(config, {"a": 2, "c": 3})
+        self.assertSetEqual(updated, {"a"})
+        self.assertEqual(text, "a = 2\nc = (1,\n")
+
+    def test_update_file(self):
+        updated = update_file_variable(self.files[0], {"a": 2, "b": 3})
+        self.assertSetEqual(updated, {"a", "b"})
+        self.assertTrue(
+            read_file(self.files[0]).startswith("a = 2\nb = 3  # comment\n")
+        )
+        self.assertListEqual(
+            sorted(os.listdir(self.directory)), ["config1.py", "config2.py"]
+        )
+
+    def test_update_files(self):
+        updated = update_files_variables(self.files, {"d": 4})
+        for file in self.files:
+            self.assertSetEqual(updated[file], {"d"})
+            self.assertIn("\nd = 4\n", read_file(file))
+
+    def test_same_value_not_rewritten(self):
+        os.utime(self.files[0], (0, 0))
+        update_file_variable(self.files[0], {"a": 1})
+        self.assertEqual(os.path.getmtime(self.files[0]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
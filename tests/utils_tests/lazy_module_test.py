@@ -0,0 +1,79 @@
+import subprocess
+import sys
+import unittest
+
+from labmate.utils.lazy_module import LazyModule, lazy_attributes
+
+NOT_IMPORTED_CODE = """
+import sys
+import labmate.acquisition_notebook
+optional = ("IPython", "ipywidgets", "multiprocessing", "labmate.display",
+            "labmate.parsing", "labmate.acquisition.bulk")
+print(",".join(m for m in optional if m in sys.modules))
+"""
+
+ACQUISITION_NOT_IMPORTED_CODE = """
+import sys
+import {module}
+heavy = ("labmate.acquisition.acquisition_manager", "labmate.acquisition.acquisition_data",
+         "labmate.acquisition.analysis_data", "labmate.acquisition.journal",
+         "labmate.acquisition.h5_handles", "labmate.acquisition.writer",
+         "labmate.acquisition.container")
+print(",".join(m for m in heavy if m in sys.modules))
+"""
+
+
+class LazyModuleTest(unittest.TestCase):
+    """Test that the modules are imported on the first use."""
+
+    def test_lazy_module(self):
+        module = LazyModule(".title_parsing", "labmate.utils")
+        self.assertTrue(callable(module.format_title))
+        with self.assertRaises(AttributeError):
+            module.unknown  # pylint: disable=pointless-statement
+
+    def test_lazy_attributes(self):
+        getattr_ = lazy_attributes(
+            "labmate.acquisition", {"extract_config_params": ".bulk"}
+        )
+        self.assertTrue(callable(getattr_("extract_config_params")))
+        with self.assertRaises(AttributeError):
+            getattr_("unknown")
+
+    def test_package_attributes(self):
+        from labmate.acquisition import VirtualDataset, load_key_from_files
+
+        self.assertTrue(callable(load_key_from_files))
+        self.assertEqual(VirtualDataset.__name__, "VirtualDataset")
+
+    def test_not_imported_on_startup(self):
+        output = subprocess.run(
+            [sys.executable, "-c", NOT_IMPORTED_CODE],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        self.assertEqual(output.strip(), "")
+
+    def get_imported(self, code: str) -> list:
+        output = subprocess.run(
+            [sys.executable, "-c", code], check=True, capture_output=True, text=True
+        ).stdout
+        return [module for module in output.strip().split(",") if module]
+
+    def test_acquisition_not_imported_on_startup(self):
+        for module in ("labmate", "labmate.acquisition"):
+            code = ACQUISITION_NOT_IMPORTED_CODE.format(module=module)
+            self.assertEqual(self.get_imported(code), [], msg=module)
+
+    def test_writer_not_imported_by_notebook(self):
+        code = ACQUISITION_NOT_IMPORTED_CODE.format(
+            module="labmate.acquisition_notebook"
+        )
+        imported = self.get_imported(code)
+        for module in ("h5_handles", "writer", "container"):
+            self.assertNotIn(f"labmate.acquisition.{module}", imported)
+
+
+if __name__ == "__main__":
+    unittest.main()